@@ -1,7 +1,15 @@
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+# Tells settings to drop sync-only middleware, see PHOTOBOOTH_ASGI
+os.environ.setdefault("PHOTOBOOTH_ASGI", "True")
 
 application = get_asgi_application()
+
+if settings.DEBUG:
+    from django.contrib.staticfiles.handlers import ASGIStaticFilesHandler
+
+    application = ASGIStaticFilesHandler(application)
@@ -1,4 +1,5 @@
 import os
+import socket
 from datetime import timedelta
 from pathlib import Path
 
@@ -19,7 +20,7 @@ SECRET_KEY = env("DJANGO_SECRET_KEY")
 
 # https://docs.djangoproject.com/en/dev/ref/settings/#debug
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = env("DEBUG", default=False)
+DEBUG = env.bool("DEBUG", default=False)
 
 # https://docs.djangoproject.com/en/dev/ref/settings/#allowed-hosts
 ALLOWED_HOSTS = env.list("ALLOWED_HOSTS", default=["localhost", "0.0.0.0", "127.0.0.1"])
@@ -49,6 +50,7 @@ INSTALLED_APPS = [
     "rest_framework_simplejwt",  # JWT support
     "oauth2_provider",  # OAuth2 provider (Django OAuth Toolkit)
     "django_ses",
+    "post_office",
     "dbbackup",  # django-dbbackup
     "import_export",
     # Local
@@ -59,6 +61,7 @@ INSTALLED_APPS = [
 
 # https://docs.djangoproject.com/en/dev/ref/settings/#middleware
 MIDDLEWARE = [
+    "photobooth.metrics.MetricsMiddleware",  # Prometheus metrics, see /metrics
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",  # WhiteNoise
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -69,6 +72,8 @@ MIDDLEWARE = [
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "allauth.account.middleware.AccountMiddleware",  # django-allauth
+    "photobooth.profiling.ProfilingMiddleware",  # off unless PHOTOBOOTH_PROFILING_ENABLED
+    "photobooth.budgets.QueryBudgetMiddleware",  # per-view query budgets
 ]
 
 # https://docs.djangoproject.com/en/dev/ref/settings/#root-urlconf
@@ -112,6 +117,36 @@ DATABASES = {
     )
 }
 
+# Optional read replica for gallery, download and event info reads, see
+# photobooth.routers. Locally it can point at a second database, or at the
+# same SQLite file as DATABASE_URL to exercise the routing.
+if env("DATABASE_REPLICA_URL", default=""):
+    DATABASES["replica"] = env.db("DATABASE_REPLICA_URL")
+    DATABASES["replica"]["TEST"] = {"MIRROR": "default"}
+DATABASE_ROUTERS = ["photobooth.routers.ReplicaRouter"]
+
+# https://docs.djangoproject.com/en/dev/ref/databases/#connection-pool
+# PostgreSQL connections come from a per-process psycopg pool, checked
+# before being handed out, instead of being opened for every request. Set
+# DATABASE_POOL_MAX_SIZE=0 to use CONN_MAX_AGE persistent connections.
+DATABASE_POOL_MIN_SIZE = env.int("DATABASE_POOL_MIN_SIZE", default=2)
+DATABASE_POOL_MAX_SIZE = env.int("DATABASE_POOL_MAX_SIZE", default=8)
+for database in DATABASES.values():
+    database["CONN_HEALTH_CHECKS"] = True
+    postgres = database["ENGINE"] == "django.db.backends.postgresql"
+    if postgres and DATABASE_POOL_MAX_SIZE:
+        from psycopg_pool import ConnectionPool
+
+        database["CONN_MAX_AGE"] = 0  # required with a pool
+        database.setdefault("OPTIONS", {})["pool"] = {
+            "min_size": DATABASE_POOL_MIN_SIZE,
+            "max_size": DATABASE_POOL_MAX_SIZE,
+            "timeout": env.int("DATABASE_POOL_TIMEOUT", default=10),
+            "check": ConnectionPool.check_connection,
+        }
+    else:
+        database["CONN_MAX_AGE"] = env.int("CONN_MAX_AGE", default=60)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/dev/ref/settings/#auth-password-validators
@@ -164,6 +199,15 @@ STATICFILES_DIRS = [BASE_DIR / "static"]
 MEDIA_ROOT = BASE_DIR / "media"
 MEDIA_URL = "/media/"
 
+# Default home of the ingest journal, cold tier, packs and media backups,
+# outside the source tree so none of them can end up in a commit
+PHOTOBOOTH_DATA_ROOT = Path(
+    env(
+        "PHOTOBOOTH_DATA_ROOT",
+        default=str(Path.home() / ".local" / "share" / "photobooth"),
+    )
+)
+
 # https://whitenoise.readthedocs.io/en/latest/django.html
 STORAGES = {
     "default": {
@@ -172,8 +216,45 @@ STORAGES = {
     "staticfiles": {
         "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage",
     },
+    # Archive tier for originals of past events, see photobooth.tiering. Any
+    # storage works here, e.g. a django-storages bucket
+    "cold": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+        "OPTIONS": {
+            "location": env(
+                "PHOTOBOOTH_COLD_ROOT", default=PHOTOBOOTH_DATA_ROOT / "cold"
+            )
+        },
+    },
+    # Media snapshots written by `manage.py backup_media`, see
+    # photobooth.backups. Any storage works here too, ideally off the host
+    "backup": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+        "OPTIONS": {
+            "location": env(
+                "PHOTOBOOTH_BACKUP_ROOT",
+                default=PHOTOBOOTH_DATA_ROOT / "backups" / "media",
+            )
+        },
+    },
 }
 
+# Read-through cache of media on each node's local disk, in front of a shared
+# or remote default storage, see photobooth.storage
+PHOTOBOOTH_MEDIA_CACHE_ROOT = env("PHOTOBOOTH_MEDIA_CACHE_ROOT", default="")
+PHOTOBOOTH_MEDIA_CACHE_BYTES = env.int(
+    "PHOTOBOOTH_MEDIA_CACHE_BYTES", default=10 * 1024**3
+)
+if PHOTOBOOTH_MEDIA_CACHE_ROOT:
+    STORAGES["default"] = {
+        "BACKEND": "photobooth.storage.CachedStorage",
+        "OPTIONS": {
+            "backend": STORAGES["default"],
+            "location": PHOTOBOOTH_MEDIA_CACHE_ROOT,
+            "max_bytes": PHOTOBOOTH_MEDIA_CACHE_BYTES,
+        },
+    }
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/stable/ref/settings/#default-auto-field
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
@@ -186,19 +267,45 @@ CRISPY_TEMPLATE_PACK = "bootstrap5"
 # https://docs.djangoproject.com/en/dev/ref/settings/#email-backend
 EMAIL_BACKEND = env("EMAIL_BACKEND")
 
+# https://docs.djangoproject.com/en/dev/ref/settings/#email-host
+EMAIL_HOST = env("EMAIL_HOST", default="localhost")
+EMAIL_PORT = env.int("EMAIL_PORT", default=25)
+EMAIL_HOST_USER = env("EMAIL_HOST_USER", default="")
+EMAIL_HOST_PASSWORD = env("EMAIL_HOST_PASSWORD", default="")
+EMAIL_USE_TLS = env.bool("EMAIL_USE_TLS", default=False)
+
 # https://docs.djangoproject.com/en/dev/ref/settings/#default-from-email
 DEFAULT_FROM_EMAIL = env("DEFAULT_FROM_EMAIL")
 AWS_ACCESS_KEY_ID = env("AWS_ACCESS_KEY_ID")
 AWS_SECRET_ACCESS_KEY = env("AWS_SECRET_ACCESS_KEY")
 AWS_SES_REGION_NAME = env("AWS_REGION_NAME")
 
+# django-post-office, queues guest photo emails (see photobooth.delivery)
+# https://github.com/ui/django-post_office#settings
+POST_OFFICE = {
+    "BACKENDS": {
+        # Point PHOTO_EMAIL_BACKEND at an SMTP sink to test deliveries locally
+        "default": env("PHOTO_EMAIL_BACKEND", default=EMAIL_BACKEND),
+    },
+    "DEFAULT_PRIORITY": "medium",
+    "BATCH_SIZE": env.int("PHOTO_EMAIL_BATCH_SIZE", default=100),
+    "THREADS_PER_PROCESS": env.int("PHOTO_EMAIL_THREADS", default=10),
+    "MAX_RETRIES": 3,
+    "RETRY_INTERVAL": timedelta(minutes=5),
+}
+
 # django-debug-toolbar
 # https://django-debug-toolbar.readthedocs.io/en/latest/installation.html
 # https://docs.djangoproject.com/en/dev/ref/settings/#internal-ips
-import socket
-
-hostname, _, ips = socket.gethostbyname_ex(socket.gethostname())
-INTERNAL_IPS = [ip[:-1] + "1" for ip in ips]
+# Only resolved in DEBUG: the lookup can block worker boot on a slow resolver
+INTERNAL_IPS = ["127.0.0.1"]
+if DEBUG:
+    try:
+        hostname, _, ips = socket.gethostbyname_ex(socket.gethostname())
+    except OSError:
+        ips = []
+    # Docker gateway address, so the toolbar shows for the host's browser
+    INTERNAL_IPS += [ip[:-1] + "1" for ip in ips]
 
 # https://docs.djangoproject.com/en/dev/topics/auth/customizing/#substituting-a-custom-user-model
 AUTH_USER_MODEL = "accounts.CustomUser"
@@ -310,6 +417,82 @@ OAUTH2_PROVIDER = {
 # X_FRAME_OPTIONS = 'DENY'
 
 
+######################## photobooth ########################
+
+# Maximum Hamming distance between perceptual hashes for two photos to count
+# as near-duplicates (0-11, see photobooth.similarity)
+PHOTOBOOTH_DUPLICATE_RADIUS = env.int("PHOTOBOOTH_DUPLICATE_RADIUS", default=6)
+
+# Directory where each worker process leaves its metrics snapshot so /metrics
+# can report totals across gunicorn workers; empty it when the server starts
+PHOTOBOOTH_METRICS_DIR = env("PHOTOBOOTH_METRICS_DIR", default="")
+# Bearer token required to scrape /metrics (open when empty)
+PHOTOBOOTH_METRICS_TOKEN = env("PHOTOBOOTH_METRICS_TOKEN", default="")
+
+# Set by config/asgi.py. WhiteNoise only serves synchronously, so under ASGI
+# every request would hop to a thread just to pass through it; the reverse
+# proxy serves /static/ instead (ASGIStaticFilesHandler does when DEBUG)
+PHOTOBOOTH_ASGI = env.bool("PHOTOBOOTH_ASGI", default=False)
+if PHOTOBOOTH_ASGI:
+    MIDDLEWARE.remove("whitenoise.middleware.WhiteNoiseMiddleware")
+    # Persistent connections leak under ASGI, only pooled ones are reused
+    for database in DATABASES.values():
+        if "pool" not in database.get("OPTIONS", {}):
+            database["CONN_MAX_AGE"] = 0
+
+# What to do when a view runs more queries than its @query_budget allows:
+# "log" a warning, "raise" (the test suite does) or "off" to skip counting
+PHOTOBOOTH_QUERY_BUDGET_MODE = env("PHOTOBOOTH_QUERY_BUDGET_MODE", default="log")
+
+# Request profiling (photobooth.profiling); the middleware unloads itself
+# when disabled. Profile a request with the header from `manage.py
+# profile_token`, as staff with ?profile=1, or 1 in SAMPLE_RATE requests
+PHOTOBOOTH_PROFILING_ENABLED = env.bool("PHOTOBOOTH_PROFILING_ENABLED", default=False)
+PHOTOBOOTH_PROFILING_SAMPLE_RATE = env.int(
+    "PHOTOBOOTH_PROFILING_SAMPLE_RATE", default=0
+)
+PHOTOBOOTH_PROFILING_TOKEN_MAX_AGE = env.int(
+    "PHOTOBOOTH_PROFILING_TOKEN_MAX_AGE", default=60 * 60
+)
+PHOTOBOOTH_PROFILING_REPORT_LINES = 60
+PHOTOBOOTH_PROFILING_KEEP = env.int("PHOTOBOOTH_PROFILING_KEEP", default=500)
+
+# Longest a long-polling event info request is held (?wait=<seconds>), and
+# how often it checks the event version meanwhile
+PHOTOBOOTH_EVENT_INFO_MAX_WAIT = env.float("PHOTOBOOTH_EVENT_INFO_MAX_WAIT", default=25)
+PHOTOBOOTH_EVENT_INFO_POLL_INTERVAL = 0.5
+
+# Days an event must have been inactive before `manage.py tier_photos` moves
+# its originals to the "cold" storage and prunes its thumbnails
+PHOTOBOOTH_COLD_AFTER_DAYS = env.int("PHOTOBOOTH_COLD_AFTER_DAYS", default=30)
+
+# Directory of per-event pack files written by `manage.py pack_events`; it
+# must be a local filesystem since photos are served from it with mmap
+PHOTOBOOTH_PACK_ROOT = env(
+    "PHOTOBOOTH_PACK_ROOT", default=str(PHOTOBOOTH_DATA_ROOT / "packs")
+)
+
+# Journal of captures in flight, replayed by `manage.py recover_captures`
+# after a crash; it must be a local filesystem since it relies on fsync
+PHOTOBOOTH_INGEST_ROOT = env(
+    "PHOTOBOOTH_INGEST_ROOT", default=str(PHOTOBOOTH_DATA_ROOT / "ingest")
+)
+
+# Secret shared with nginx's secure_link module; when set, gallery and image
+# URLs of hot photos are signed, expiring links under
+# PHOTOBOOTH_SIGNED_MEDIA_URL that nginx serves without Django, see
+# photobooth.signing. When empty they point at MEDIA_URL directly
+PHOTOBOOTH_MEDIA_URL_SECRET = env("PHOTOBOOTH_MEDIA_URL_SECRET", default="")
+PHOTOBOOTH_SIGNED_MEDIA_URL = "/signed-media/"
+# Signed URLs stay valid for at least the TTL; expiries are rounded up to a
+# whole bucket so URLs, and CDN caches of them, are stable within a bucket
+PHOTOBOOTH_SIGNED_URL_TTL = env.int("PHOTOBOOTH_SIGNED_URL_TTL", default=7 * 86400)
+PHOTOBOOTH_SIGNED_URL_BUCKET = env.int("PHOTOBOOTH_SIGNED_URL_BUCKET", default=86400)
+
+# Site URL for links in guest emails when an event has no QR base URL
+PHOTOBOOTH_BASE_URL = env("PHOTOBOOTH_BASE_URL", default="http://localhost:8000")
+
+
 ######################## env banner ########################
 
 ENVIRONMENT_NAME = env("ENVIRONMENT_NAME", default="UNKNOWN")
@@ -2,8 +2,17 @@ from django.conf import settings
 from django.contrib import admin
 from django.urls import include, path
 
+from photobooth.views import metrics_view, serve_signed_media
+
 urlpatterns = [
     path("admin/", admin.site.urls),
+    path("metrics", metrics_view, name="metrics"),
+    # Normally answered by nginx, see photobooth.signing
+    path(
+        settings.PHOTOBOOTH_SIGNED_MEDIA_URL.lstrip("/") + "<path:name>",
+        serve_signed_media,
+        name="signed_media",
+    ),
     path("accounts/", include("allauth.urls")),
     path("photobooth/", include("photobooth.urls")),
     path("", include("pages.urls")),
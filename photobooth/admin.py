@@ -1,6 +1,13 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.db.models import Count
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html, format_html_join
 
-from .models import Event, Photo, PhotoboothSettings
+from .delivery import queue_event_deliveries
+from .models import Event, Photo, PhotoboothSettings, RequestProfile
+from .search import is_email_query, search_guest_photos
 
 
 @admin.register(Event)
@@ -17,12 +24,13 @@ class EventAdmin(admin.ModelAdmin):
     list_filter = ["is_active", "date", "created_at", "created_by"]
     search_fields = ["name", "code", "created_by__username"]
     readonly_fields = ["id", "code", "created_at", "updated_at", "photo_count"]
+    actions = ["queue_photo_delivery"]
 
     def get_queryset(self, request):
         return (
             super()
             .get_queryset(request)
-            .prefetch_related("photos")
+            .annotate(num_photos=Count("photos"))
             .select_related("created_by")
         )
 
@@ -31,15 +39,42 @@ class EventAdmin(admin.ModelAdmin):
             obj.created_by = request.user
         super().save_model(request, obj, form, change)
 
+    @admin.action(description="Email guests their photos")
+    def queue_photo_delivery(self, request, queryset):
+        total_guests = total_photos = 0
+        for event in queryset:
+            guests, photos = queue_event_deliveries(event)
+            total_guests += guests
+            total_photos += photos
+        self.message_user(
+            request,
+            f"Queued {total_photos} photos for {total_guests} guests",
+            messages.SUCCESS,
+        )
+
 
 @admin.register(Photo)
 class PhotoAdmin(admin.ModelAdmin):
-    list_display = ["id", "session", "guest_name", "taken_at", "is_processed"]
-    list_filter = ["session", "is_processed", "taken_at"]
-    search_fields = ["guest_name", "guest_email", "session__name", "session__code"]
-    readonly_fields = ["id", "taken_at"]
+    list_display = [
+        "id",
+        "session",
+        "guest_name",
+        "taken_at",
+        "is_processed",
+        "emailed_at",
+        "tier",
+    ]
+    list_filter = ["session", "is_processed", "tier", "taken_at", "emailed_at"]
+    search_fields = ["guest_name", "session__name", "session__code"]
+    readonly_fields = ["id", "taken_at", "tier", "tiered_at"]
     raw_id_fields = ["session"]
 
+    def get_search_results(self, request, queryset, search_term):
+        # Look up emails through the normalised index instead of a LIKE scan
+        if is_email_query(search_term):
+            return search_guest_photos(queryset, search_term), False
+        return super().get_search_results(request, queryset, search_term)
+
 
 @admin.register(PhotoboothSettings)
 class PhotoboothSettingsAdmin(admin.ModelAdmin):
@@ -50,3 +85,84 @@ class PhotoboothSettingsAdmin(admin.ModelAdmin):
     def has_delete_permission(self, request, obj=None):
         # Don't allow deletion of settings
         return False
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = [
+        "created_at",
+        "view_name",
+        "method",
+        "status_code",
+        "duration_ms",
+        "query_count",
+        "query_ms",
+        "trigger",
+    ]
+    list_filter = ["view_name", "trigger", "status_code", "created_at"]
+    search_fields = ["path", "view_name"]
+    date_hierarchy = "created_at"
+    exclude = ["stats", "queries", "profile_data"]
+    readonly_fields = [
+        "created_at",
+        "view_name",
+        "method",
+        "path",
+        "status_code",
+        "trigger",
+        "user",
+        "duration_ms",
+        "query_count",
+        "query_ms",
+        "download",
+        "stats_report",
+        "sql",
+    ]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        return [
+            path(
+                "<int:pk>/download/",
+                self.admin_site.admin_view(self.download_view),
+                name="photobooth_requestprofile_download",
+            ),
+            *super().get_urls(),
+        ]
+
+    def download_view(self, request, pk):
+        if not self.has_view_permission(request):
+            return HttpResponse(status=403)
+        profile = get_object_or_404(RequestProfile, pk=pk)
+        response = HttpResponse(
+            bytes(profile.profile_data), content_type="application/octet-stream"
+        )
+        response["Content-Disposition"] = f'attachment; filename="request-{pk}.prof"'
+        return response
+
+    @admin.display(description="Raw stats")
+    def download(self, obj):
+        url = reverse("admin:photobooth_requestprofile_download", args=[obj.pk])
+        return format_html(
+            '<a href="{}">request-{}.prof</a> (open with snakeviz or flameprof)',
+            url,
+            obj.pk,
+        )
+
+    @admin.display(description="Profile")
+    def stats_report(self, obj):
+        return format_html("<pre>{}</pre>", obj.stats)
+
+    @admin.display(description="SQL")
+    def sql(self, obj):
+        rows = format_html_join(
+            "",
+            "<tr><td>{}</td><td><code>{}</code></td></tr>",
+            ((query["ms"], query["sql"]) for query in obj.queries),
+        )
+        return format_html("<table><tr><th>ms</th><th>Query</th></tr>{}</table>", rows)
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class PhotoboothConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "photobooth"
+
+    def ready(self):
+        # Installs the per-connection query observer
+        from . import querylog  # noqa: F401
@@ -0,0 +1,347 @@
+"""
+Incremental, content-addressed backups of photo originals on every tier.
+
+A snapshot covers three areas, each named by a prefix: MEDIA_ROOT/photos
+("photos/..."), the photos of the cold storage ("cold/photos/..."), when it
+is on the local filesystem, and the pack files of PHOTOBOOTH_PACK_ROOT
+("packs/<event id>.pack"), which are the only copy of a packed event's
+originals. A cold storage elsewhere, such as a bucket, is left to that
+storage's own versioning.
+
+The snapshot's manifest, snapshots/<id>.jsonl.gz in the "backup" storage,
+has one line per file: its name, size, mtime and SHA-256, sorted by name. File contents are stored once per distinct hash
+as objects/<first two hex digits>/<hash>, so snapshots share everything
+they have in common and identical files are stored once.
+
+A new snapshot walks the tree in name order alongside the previous
+manifest. Files whose size and mtime are unchanged keep their recorded
+hash without being read, so a nightly run only reads and copies the day's
+new photos; the rest of the tree costs a directory listing. Pack files
+only ever grow, so a snapshot hashes and copies a file's first `size`
+bytes, as listed, and a pack being appended to is captured consistently.
+
+Copies of local objects are written to a temporary file and renamed into
+place, and an object is only trusted when its size matches, so a run that
+dies mid-copy never leaves a truncated object that later snapshots point
+at. The database is backed up separately, with `manage.py dbbackup`.
+"""
+
+import gzip
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+from collections import Counter, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage, storages
+from django.utils import timezone
+
+from .integrity import HASH_CHUNK_SIZE, list_directory, walk_files
+from .tiering import cold_storage
+
+BACKUP_STORAGE = "backup"
+SNAPSHOT_DIR = "snapshots"
+SNAPSHOT_SUFFIX = ".jsonl.gz"
+OBJECT_DIR = "objects"
+COPY_CHUNK_SIZE = 1024 * 1024
+COLD_PREFIX = "cold/"
+PACKS_DIR = "packs"
+PACKS_PREFIX = f"{PACKS_DIR}/"
+
+
+def backup_storage():
+    return storages[BACKUP_STORAGE]
+
+
+def object_name(sha256):
+    return f"{OBJECT_DIR}/{sha256[:2]}/{sha256}"
+
+
+def snapshot_name(snapshot_id):
+    return f"{SNAPSHOT_DIR}/{snapshot_id}{SNAPSHOT_SUFFIX}"
+
+
+def list_snapshots():
+    """Snapshot ids, oldest first"""
+    storage = backup_storage()
+    if not storage.exists(SNAPSHOT_DIR):
+        return []
+    _, files = storage.listdir(SNAPSHOT_DIR)
+    return sorted(
+        name.removesuffix(SNAPSHOT_SUFFIX)
+        for name in files
+        if name.endswith(SNAPSHOT_SUFFIX)
+    )
+
+
+def read_manifest(snapshot_id):
+    """Yield the entries of a snapshot, by name"""
+    with (
+        backup_storage().open(snapshot_name(snapshot_id), "rb") as f,
+        gzip.open(f, "rt") as lines,
+    ):
+        for line in lines:
+            yield json.loads(line)
+
+
+def local_root(storage):
+    """Directory of a storage on the local filesystem, None for other storages"""
+    try:
+        return storage.path("")
+    except NotImplementedError:
+        return None
+
+
+def backup_areas(root=None):
+    """(name prefix, directory) of each area a snapshot covers, in name order"""
+    return [
+        (COLD_PREFIX, local_root(cold_storage())),
+        (PACKS_PREFIX, settings.PHOTOBOOTH_PACK_ROOT),
+        ("", root or default_storage.location),
+    ]
+
+
+def local_path(areas, name):
+    """Where the file of a manifest name lives, None if its area is not local"""
+    for prefix, directory in areas:
+        if name.startswith(prefix):
+            if directory is None:
+                return None
+            return os.path.join(directory, name.removeprefix(prefix))
+    return None
+
+
+def walk_areas(areas, workers):
+    """Yield a FileEntry for every file of every area, by manifest name"""
+    for prefix, directory in areas:
+        if directory is None:
+            continue
+        if prefix == PACKS_PREFIX:
+            try:
+                yield from list_directory(directory, PACKS_DIR)
+            except FileNotFoundError:
+                pass
+        else:
+            for file in walk_files(directory, workers):
+                yield file._replace(name=prefix + file.name)
+
+
+class _Head(io.RawIOBase):
+    """The first `size` bytes of a file"""
+
+    def __init__(self, f, size):
+        self._f = f
+        self._left = size
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self._f.read(min(len(buffer), self._left))
+        buffer[: len(data)] = data
+        self._left -= len(data)
+        return len(data)
+
+
+def head_sha256(path, size):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        head = _Head(f, size)
+        while chunk := head.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _ready(value):
+    future = Future()
+    future.set_result(value)
+    return future
+
+
+class _Uploader:
+    """Hashes files and copies each distinct content to the backup once"""
+
+    def __init__(self, storage, areas):
+        self.storage = storage
+        self.areas = areas
+        self._lock = threading.Lock()
+        self._seen = set()
+
+    def __call__(self, file):
+        path = local_path(self.areas, file.name)
+        sha256 = head_sha256(path, file.size)
+        entry = {
+            "name": file.name,
+            "size": file.size,
+            "mtime": file.mtime,
+            "sha256": sha256,
+        }
+        with self._lock:
+            first = sha256 not in self._seen
+            self._seen.add(sha256)
+        name = object_name(sha256)
+        if not first:
+            return entry, 0
+        if self.storage.exists(name):
+            if self.storage.size(name) == file.size:
+                return entry, 0
+            # Truncated by an interrupted copy, do not point snapshots at it
+            self.storage.delete(name)
+        return entry, self.store_object(path, name, file.size)
+
+    def store_object(self, path, name, size):
+        """Copy the file at `path` to the object `name`, returns bytes copied"""
+        try:
+            target = self.storage.path(name)
+        except NotImplementedError:
+            target = None
+        if target is not None:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            fd, partial = tempfile.mkstemp(
+                dir=os.path.dirname(target), suffix=".partial"
+            )
+            try:
+                with os.fdopen(fd, "wb") as out, open(path, "rb") as f:
+                    shutil.copyfileobj(_Head(f, size), out, COPY_CHUNK_SIZE)
+                os.replace(partial, target)
+            except BaseException:
+                os.unlink(partial)
+                raise
+            return size
+        # Remote storages only make an object visible once it is complete
+        with open(path, "rb") as f:
+            saved = self.storage.save(name, File(io.BufferedReader(_Head(f, size))))
+        if saved != name:
+            # Stored concurrently by another run, keep the first copy
+            self.storage.delete(saved)
+            return 0
+        return size
+
+
+def create_snapshot(root=None, workers=8, now=None):
+    """
+    Back up the photos under `root` (MEDIA_ROOT by default), the cold tier
+    and the packs, and return the new snapshot id with counts of files,
+    hashed files and copied bytes.
+    """
+    areas = backup_areas(root)
+    storage = backup_storage()
+    snapshot_id = (now or timezone.now()).strftime("%Y%m%dT%H%M%S%fZ")
+    snapshots = list_snapshots()
+    previous = read_manifest(snapshots[-1]) if snapshots else iter(())
+    last = next(previous, None)
+    upload = _Uploader(storage, areas)
+    stats = Counter()
+
+    with (
+        tempfile.TemporaryFile() as manifest,
+        ThreadPoolExecutor(workers) as pool,
+    ):
+        with gzip.open(manifest, "wt") as lines:
+            pending = deque()
+
+            def write(future):
+                entry, copied = future.result()
+                lines.write(json.dumps(entry) + "\n")
+                stats["files"] += 1
+                stats["copied_bytes"] += copied
+                stats["copied"] += bool(copied)
+
+            for file in walk_areas(areas, workers):
+                while last is not None and last["name"] < file.name:
+                    last = next(previous, None)
+                if (
+                    last is not None
+                    and last["name"] == file.name
+                    and last["size"] == file.size
+                    and last["mtime"] == file.mtime
+                ):
+                    pending.append(_ready((last, 0)))
+                else:
+                    stats["hashed"] += 1
+                    pending.append(pool.submit(upload, file))
+                # Entries are written in walk order, a bounded window behind
+                while len(pending) > workers * 4:
+                    write(pending.popleft())
+            while pending:
+                write(pending.popleft())
+        manifest.seek(0)
+        storage.save(snapshot_name(snapshot_id), File(manifest))
+    return snapshot_id, stats
+
+
+def _intact(path, entry):
+    try:
+        size = os.path.getsize(path)
+    except FileNotFoundError:
+        return False
+    # A pack appended to since the snapshot still holds what it had then
+    grown = entry["name"].startswith(PACKS_PREFIX) and size > entry["size"]
+    if size != entry["size"] and not grown:
+        return False
+    return head_sha256(path, entry["size"]) == entry["sha256"]
+
+
+def _restore_file(storage, entry, path):
+    if _intact(path, entry):
+        return 0
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial = f"{path}.restoring"
+    with (
+        storage.open(object_name(entry["sha256"]), "rb") as source,
+        open(partial, "wb") as target,
+    ):
+        while chunk := source.read(COPY_CHUNK_SIZE):
+            target.write(chunk)
+    os.replace(partial, path)
+    # So the next snapshot sees the file as unchanged
+    os.utime(path, (entry["mtime"], entry["mtime"]))
+    return entry["size"]
+
+
+def restore_snapshot(snapshot_id, dest=None, prefixes=("",), workers=8):
+    """
+    Restore the files of a snapshot whose names start with one of `prefixes`
+    where they came from, or by manifest name under `dest`. Files already
+    there with the right content are left alone. Returns counts of files,
+    restored files and bytes, and files skipped because their area is not
+    on the local filesystem.
+    """
+    areas = backup_areas()
+    storage = backup_storage()
+    last = max(prefixes)
+    stats = Counter()
+
+    def done(future):
+        restored = future.result()
+        stats["files"] += 1
+        stats["restored"] += bool(restored)
+        stats["restored_bytes"] += restored
+
+    with ThreadPoolExecutor(workers) as pool:
+        pending = deque()
+        for entry in read_manifest(snapshot_id):
+            name = entry["name"]
+            if not name.startswith(tuple(prefixes)):
+                if name > last:
+                    break  # Sorted by name, nothing further can match
+                continue
+            if dest:
+                path = os.path.join(dest, name)
+            else:
+                path = local_path(areas, name)
+            if path is None:
+                stats["skipped"] += 1
+                continue
+            pending.append(pool.submit(_restore_file, storage, entry, path))
+            while len(pending) > workers * 4:
+                done(pending.popleft())
+        while pending:
+            done(pending.popleft())
+    return stats
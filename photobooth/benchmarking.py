@@ -0,0 +1,215 @@
+"""
+Shared helpers for the bench_* management commands.
+
+Results are plain JSON so runs can be diffed and stored as baselines:
+``{"meta": {...}, "results": {group: {name: {metric: value}}}}``.
+"""
+
+import ctypes
+import json
+import math
+import os
+import platform
+import random
+import resource
+import sys
+from datetime import UTC, datetime
+from io import BytesIO
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db import connection
+from PIL import Image, ImageDraw
+
+from .querylog import QueryLog, observe_queries
+
+# Metric name -> whether a bigger value is a regression
+LOWER_IS_BETTER = {
+    "p50_ms": True,
+    "p95_ms": True,
+    "p99_ms": True,
+    "mean_ms": True,
+    "throughput_rps": False,
+    "queries_max": True,
+    "peak_rss_kb": True,
+    "ms_per_image": True,
+    "rss_kb_per_image": True,
+    "peak_rss_growth_kb": True,
+}
+
+# Differences below these absolute amounts are treated as noise
+NOISE_FLOOR = {
+    "p50_ms": 2.0,
+    "p95_ms": 5.0,
+    "p99_ms": 10.0,
+    "mean_ms": 2.0,
+    "queries_max": 0,
+    "peak_rss_kb": 4096,
+    "ms_per_image": 0.5,
+    "rss_kb_per_image": 256,
+    "peak_rss_growth_kb": 1024,
+}
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(pct / 100 * len(sorted_values)) - 1
+    return sorted_values[max(0, min(len(sorted_values) - 1, rank))]
+
+
+def summarize_latencies(latencies_ms, elapsed_s):
+    latencies = sorted(latencies_ms)
+    return {
+        "count": len(latencies),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "mean_ms": round(sum(latencies) / len(latencies), 2) if latencies else 0.0,
+        "throughput_rps": round(len(latencies) / elapsed_s, 2) if elapsed_s else 0.0,
+    }
+
+
+def synthetic_jpeg(width, height, seed, quality=90):
+    """A deterministic JPEG with enough structure that codecs do real work"""
+    rng = random.Random(seed)
+    image = Image.new("RGB", (width, height), (rng.randrange(256), 90, 140))
+    draw = ImageDraw.Draw(image)
+    for _ in range(40):
+        x, y = rng.randrange(width), rng.randrange(height)
+        size = rng.randrange(20, max(21, width // 4))
+        fill = (rng.randrange(256), rng.randrange(256), rng.randrange(256))
+        draw.ellipse((x, y, x + size, y + size), fill=fill)
+    buffer = BytesIO()
+    image.save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def current_rss_kb():
+    """Resident set size of this process, falling back to the peak off Linux"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError):
+        return peak_rss_kb()
+
+
+def peak_rss_kb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux kilobytes
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def reset_peak_rss():
+    """
+    Reset this process's peak RSS to its current RSS, so high_water_rss_kb()
+    measures what follows. Returns False where the kernel does not allow it.
+    """
+    try:
+        # Return memory freed by earlier work to the kernel first, or reusing
+        # it would hide what follows (glibc only)
+        ctypes.CDLL(None).malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        return False
+    return True
+
+
+def high_water_rss_kb():
+    """Peak RSS since the last reset_peak_rss(), None off Linux"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def run_metadata(**extra):
+    return {
+        "created_at": datetime.now(UTC).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "database": connection.vendor,
+        **extra,
+    }
+
+
+def write_results(report, path=None, stdout=None):
+    data = json.dumps(report, indent=2, sort_keys=True)
+    if path:
+        with open(path, "w") as f:
+            f.write(data + "\n")
+    elif stdout is not None:
+        stdout.write(data)
+
+
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare_to_baseline(results, baseline, tolerance=0.1):
+    """
+    Return human readable regressions of `results` against `baseline`.
+
+    A metric regresses when it moves in the wrong direction by more than
+    `tolerance` (relative) and more than its noise floor (absolute).
+    """
+    regressions = []
+    for group, entries in results.items():
+        for name, metrics in entries.items():
+            previous = baseline.get(group, {}).get(name)
+            if not previous:
+                continue
+            for metric, lower_is_better in LOWER_IS_BETTER.items():
+                if metric not in metrics or metric not in previous:
+                    continue
+                old, new = previous[metric], metrics[metric]
+                change = new - old if lower_is_better else old - new
+                if (
+                    change > NOISE_FLOOR.get(metric, 0)
+                    and change > abs(old) * tolerance
+                ):
+                    regressions.append(f"{group}/{name} {metric}: {old} -> {new}")
+    return regressions
+
+
+class BenchmarkMiddleware:
+    """
+    Report per-request query count and process RSS in response headers.
+
+    Only installed by bench_http, never in regular settings.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with observe_queries(QueryLog()) as queries:
+            response = self.get_response(request)
+        return self.annotate(response, queries)
+
+    async def __acall__(self, request):
+        with observe_queries(QueryLog()) as queries:
+            response = await self.get_response(request)
+        return self.annotate(response, queries)
+
+    def annotate(self, response, queries):
+        response["X-Bench-Queries"] = str(queries.count)
+        response["X-Bench-Rss-Kb"] = str(current_rss_kb())
+        return response
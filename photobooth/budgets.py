@@ -0,0 +1,132 @@
+"""
+Per-view database query budgets.
+
+Views declare the most queries a request may run, middleware included, with
+the @query_budget decorator or a ``query_budget`` attribute on class-based
+views. QueryBudgetMiddleware resolves each request up front, leaves requests
+to unbudgeted views alone, counts the queries of the rest and, depending on PHOTOBOOTH_QUERY_BUDGET_MODE, logs a warning
+("log") or raises QueryBudgetExceeded ("raise", used by the test suite) when
+the budget is blown. With "off" the middleware unloads itself.
+
+Queries run inside an unbudgeted() block, such as the repeated cheap checks
+of a long-polling view, are left out of the count.
+"""
+
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.urls import Resolver404, resolve
+
+from .querylog import QueryLog, observe_queries
+
+logger = logging.getLogger(__name__)
+
+MODES = ("off", "log", "raise")
+
+_unbudgeted = ContextVar("photobooth_unbudgeted", default=False)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def query_budget(limit):
+    """Declare the maximum number of queries a request to the view may run"""
+
+    def decorator(view):
+        view.query_budget = limit
+        return view
+
+    return decorator
+
+
+@contextmanager
+def unbudgeted():
+    """Leave the queries run in this block out of the view's budget"""
+    token = _unbudgeted.set(True)
+    try:
+        yield
+    finally:
+        _unbudgeted.reset(token)
+
+
+class BudgetLog(QueryLog):
+    def __call__(self, sql, duration):
+        if not _unbudgeted.get():
+            super().__call__(sql, duration)
+
+
+def get_query_budget(view):
+    """Budget of a resolved view function, including class-based views"""
+    budget = getattr(view, "query_budget", None)
+    if budget is None:
+        budget = getattr(getattr(view, "view_class", None), "query_budget", None)
+    return budget
+
+
+def resolve_budget(request):
+    """The resolver match and budget of the view a request is headed for"""
+    try:
+        match = resolve(request.path_info, getattr(request, "urlconf", None))
+    except Resolver404:
+        return None, None
+    return match, get_query_budget(match.func)
+
+
+class QueryBudgetMiddleware:
+    """Count queries per request and report views that exceed their budget"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.mode = settings.PHOTOBOOTH_QUERY_BUDGET_MODE
+        if self.mode not in MODES:
+            raise ImproperlyConfigured(
+                f"PHOTOBOOTH_QUERY_BUDGET_MODE must be one of {', '.join(MODES)}"
+            )
+        if self.mode == "off":
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        match, budget = resolve_budget(request)
+        if budget is None:
+            return self.get_response(request)
+        with observe_queries(self.query_log()) as queries:
+            response = self.get_response(request)
+        self.check(request, match, budget, queries)
+        return response
+
+    async def __acall__(self, request):
+        match, budget = resolve_budget(request)
+        if budget is None:
+            return await self.get_response(request)
+        with observe_queries(self.query_log()) as queries:
+            response = await self.get_response(request)
+        self.check(request, match, budget, queries)
+        return response
+
+    def query_log(self):
+        # Statements are only needed for the QueryBudgetExceeded message
+        return BudgetLog(keep_sql=self.mode == "raise")
+
+    def check(self, request, match, budget, queries):
+        if queries.count <= budget:
+            return
+        message = (
+            f"{match.view_name} ran {queries.count} queries, "
+            f"over its budget of {budget}: {request.method} {request.path}"
+        )
+        if self.mode == "raise":
+            statements = "\n".join(sql for sql, _ in queries.statements)
+            raise QueryBudgetExceeded(f"{message}\n{statements}")
+        logger.warning(message)
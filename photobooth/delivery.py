@@ -0,0 +1,101 @@
+"""
+Email delivery of photos to guests who left an address at the booth.
+
+Queuing only writes post_office Email rows, one digest per guest, in bulk, so
+it is cheap enough to trigger from the admin. Sending happens out of band in
+post_office's ``send_queued_mail`` command, which works through the queue in
+batches, reuses one backend connection per sending thread and requeues
+failures (see ``POST_OFFICE`` in settings).
+"""
+
+from collections import defaultdict
+from urllib.parse import urljoin
+
+from django.conf import settings
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils import timezone
+from post_office import mail
+
+from .models import Photo
+
+# Emails created per bulk insert
+QUEUE_CHUNK_SIZE = 200
+
+
+def pending_photos(event):
+    """Processed photos of `event` with a guest email that were never queued"""
+    return (
+        Photo.objects.filter(session=event, is_processed=True, emailed_at__isnull=True)
+        .exclude(guest_email_normalized="")
+        .order_by("taken_at")
+    )
+
+
+def group_by_guest(photos):
+    """Group photos by normalised guest email, keeping capture order"""
+    guests = defaultdict(list)
+    for photo in photos:
+        guests[photo.guest_email_normalized].append(photo)
+    return guests
+
+
+def build_digest(event, email, photos, base_url):
+    """Return post_office send() kwargs for one guest's digest"""
+    context = {
+        "event": event,
+        "guest_name": next((p.guest_name for p in photos if p.guest_name), ""),
+        "gallery_url": urljoin(base_url, event.get_absolute_url()),
+        "photos": [
+            {
+                # Link the rendition for previews, never inline the original.
+                # thumbnail_url is signed for nginx when signing is enabled.
+                "preview_url": (
+                    urljoin(base_url, photo.thumbnail_url) if photo.thumbnail else ""
+                ),
+                "download_url": urljoin(base_url, photo.download_url),
+                "taken_at": photo.taken_at,
+            }
+            for photo in photos
+        ],
+    }
+    return {
+        "recipients": [email],
+        "subject": render_to_string(
+            "photobooth/email/photo_digest_subject.txt", context
+        ).strip(),
+        "message": render_to_string(
+            "photobooth/email/photo_digest_message.txt", context
+        ),
+        "html_message": render_to_string(
+            "photobooth/email/photo_digest_message.html", context
+        ),
+    }
+
+
+def queue_event_deliveries(event, base_url=None):
+    """
+    Queue one digest email per guest for every undelivered photo of `event`.
+
+    Returns a (guest_count, photo_count) tuple. Photos are marked as queued
+    in the same transaction, so running this twice never emails a photo twice.
+    """
+    base_url = base_url or event.qr_base_url or settings.PHOTOBOOTH_BASE_URL
+
+    with transaction.atomic():
+        photos = list(pending_photos(event).select_for_update())
+        guests = list(group_by_guest(photos).items())
+
+        for start in range(0, len(guests), QUEUE_CHUNK_SIZE):
+            chunk = guests[start : start + QUEUE_CHUNK_SIZE]
+            mail.send_many(
+                [
+                    build_digest(event, email, guest_photos, base_url)
+                    for email, guest_photos in chunk
+                ]
+            )
+            Photo.objects.filter(
+                pk__in=[photo.pk for _, guest_photos in chunk for photo in guest_photos]
+            ).update(emailed_at=timezone.now())
+
+    return len(guests), len(photos)
@@ -0,0 +1,51 @@
+"""
+factory-boy factories for photobooth models, used by generate_dataset and
+handy in tests and the shell.
+"""
+
+import factory
+from django.utils import timezone
+
+from accounts.models import CustomUser
+
+from .models import Event, Photo, normalize_guest_email
+
+
+class UserFactory(factory.django.DjangoModelFactory):
+    class Meta:
+        model = CustomUser
+        django_get_or_create = ["email"]
+
+    email = factory.Sequence(lambda n: f"host{n}@example.com")
+    first_name = factory.Faker("first_name")
+    last_name = factory.Faker("last_name")
+    password = factory.django.Password("photobooth")
+
+
+class EventFactory(factory.django.DjangoModelFactory):
+    class Meta:
+        model = Event
+
+    class Params:
+        partner_a = factory.Faker("first_name")
+        partner_b = factory.Faker("first_name")
+
+    name = factory.LazyAttribute(lambda o: f"{o.partner_a} & {o.partner_b} Wedding")
+    date = factory.Faker(
+        "date_time_between", start_date="-1y", tzinfo=timezone.get_current_timezone()
+    )
+    created_by = factory.SubFactory(UserFactory)
+
+
+class PhotoFactory(factory.django.DjangoModelFactory):
+    class Meta:
+        model = Photo
+
+    session = factory.SubFactory(EventFactory)
+    image = factory.django.ImageField(width=64, height=48, color="gray")
+    guest_name = factory.Faker("name")
+    guest_email = factory.Faker("email")
+    guest_email_normalized = factory.LazyAttribute(
+        lambda photo: normalize_guest_email(photo.guest_email)
+    )
+    is_processed = True
@@ -0,0 +1,309 @@
+"""
+Ingest of JPEGs dropped into a directory, for tethered cameras.
+
+A watcher reports files that appeared in the directory: inotify where the
+platform has it (through ctypes, no extra dependency), otherwise a periodic
+listing. A file is only picked up once its size and mtime have held still
+for a settle time and it ends with the JPEG end-of-image marker, so files
+still being written by the tethering software are left alone.
+
+Ready files are ingested by a bounded pool of threads: each is stored and
+its row created like a browser capture, then processed (dimensions,
+thumbnail, placeholder and perceptual hash) before the file is moved to a
+"done" subdirectory, or deleted. Until then the file stays where the
+camera put it: a file that fails, say while the database is down, is
+tried again a little later, files left behind by a crash are picked up on
+the next start, and a file whose content is already in the event is not
+ingested twice.
+"""
+
+import ctypes
+import ctypes.util
+import hashlib
+import logging
+import os
+import select
+import struct
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import close_old_connections
+
+from .ingest import flush_stored, store_capture
+from .models import Photo, photo_upload_path
+from .processing import process_photo
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONS = {".jpg", ".jpeg"}
+JPEG_END = b"\xff\xd9"
+DONE_DIR = "done"
+# Seconds before a file that failed to ingest is tried again
+RETRY_DELAY = 5
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+INOTIFY_EVENT = struct.Struct("iIII")
+
+
+def is_candidate(name):
+    """Whether a file name looks like a finished camera JPEG"""
+    if name.startswith("."):
+        return False  # Temporary files of most tethering tools
+    return os.path.splitext(name)[1].lower() in EXTENSIONS
+
+
+def list_candidates(directory):
+    with os.scandir(directory) as entries:
+        return {
+            entry.name
+            for entry in entries
+            if entry.is_file(follow_symlinks=False) and is_candidate(entry.name)
+        }
+
+
+def jpeg_complete(path):
+    """Whether the file ends with the JPEG end-of-image marker"""
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        if f.tell() < len(JPEG_END):
+            return False
+        f.seek(-len(JPEG_END), os.SEEK_END)
+        return f.read() == JPEG_END
+
+
+class PollingWatcher:
+    """Lists the directory every `interval` seconds"""
+
+    def __init__(self, directory, interval=1.0):
+        self.directory = directory
+        self.interval = interval
+        self._next = 0.0
+
+    def wait(self, timeout):
+        """Names of candidate files, after waiting up to `timeout` seconds"""
+        delay = max(self._next - time.monotonic(), 0)
+        if delay > timeout:
+            time.sleep(timeout)
+            return set()
+        time.sleep(delay)
+        self._next = time.monotonic() + self.interval
+        return list_candidates(self.directory)
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """Reports files closed after writing or moved into the directory"""
+
+    def __init__(self, directory):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.directory = directory
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = IN_CLOSE_WRITE | IN_MOVED_TO
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"Cannot watch {directory}")
+
+    def wait(self, timeout):
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+        names = set()
+        overflowed = False
+        while True:
+            try:
+                buffer = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(buffer):
+                _, mask, _, length = INOTIFY_EVENT.unpack_from(buffer, offset)
+                offset += INOTIFY_EVENT.size
+                name = buffer[offset : offset + length].rstrip(b"\0")
+                offset += length
+                overflowed |= bool(mask & IN_Q_OVERFLOW)
+                if name and is_candidate(os.fsdecode(name)):
+                    names.add(os.fsdecode(name))
+        if overflowed:
+            # Events were dropped, fall back to looking at everything
+            names |= list_candidates(self.directory)
+        return names
+
+    def close(self):
+        os.close(self.fd)
+
+
+def open_watcher(directory, poll=False, interval=1.0):
+    """An inotify watcher, or a polling one where inotify is unavailable"""
+    if not poll:
+        try:
+            return InotifyWatcher(directory)
+        except (OSError, AttributeError, TypeError) as e:
+            logger.warning("inotify unavailable (%s), polling %s", e, directory)
+    return PollingWatcher(directory, interval)
+
+
+class HotFolder:
+    """
+    Watch `directory` and ingest the JPEGs that land there into `event`.
+    At most `workers` files are ingested at once and as many more queued;
+    the rest wait in the directory.
+    """
+
+    def __init__(
+        self,
+        directory,
+        event,
+        workers=4,
+        settle=0.5,
+        delete=False,
+        poll=False,
+        interval=1.0,
+    ):
+        self.directory = os.fspath(directory)
+        self.event = event
+        self.workers = workers
+        self.settle = settle
+        self.delete = delete
+        self.poll = poll
+        self.interval = interval
+        self.outcomes = Counter()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(workers * 2)
+        self._busy = set()
+        self._retries = []
+        # name -> (size, mtime, when they were first seen)
+        self._pending = {}
+        self._stop = threading.Event()
+        self._once = False
+
+    def stop(self):
+        self._stop.set()
+
+    def run(self, once=False):
+        """
+        Ingest files until stop() is called or, with `once`, until the files
+        that were there at the start are done or have failed. Returns the
+        outcomes counter.
+        """
+        self._once = once
+        os.makedirs(os.path.join(self.directory, DONE_DIR), exist_ok=True)
+        watcher = (
+            None if once else open_watcher(self.directory, self.poll, self.interval)
+        )
+        # Files dropped while the daemon was not running
+        self._seen(list_candidates(self.directory))
+        try:
+            with ThreadPoolExecutor(self.workers) as pool:
+                while not self._stop.is_set():
+                    self._requeue()
+                    self._dispatch(pool)
+                    if once:
+                        if not self._pending:
+                            break
+                        time.sleep(self.settle / 2)
+                        continue
+                    timeout = self.settle / 2 if self._pending else self.interval
+                    self._seen(watcher.wait(timeout))
+        finally:
+            if watcher is not None:
+                watcher.close()
+        return self.outcomes
+
+    def _seen(self, names):
+        now = time.monotonic()
+        for name in names:
+            if name not in self._pending and name not in self._busy:
+                self._pending[name] = (None, None, now)
+
+    def _requeue(self):
+        with self._lock:
+            retries, self._retries = self._retries, []
+        for name, due in retries:
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue
+            # Counts as settled once the delay has passed
+            settled_since = due - self.settle
+            self._pending[name] = (stat.st_size, stat.st_mtime, settled_since)
+
+    def _dispatch(self, pool):
+        now = time.monotonic()
+        for name, (size, mtime, since) in list(self._pending.items()):
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                del self._pending[name]
+                continue
+            if (stat.st_size, stat.st_mtime) != (size, mtime):
+                # Still being written, or first look: wait for it to settle
+                self._pending[name] = (stat.st_size, stat.st_mtime, now)
+                continue
+            if now - since < self.settle:
+                continue
+            if not jpeg_complete(path):
+                if self._once:
+                    # Nothing more is coming, it was cut short
+                    del self._pending[name]
+                    self.outcomes["incomplete"] += 1
+                continue
+            # Blocks while the pool is saturated, the folder is the queue
+            self._slots.acquire()
+            del self._pending[name]
+            with self._lock:
+                self._busy.add(name)
+            pool.submit(self._ingest, name)
+
+    def _ingest(self, name):
+        path = os.path.join(self.directory, name)
+        try:
+            outcome = self.ingest_file(path)
+        except Exception:
+            logger.exception("Failed to ingest %s", path)
+            outcome = "failed"
+            if not self._once:
+                with self._lock:
+                    self._retries.append((name, time.monotonic() + RETRY_DELAY))
+        finally:
+            close_old_connections()
+            with self._lock:
+                self._busy.discard(name)
+            self._slots.release()
+        with self._lock:
+            self.outcomes[outcome] += 1
+
+    def ingest_file(self, path):
+        """Store, create and process a photo for the file, then move it away"""
+        with open(path, "rb") as f:
+            data = f.read()
+        content_hash = hashlib.sha256(data).hexdigest()
+        if Photo.objects.filter(session=self.event, content_hash=content_hash).exists():
+            outcome = "duplicate"
+        else:
+            photo = Photo(session=self.event, is_processed=True)
+            name = photo_upload_path(photo, f"{photo.id}.jpg")
+            store_capture(photo, name, data)
+            # A photo that cannot be processed keeps its original, as with
+            # browser captures
+            outcome = "ingested" if process_photo(photo) else "unprocessed"
+            # The stored copy must be on disk before the source goes away
+            flush_stored([photo.image.name])
+        if self.delete:
+            os.remove(path)
+        else:
+            os.replace(
+                path, os.path.join(self.directory, DONE_DIR, os.path.basename(path))
+            )
+        return outcome
@@ -0,0 +1,55 @@
+"""
+Time-ordered UUIDs for primary keys.
+
+Random uuid4 keys put every insert on a random page of the primary key
+index. uuid7() (RFC 9562) starts with a 48-bit millisecond timestamp, so
+new rows land at the right-hand edge of the index and rows created
+together, like one event's photos, sit next to each other. Within a
+millisecond the 12-bit rand_a field is used as a counter, so keys from one
+process are strictly increasing.
+
+Existing uuid4 keys stay valid: both are plain UUIDs to the database and
+to URL patterns, only their order differs.
+"""
+
+import secrets
+import threading
+import time
+import uuid
+
+_lock = threading.Lock()
+_last_ms = 0
+_counter = 0
+
+COUNTER_MAX = 0xFFF
+
+
+def uuid7():
+    global _last_ms, _counter
+    with _lock:
+        ms = time.time_ns() // 1_000_000
+        if ms > _last_ms:
+            _last_ms = ms
+            # Start low so the counter rarely overflows into the next ms
+            _counter = secrets.randbits(10)
+        else:
+            _counter += 1
+            if _counter > COUNTER_MAX:
+                # Borrow the next millisecond rather than go backwards
+                _last_ms += 1
+                _counter = 0
+        ms, counter = _last_ms, _counter
+
+    value = (
+        (ms & 0xFFFF_FFFF_FFFF) << 80
+        | 0x7 << 76
+        | counter << 64
+        | 0b10 << 62
+        | secrets.randbits(62)
+    )
+    return uuid.UUID(int=value)
+
+
+def uuid7_timestamp(value):
+    """Creation time of a uuid7 in seconds since the epoch"""
+    return (value.int >> 80) / 1000
@@ -0,0 +1,373 @@
+"""
+Crash-safe ingest of captured photos.
+
+A capture is first appended to this process's journal under
+PHOTOBOOTH_INGEST_ROOT and fsynced. Captures arriving together share one
+fsync, so a burst costs about one disk flush rather than one per photo.
+Only then is the image written to storage and its row created, in one
+transaction and row last, so a row never points at a missing file and a
+storage error rolls the capture back instead of leaving half of it.
+
+Once its row is committed a capture is marked done in the journal, and a
+failed one aborted. Journal segments are truncated, or deleted once full or
+when the process exits, when none of their captures is in flight any more
+and the stored files have been flushed to disk. After a crash,
+recover_captures() replays what is left: captures without a row are stored
+and created, rows whose file is missing or differs from the journal are
+repaired, and captures that failed with an error, which the guest was told
+about, are skipped. Captures marked done are not created again, since
+their photo may have been deleted since, but their file is still checked:
+neither the mark nor the file is fsynced before the segment is flushed,
+and after a power loss the mark can survive the file's contents.
+"""
+
+import asyncio
+import atexit
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import struct
+import threading
+import zlib
+from collections import Counter
+from glob import glob
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .ids import uuid7
+from .models import Event, Photo, photo_upload_path
+
+logger = logging.getLogger(__name__)
+
+# Record: magic, kind, header length, data length, crc32 of header + data
+RECORD = struct.Struct(">4scIII")
+MAGIC = b"PBJ1"
+CAPTURE = b"C"
+DONE = b"D"
+ABORT = b"A"
+
+# A segment full of finished captures is truncated once it is this big,
+# and a new segment is started when one grows past SEGMENT_BYTES while
+# captures are still in flight
+CHECKPOINT_BYTES = 8 * 1024 * 1024
+SEGMENT_BYTES = 64 * 1024 * 1024
+
+
+def encode_record(kind, header, data=b""):
+    header = json.dumps(header).encode()
+    crc = zlib.crc32(data, zlib.crc32(header))
+    return RECORD.pack(MAGIC, kind, len(header), len(data), crc) + header + data
+
+
+def read_records(f):
+    """Yield (kind, header, data) up to the end or the first torn record"""
+    while True:
+        prefix = f.read(RECORD.size)
+        if len(prefix) < RECORD.size:
+            return
+        magic, kind, header_length, data_length, crc = RECORD.unpack(prefix)
+        if magic != MAGIC:
+            return
+        header = f.read(header_length)
+        data = f.read(data_length)
+        if len(data) < data_length or zlib.crc32(data, zlib.crc32(header)) != crc:
+            return
+        yield kind, json.loads(header), data
+
+
+def fsync_path(path, directory=False):
+    fd = os.open(path, os.O_RDONLY | (os.O_DIRECTORY if directory else 0))
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def flush_stored(names, storage=None):
+    """Flush stored files and their directories to disk, if they are local"""
+    storage = storage or default_storage
+    directories = set()
+    for name in names:
+        try:
+            path = storage.path(name)
+        except NotImplementedError:
+            return  # Remote storages are durable once a write returns
+        try:
+            fsync_path(path)
+        except FileNotFoundError:
+            continue  # Archived or deleted meanwhile
+        directories.add(os.path.dirname(path))
+    for directory in directories:
+        fsync_path(directory, directory=True)
+
+
+class Segment:
+    def __init__(self, root):
+        self.path = os.path.join(root, f"{uuid7()}.journal")
+        self.file = open(self.path, "ab")  # noqa: SIM115 - open for the segment lifetime
+        # Tells recovery that a live process still owns the segment
+        fcntl.flock(self.file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        fsync_path(root, directory=True)
+        self.size = 0
+        self.durable = 0
+        self.syncing = False
+        self.pending = 0
+        self.stored = []
+
+    def append(self, record):
+        self.file.write(record)
+        self.file.flush()
+        self.size += len(record)
+        return self.size
+
+    def close(self, remove=False):
+        self.file.close()
+        if remove:
+            os.remove(self.path)
+
+
+class Ticket:
+    def __init__(self, segment, photo_id):
+        self.segment = segment
+        self.photo_id = photo_id
+
+
+class Journal:
+    """The journal of one process, safe to use from several threads"""
+
+    def __init__(self, root):
+        os.makedirs(root, exist_ok=True)
+        self.root = root
+        self.pid = os.getpid()
+        self._cond = threading.Condition()
+        self._current = Segment(root)
+
+    def write(self, header, data):
+        """Append a capture and return once it is on disk"""
+        record = encode_record(CAPTURE, header, data)
+        with self._cond:
+            if self._current.size >= SEGMENT_BYTES:
+                self._current = Segment(self.root)
+            segment = self._current
+            end = segment.append(record)
+            segment.pending += 1
+            try:
+                self._sync(segment, end)
+            except BaseException:
+                self._release(segment)
+                raise
+        return Ticket(segment, header["id"])
+
+    def _sync(self, segment, end):
+        # Group commit: one thread fsyncs everything appended so far while
+        # the others wait for it, then the next one covers what came since
+        while segment.durable < end:
+            if segment.syncing:
+                self._cond.wait()
+                continue
+            segment.syncing = True
+            target = segment.size
+            self._cond.release()
+            try:
+                os.fsync(segment.file.fileno())
+            finally:
+                self._cond.acquire()
+                segment.syncing = False
+                self._cond.notify_all()
+            segment.durable = max(segment.durable, target)
+
+    def finish(self, ticket, name=None, aborted=False):
+        """Mark a capture as stored under `name`, or as failed"""
+        with self._cond:
+            segment = ticket.segment
+            # Not fsynced, and neither is the stored file until the segment
+            # is flushed: recovery checks the file of a done capture
+            kind = ABORT if aborted else DONE
+            segment.append(encode_record(kind, {"id": ticket.photo_id}))
+            if name and not aborted:
+                segment.stored.append(name)
+            self._release(segment)
+
+    def _release(self, segment):
+        segment.pending -= 1
+        if segment.pending:
+            return
+        if segment is not self._current:
+            flush_stored(segment.stored)
+            segment.close(remove=True)
+        elif segment.size >= CHECKPOINT_BYTES:
+            flush_stored(segment.stored)
+            segment.file.truncate(0)
+            segment.size = segment.durable = 0
+            segment.stored = []
+
+    def close(self):
+        """Close the current segment, and delete it if nothing is in flight"""
+        with self._cond:
+            segment = self._current
+            if segment.pending:
+                segment.close()
+                return
+            flush_stored(segment.stored)
+            segment.close(remove=True)
+
+
+_journal = None
+_journal_lock = threading.Lock()
+
+
+def get_journal():
+    global _journal
+    root = str(settings.PHOTOBOOTH_INGEST_ROOT)
+    with _journal_lock:
+        # A forked worker must not share its parent's segment
+        if _journal is None or _journal.root != root or _journal.pid != os.getpid():
+            _journal = Journal(root)
+        return _journal
+
+
+def close_journal():
+    global _journal
+    with _journal_lock:
+        if _journal is not None:
+            _journal.close()
+            _journal = None
+
+
+@atexit.register
+def _close_on_exit():
+    # A forked worker's inherited journal belongs to its parent
+    if _journal is not None and _journal.pid == os.getpid():
+        close_journal()
+
+
+def store_capture(photo, name, data):
+    """
+    Write a capture's image and create its row, in that order and in one
+    transaction. A file already stored under `name` with the right size,
+    left by an interrupted capture, is reused.
+    """
+    photo.file_size = len(data)
+    photo.content_hash = hashlib.sha256(data).hexdigest()
+    with transaction.atomic():
+        if default_storage.exists(name) and default_storage.size(name) == len(data):
+            photo.image.name = name
+        else:
+            photo.image.name = default_storage.save(name, ContentFile(data))
+        try:
+            photo.save(force_insert=True)
+        except BaseException:
+            default_storage.delete(photo.image.name)
+            raise
+    return photo
+
+
+async def ingest_capture(photo, ext, data):
+    """Journal, store and create a new photo for the captured `data`"""
+    name = photo_upload_path(photo, f"{photo.id}.{ext}")
+    header = {
+        "id": str(photo.id),
+        "event": str(photo.session_id),
+        "name": name,
+        "guest_name": photo.guest_name,
+        "guest_email": photo.guest_email,
+        "taken_at": timezone.now().isoformat(),
+    }
+    journal = get_journal()
+    ticket = await asyncio.to_thread(journal.write, header, data)
+    stored = False
+    try:
+        await sync_to_async(store_capture)(photo, name, data)
+        stored = True
+    finally:
+        await asyncio.to_thread(journal.finish, ticket, name, not stored)
+    return photo
+
+
+def _stored_intact(name, data):
+    if not default_storage.exists(name) or default_storage.size(name) != len(data):
+        return False
+    with default_storage.open(name, "rb") as f:
+        return f.read() == data
+
+
+def _repair(photo, data):
+    """Rewrite a hot photo's file from the journal unless it is intact"""
+    name = photo.image.name
+    if photo.tier != Photo.TIER_HOT or _stored_intact(name, data):
+        return "complete", None
+    default_storage.delete(name)
+    if default_storage.save(name, ContentFile(data)) != name:
+        raise OSError(f"Could not restore {name}")
+    return "repaired", name
+
+
+def _replay(header, data, done=False):
+    photo = Photo.objects.filter(pk=header["id"]).first()
+    if photo is not None:
+        return _repair(photo, data)
+    if done:
+        # Deleted since it was stored
+        return "complete", None
+
+    if not Event.objects.filter(pk=header["event"]).exists():
+        return "discarded", None
+    photo = Photo(
+        id=header["id"],
+        session_id=header["event"],
+        guest_name=header["guest_name"],
+        guest_email=header["guest_email"],
+        is_processed=True,
+    )
+    store_capture(photo, header["name"], data)
+    # auto_now_add stamped the replay time
+    Photo.objects.filter(pk=photo.pk).update(
+        taken_at=parse_datetime(header["taken_at"])
+    )
+    return "replayed", photo.image.name
+
+
+def recover_captures(root=None, on_replayed=None):
+    """
+    Replay the journal segments no live process owns and delete them.
+    Returns a Counter of outcomes; `on_replayed` is called with the id of
+    each photo that was created.
+    """
+    root = str(root or settings.PHOTOBOOTH_INGEST_ROOT)
+    outcomes = Counter()
+    for path in sorted(glob(os.path.join(root, "*.journal"))):
+        with open(path, "rb") as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                outcomes["live segments"] += 1
+                continue
+            records = list(read_records(f))
+            aborted = {header["id"] for kind, header, _ in records if kind == ABORT}
+            done = {header["id"] for kind, header, _ in records if kind == DONE}
+
+            stored = []
+            for kind, header, data in records:
+                if kind != CAPTURE:
+                    continue
+                if header["id"] in aborted:
+                    outcomes["failed"] += 1
+                    continue
+                outcome, name = _replay(header, data, done=header["id"] in done)
+                outcomes[outcome] += 1
+                if name:
+                    stored.append(name)
+                if outcome == "replayed" and on_replayed:
+                    on_replayed(header["id"])
+            flush_stored(stored)
+        os.remove(path)
+        logger.info("Recovered journal segment %s", path)
+    return outcomes
@@ -0,0 +1,195 @@
+"""
+Reconcile the photos tree of the default storage with the Photo table.
+
+Both sides are produced in the same order, by storage name, and
+merge-joined, so a scan holds a few event directories and one chunk of
+rows in memory at a time however many photos there are. Event directories
+are listed, and their files hashed when asked, by a pool of threads a few
+directories ahead of the join.
+"""
+
+import hashlib
+import heapq
+import os
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection
+from django.db.models import F
+from django.db.models.functions import Collate
+
+from .models import Photo
+
+PHOTOS_DIR = "photos"
+HASH_CHUNK_SIZE = 1024 * 1024
+
+ORPHAN = "orphan"
+MISSING = "missing"
+SIZE_MISMATCH = "size mismatch"
+HASH_MISMATCH = "hash mismatch"
+UNRECORDED = "unrecorded"
+
+# Collations that compare like Python strings, so both sides agree on order
+BINARY_COLLATIONS = {"postgresql": "C", "sqlite": "BINARY", "mysql": "utf8mb4_bin"}
+
+FileEntry = namedtuple("FileEntry", "name size mtime sha256")
+Reference = namedtuple("Reference", "name photo_id field tier size sha256")
+Issue = namedtuple("Issue", "kind name photo_id field size sha256")
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _sort_key(entry):
+    # A directory sorts as "name/", so its files come out in full-name order
+    return entry.name + "/" if entry.is_dir(follow_symlinks=False) else entry.name
+
+
+def _file_entry(entry, name, hashes):
+    stat = entry.stat(follow_symlinks=False)
+    sha256 = file_sha256(entry.path) if hashes else None
+    return FileEntry(name, stat.st_size, stat.st_mtime, sha256)
+
+
+def _file_entries(entry, name, hashes):
+    return [_file_entry(entry, name, hashes)]
+
+
+def list_directory(path, prefix, hashes=False):
+    """Files below `path`, sorted by storage name"""
+    with os.scandir(path) as entries:
+        entries = sorted(entries, key=_sort_key)
+    files = []
+    for entry in entries:
+        name = f"{prefix}/{entry.name}"
+        if entry.is_dir(follow_symlinks=False):
+            files.extend(list_directory(entry.path, name, hashes))
+        elif entry.is_file(follow_symlinks=False):
+            files.append(_file_entry(entry, name, hashes))
+    return files
+
+
+def walk_files(root, workers=8, hashes=False):
+    """Yield a FileEntry for every file under root/photos, by name"""
+    top = os.path.join(root, PHOTOS_DIR)
+    try:
+        with os.scandir(top) as entries:
+            entries = sorted(entries, key=_sort_key)
+    except FileNotFoundError:
+        return
+
+    with ThreadPoolExecutor(workers) as pool:
+        pending = deque()
+        for entry in entries:
+            name = f"{PHOTOS_DIR}/{entry.name}"
+            if entry.is_dir(follow_symlinks=False):
+                pending.append(pool.submit(list_directory, entry.path, name, hashes))
+            elif entry.is_file(follow_symlinks=False):
+                pending.append(pool.submit(_file_entries, entry, name, hashes))
+            # Keep the pool busy without listing the whole tree up front
+            while len(pending) > workers * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def binary_order(field):
+    collation = BINARY_COLLATIONS.get(connection.vendor)
+    return (Collate(F(field), collation) if collation else F(field)).asc()
+
+
+def iter_references(chunk_size=2000):
+    """Yield a Reference for every original and thumbnail name, by name"""
+    prefix = f"{PHOTOS_DIR}/"
+    images = (
+        Photo.objects.filter(image__startswith=prefix)
+        .order_by(binary_order("image"))
+        .values_list("image", "pk", "tier", "file_size", "content_hash")
+        .iterator(chunk_size=chunk_size)
+    )
+    thumbnails = (
+        Photo.objects.filter(thumbnail__startswith=prefix)
+        .order_by(binary_order("thumbnail"))
+        .values_list("thumbnail", "pk")
+        .iterator(chunk_size=chunk_size)
+    )
+    return heapq.merge(
+        (
+            Reference(name, pk, "image", tier, size, sha256)
+            for name, pk, tier, size, sha256 in images
+        ),
+        # Archiving prunes thumbnails, so every one left is on the hot tier
+        (
+            Reference(name, pk, "thumbnail", Photo.TIER_HOT, None, "")
+            for name, pk in thumbnails
+        ),
+        key=lambda reference: reference.name,
+    )
+
+
+def _check(reference, file, hashes):
+    if reference.field != "image" or reference.tier != Photo.TIER_HOT:
+        return None
+    if reference.size is None:
+        return UNRECORDED
+    if reference.size != file.size:
+        return SIZE_MISMATCH
+    if hashes and reference.sha256 and reference.sha256 != file.sha256:
+        return HASH_MISMATCH
+    return None
+
+
+def scan(root, workers=8, hashes=False, modified_before=None):
+    """
+    Yield an Issue for every file without a row, every row whose file is
+    missing or differs from what was recorded at capture, and every
+    original whose size (and hash) was never recorded.
+
+    Files modified after `modified_before` (a timestamp) are never orphans,
+    they may belong to a capture whose row is not committed yet. Originals
+    of photos on the cold tier or in a pack are not expected on disk.
+    """
+    files = walk_files(root, workers, hashes)
+    references = iter_references()
+    file = next(files, None)
+    reference = next(references, None)
+    referenced = False
+
+    while file is not None or reference is not None:
+        if reference is None or (file is not None and file.name < reference.name):
+            if not referenced and (
+                modified_before is None or file.mtime < modified_before
+            ):
+                yield Issue(ORPHAN, file.name, None, None, file.size, file.sha256)
+            file = next(files, None)
+            referenced = False
+        elif file is None or reference.name < file.name:
+            if reference.tier == Photo.TIER_HOT:
+                yield Issue(
+                    MISSING,
+                    reference.name,
+                    reference.photo_id,
+                    reference.field,
+                    None,
+                    None,
+                )
+            reference = next(references, None)
+        else:
+            kind = _check(reference, file, hashes)
+            if kind:
+                yield Issue(
+                    kind,
+                    file.name,
+                    reference.photo_id,
+                    reference.field,
+                    file.size,
+                    file.sha256,
+                )
+            # The file may be shared by more rows, move on from it later
+            referenced = True
+            reference = next(references, None)
@@ -0,0 +1,46 @@
+import os
+import time
+
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.template.defaultfilters import filesizeformat
+
+from photobooth.backups import create_snapshot, list_snapshots
+
+
+class Command(BaseCommand):
+    help = (
+        "Snapshot MEDIA_ROOT/photos, the cold tier and the packs to the backup "
+        "storage, copying only files that are new or changed since the last "
+        "snapshot"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=(os.cpu_count() or 4) * 2,
+            help="Threads listing, hashing and copying files",
+        )
+        parser.add_argument(
+            "--list", action="store_true", help="List snapshots and exit"
+        )
+
+    def handle(self, *args, **options):
+        if options["list"]:
+            for snapshot_id in list_snapshots():
+                self.stdout.write(snapshot_id)
+            return
+        if not isinstance(default_storage, FileSystemStorage):
+            raise CommandError("Only local media storage can be backed up")
+
+        started = time.perf_counter()
+        snapshot_id, stats = create_snapshot(workers=options["workers"])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Snapshot {snapshot_id}: {stats['files']} files, "
+                f"{stats['hashed']} new or changed, {stats['copied']} copied "
+                f"({filesizeformat(stats['copied_bytes'])}) in {elapsed:.1f}s"
+            )
+        )
@@ -0,0 +1,257 @@
+import base64
+import math
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.staticfiles.handlers import StaticFilesHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.testcases import LiveServerThread
+from django.test.utils import (
+    override_settings,
+    setup_test_environment,
+    teardown_test_environment,
+)
+from django.urls import reverse
+
+from photobooth.benchmarking import (
+    compare_to_baseline,
+    load_baseline,
+    peak_rss_kb,
+    run_metadata,
+    summarize_latencies,
+    synthetic_jpeg,
+    write_results,
+)
+from photobooth.models import Event, Photo, photo_upload_path
+from photobooth.views import EventGalleryView
+
+# Scenario -> {endpoint: weight}; endpoints are photobooth URL names
+SCENARIOS = {
+    "capture_burst": {"capture_photo": 8, "event_info": 2},
+    "gallery_storm": {"event_gallery": 7, "event_info": 2, "event_gallery_qr": 1},
+    "mass_download": {"photo_download": 9, "photo_qr": 1},
+    "qr_fetch": {"photo_qr": 6, "event_gallery_qr": 4},
+}
+
+
+class Workload:
+    """Builds requests for each endpoint against the seeded data"""
+
+    def __init__(self, events, photos, capture_payload, gallery_pages):
+        self.events = events
+        self.photos = photos
+        self.capture_payload = capture_payload
+        self.gallery_pages = gallery_pages
+
+    def request(self, endpoint, rng):
+        event_id = rng.choice(self.events)
+        if endpoint == "capture_photo":
+            payload = {"image": self.capture_payload, "event_id": str(event_id)}
+            return "POST", reverse("photobooth:capture_photo"), payload
+        if endpoint == "event_gallery":
+            url = reverse("photobooth:event_gallery", kwargs={"event_id": event_id})
+            # Most guests stay on the first pages
+            page = min(int(rng.expovariate(0.7)) + 1, self.gallery_pages)
+            return "GET", f"{url}?page={page}", None
+        if endpoint == "event_info":
+            return "GET", reverse("photobooth:event_info", args=[event_id]), None
+        if endpoint == "event_gallery_qr":
+            return "GET", reverse("photobooth:event_gallery_qr", args=[event_id]), None
+        photo_id = rng.choice(self.photos)
+        return "GET", reverse(f"photobooth:{endpoint}", args=[photo_id]), None
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test the capture, gallery, download and QR endpoints against a "
+        "local test server and report latency percentiles as JSON"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scenario",
+            action="append",
+            choices=sorted(SCENARIOS),
+            help="Scenario to run (repeatable, default: all)",
+        )
+        parser.add_argument("--events", type=int, default=3)
+        parser.add_argument(
+            "--photos", type=int, default=200, help="Seeded photos per event"
+        )
+        parser.add_argument(
+            "--requests", type=int, default=300, help="Requests per scenario"
+        )
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument("--seed", type=int, default=1234)
+        parser.add_argument("--output", type=str, help="Write JSON results here")
+        parser.add_argument(
+            "--baseline", type=str, help="Fail if results regress against this JSON"
+        )
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.1,
+            help="Allowed relative regression against the baseline",
+        )
+        parser.add_argument(
+            "--migrate",
+            action="store_true",
+            help="Build the test database from migrations instead of the models",
+        )
+
+    def handle(self, *args, **options):
+        scenarios = options["scenario"] or sorted(SCENARIOS)
+        media_root = tempfile.mkdtemp(prefix="bench_media_")
+        test_settings = connection.settings_dict.setdefault("TEST", {})
+        test_settings["MIGRATE"] = options["migrate"]
+        if connection.vendor == "sqlite":
+            # The server thread needs to see the same database file
+            test_settings["NAME"] = os.path.join(media_root, "bench.sqlite3")
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            with override_settings(
+                MEDIA_ROOT=media_root,
+                DEBUG=False,
+                ALLOWED_HOSTS=["localhost", "127.0.0.1"],
+                # Don't require collectstatic just to render templates
+                STORAGES={
+                    **settings.STORAGES,
+                    "staticfiles": {
+                        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"
+                    },
+                },
+                MIDDLEWARE=[
+                    "photobooth.benchmarking.BenchmarkMiddleware",
+                    *settings.MIDDLEWARE,
+                ],
+            ):
+                workload = self.seed(options)
+                results = self.run_scenarios(scenarios, workload, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            shutil.rmtree(media_root, ignore_errors=True)
+
+        report = {
+            "meta": run_metadata(
+                events=options["events"],
+                photos_per_event=options["photos"],
+                requests_per_scenario=options["requests"],
+                concurrency=options["concurrency"],
+                peak_rss_kb=peak_rss_kb(),
+            ),
+            "results": results,
+        }
+        write_results(report, options["output"], self.stdout)
+
+        if options["baseline"]:
+            baseline = load_baseline(options["baseline"])["results"]
+            regressions = compare_to_baseline(results, baseline, options["tolerance"])
+            if regressions:
+                raise CommandError(
+                    "Regressions against baseline:\n" + "\n".join(regressions)
+                )
+            self.stderr.write(self.style.SUCCESS("No regressions against baseline"))
+
+    def seed(self, options):
+        owner = get_user_model().objects.create_user(
+            email="bench@example.com", password="bench"
+        )
+        original = synthetic_jpeg(1280, 960, options["seed"])
+        event_ids, photo_ids = [], []
+
+        for index in range(options["events"]):
+            event = Event.objects.create(name=f"Bench Event {index}", created_by=owner)
+            photos = [
+                Photo(session=event, is_processed=True)
+                for _ in range(options["photos"])
+            ]
+            for photo in photos:
+                photo.image.name = photo_upload_path(photo, "bench.jpg")
+                path = os.path.join(settings.MEDIA_ROOT, photo.image.name)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "wb") as f:
+                    f.write(original)
+            Photo.objects.bulk_create(photos, batch_size=500)
+            event_ids.append(event.id)
+            photo_ids.extend(photo.id for photo in photos)
+
+        capture = synthetic_jpeg(1280, 720, options["seed"] + 1)
+        payload = "data:image/jpeg;base64," + base64.b64encode(capture).decode()
+        pages = max(1, math.ceil(options["photos"] / EventGalleryView.paginate_by))
+        return Workload(event_ids, photo_ids, payload, pages)
+
+    def run_scenarios(self, scenarios, workload, options):
+        server = LiveServerThread("localhost", StaticFilesHandler)
+        server.daemon = True
+        server.start()
+        server.is_ready.wait()
+        if server.error:
+            raise CommandError(f"Could not start test server: {server.error}")
+
+        base_url = f"http://localhost:{server.port}"
+        try:
+            return {
+                name: self.run_scenario(name, base_url, workload, options)
+                for name in scenarios
+            }
+        finally:
+            server.terminate()
+
+    def run_scenario(self, name, base_url, workload, options):
+        mix = SCENARIOS[name]
+        plan_rng = random.Random(f"{options['seed']}-{name}")
+        plan = plan_rng.choices(
+            list(mix), weights=list(mix.values()), k=options["requests"]
+        )
+        local = threading.local()
+
+        def fire(endpoint):
+            if not hasattr(local, "session"):
+                local.session = requests.Session()
+                local.rng = random.Random(f"{name}-{threading.get_ident()}")
+            method, path, payload = workload.request(endpoint, local.rng)
+            started = time.perf_counter()
+            response = local.session.request(method, base_url + path, json=payload)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            return (
+                endpoint,
+                elapsed_ms,
+                response.status_code < 400,
+                int(response.headers.get("X-Bench-Queries", 0)),
+                int(response.headers.get("X-Bench-Rss-Kb", 0)),
+            )
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(options["concurrency"]) as pool:
+            samples = list(pool.map(fire, plan))
+        elapsed = time.perf_counter() - started
+
+        by_endpoint = defaultdict(list)
+        for sample in samples:
+            by_endpoint[sample[0]].append(sample)
+
+        results = {}
+        for endpoint, entries in sorted(by_endpoint.items()):
+            queries = [entry[3] for entry in entries]
+            results[endpoint] = {
+                **summarize_latencies([entry[1] for entry in entries], elapsed),
+                "errors": sum(1 for entry in entries if not entry[2]),
+                "queries_mean": round(sum(queries) / len(queries), 2),
+                "queries_max": max(queries),
+                "peak_rss_kb": max(entry[4] for entry in entries),
+            }
+        self.stderr.write(f"{name}: {len(samples)} requests in {elapsed:.2f}s")
+        return results
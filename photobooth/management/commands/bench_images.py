@@ -0,0 +1,218 @@
+import base64
+import os
+import shutil
+import statistics
+import tempfile
+import time
+from io import BytesIO
+
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image
+
+from photobooth.benchmarking import (
+    compare_to_baseline,
+    current_rss_kb,
+    high_water_rss_kb,
+    load_baseline,
+    peak_rss_kb,
+    percentile,
+    reset_peak_rss,
+    run_metadata,
+    synthetic_jpeg,
+    write_results,
+)
+from photobooth.processing import (
+    decode_data_url,
+    dhash,
+    encode_jpeg,
+    make_thumbnail,
+)
+from photobooth.qr import render_qr_png
+
+RESOLUTIONS = {
+    "vga": (640, 480),
+    "hd": (1280, 720),
+    "fhd": (1920, 1080),
+    "12mp": (4000, 3000),
+}
+
+
+def capture_decode(sample):
+    """The base64 decode capture_photo does for every upload"""
+    decode_data_url(sample["data_url"])
+
+
+def thumbnail(sample):
+    with Image.open(BytesIO(sample["jpeg"])) as image:
+        encode_jpeg(make_thumbnail(image))
+
+
+def perceptual_hash(sample):
+    """process_photo hashes the thumbnail, not the original"""
+    dhash(sample["thumbnail"])
+
+
+def full_processing(sample):
+    """Everything process_photo does apart from storage and DB writes"""
+    with Image.open(BytesIO(sample["jpeg"])) as image:
+        rendition = make_thumbnail(image)
+    dhash(rendition)
+    encode_jpeg(rendition)
+
+
+def qr_render(sample):
+    render_qr_png(sample["url"])
+
+
+def export_copy(sample):
+    shutil.copy2(sample["path"], sample["path"] + ".export")
+
+
+CASES = {
+    "capture_decode": capture_decode,
+    "thumbnail": thumbnail,
+    "perceptual_hash": perceptual_hash,
+    "full_processing": full_processing,
+    "qr_render": qr_render,
+    "export_copy": export_copy,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the Pillow image paths on synthetic photos and report time "
+        "and resident memory per image as JSON"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--case",
+            action="append",
+            choices=sorted(CASES),
+            help="Case to run (repeatable, default: all)",
+        )
+        parser.add_argument(
+            "--resolution",
+            action="append",
+            choices=sorted(RESOLUTIONS),
+            help="Corpus resolution (repeatable, default: all)",
+        )
+        parser.add_argument(
+            "--images", type=int, default=5, help="Synthetic images per resolution"
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=3, help="Timed passes over each corpus"
+        )
+        parser.add_argument("--seed", type=int, default=1234)
+        parser.add_argument("--output", type=str, help="Write JSON results here")
+        parser.add_argument(
+            "--baseline", type=str, help="Fail if results regress against this JSON"
+        )
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.1,
+            help="Allowed relative regression against the baseline",
+        )
+
+    def handle(self, *args, **options):
+        cases = options["case"] or list(CASES)
+        resolutions = options["resolution"] or list(RESOLUTIONS)
+        workdir = tempfile.mkdtemp(prefix="bench_images_")
+
+        results = {case: {} for case in cases}
+        try:
+            for resolution in resolutions:
+                corpus = self.build_corpus(resolution, workdir, options)
+                for case in cases:
+                    results[case][resolution] = self.measure(
+                        CASES[case], corpus, options["repeat"]
+                    )
+                    self.stderr.write(
+                        f"{case}/{resolution}: "
+                        f"{results[case][resolution]['ms_per_image']} ms per image"
+                    )
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        report = {
+            "meta": run_metadata(
+                images_per_resolution=options["images"],
+                repeat=options["repeat"],
+                pillow=Image.__version__,
+                peak_rss_kb=peak_rss_kb(),
+            ),
+            "results": results,
+        }
+        write_results(report, options["output"], self.stdout)
+
+        if options["baseline"]:
+            baseline = load_baseline(options["baseline"])["results"]
+            regressions = compare_to_baseline(results, baseline, options["tolerance"])
+            if regressions:
+                raise CommandError(
+                    "Regressions against baseline:\n" + "\n".join(regressions)
+                )
+            self.stderr.write(self.style.SUCCESS("No regressions against baseline"))
+
+    def build_corpus(self, resolution, workdir, options):
+        width, height = RESOLUTIONS[resolution]
+        corpus = []
+        for index in range(options["images"]):
+            jpeg = synthetic_jpeg(
+                width, height, f"{options['seed']}-{resolution}-{index}"
+            )
+            with Image.open(BytesIO(jpeg)) as image:
+                rendition = make_thumbnail(image)
+            path = os.path.join(workdir, f"{resolution}-{index}.jpg")
+            with open(path, "wb") as f:
+                f.write(jpeg)
+            corpus.append(
+                {
+                    "jpeg": jpeg,
+                    "thumbnail": rendition,
+                    "path": path,
+                    "data_url": "data:image/jpeg;base64,"
+                    + base64.b64encode(jpeg).decode(),
+                    "url": f"https://booth.example.com/photobooth/download/{index:032x}/",
+                }
+            )
+        return corpus
+
+    def measure(self, case, corpus, repeat):
+        # Warm up caches and lazy imports outside the measurements
+        case(corpus[0])
+
+        timings = []
+        for _ in range(repeat):
+            for sample in corpus:
+                started = time.perf_counter()
+                case(sample)
+                timings.append((time.perf_counter() - started) * 1000)
+
+        # Resident memory counts Pillow's native image buffers, which
+        # tracemalloc does not see. Where the peak cannot be reset, as off
+        # Linux, memory is left out of the results.
+        growth = []
+        for sample in corpus:
+            if not reset_peak_rss():
+                break
+            before = current_rss_kb()
+            case(sample)
+            peak = high_water_rss_kb()
+            if peak is None:
+                break
+            growth.append(max(0, peak - before))
+
+        result = {
+            "images": len(corpus),
+            "input_kb": round(
+                statistics.mean(len(s["jpeg"]) for s in corpus) / 1024, 1
+            ),
+            "ms_per_image": round(statistics.mean(timings), 3),
+            "p95_ms": round(percentile(sorted(timings), 95), 3),
+        }
+        if len(growth) == len(corpus):
+            result["rss_kb_per_image"] = round(statistics.mean(growth), 1)
+            result["peak_rss_growth_kb"] = max(growth)
+        return result
@@ -0,0 +1,193 @@
+import json
+import time
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from photobooth.benchmarking import run_metadata, write_results
+from photobooth.models import Event, Photo
+from photobooth.partitions import (
+    add_months,
+    convert_photo_table,
+    detach_partition,
+    list_partitions,
+    month_of,
+    month_start,
+    partition_name,
+)
+
+
+def summarize_plan(plan):
+    """Timing, cost, buffers and scanned relations of an EXPLAIN JSON plan"""
+    root = plan["Plan"]
+    relations = set()
+    nodes = []
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        nodes.append(node["Node Type"])
+        if "Relation Name" in node:
+            relations.add(node["Relation Name"])
+        stack.extend(node.get("Plans", []))
+    return {
+        "planning_ms": round(plan.get("Planning Time", 0.0), 2),
+        "execution_ms": round(plan.get("Execution Time", 0.0), 2),
+        "total_cost": root["Total Cost"],
+        "buffers": root.get("Shared Hit Blocks", 0) + root.get("Shared Read Blocks", 0),
+        "relations_scanned": len(relations),
+        "nodes": sorted(set(nodes)),
+    }
+
+
+def explain(sql, params=()):
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    # psycopg decodes json columns, EXPLAIN output is plain text
+    return summarize_plan((json.loads(plan) if isinstance(plan, str) else plan)[0])
+
+
+def explain_queryset(queryset):
+    return explain(*queryset.query.sql_with_params())
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare query plans and retention cost of the photo table before and "
+        "after monthly partitioning, on a scratch PostgreSQL test database"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--events", type=int, default=200)
+        parser.add_argument("--photos", type=int, default=200_000)
+        parser.add_argument(
+            "--retain",
+            type=int,
+            default=6,
+            help="Months kept by the retention step (default: 6)",
+        )
+        parser.add_argument("--seed", type=int, default=1234)
+        parser.add_argument("--output", type=str, help="Write JSON results here")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("Partitioning needs PostgreSQL")
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+        try:
+            call_command(
+                "generate_dataset",
+                events=options["events"],
+                photos=options["photos"],
+                no_files=True,
+                seed=options["seed"],
+                stdout=StringIO(),
+                stderr=StringIO(),
+            )
+            with connection.cursor() as cursor:
+                cursor.execute(f"ANALYZE {Photo._meta.db_table}")
+            newest = month_of(Event.objects.latest("date").date)
+            cutoff = month_start(add_months(newest, -options["retain"]))
+            results = {"unpartitioned": self.measure(cutoff, partitioned=False)}
+            started = time.perf_counter()
+            convert_photo_table(ahead=0)
+            self.stderr.write(
+                f"Converted in {time.perf_counter() - started:.1f}s, "
+                f"{len(list_partitions())} partitions"
+            )
+            results["partitioned"] = self.measure(cutoff, partitioned=True)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        report = {
+            "meta": run_metadata(
+                events=options["events"],
+                photos=options["photos"],
+                retain_months=options["retain"],
+            ),
+            "results": results,
+        }
+        write_results(report, options["output"], self.stdout)
+        self.report(results)
+
+    def queries(self, cutoff):
+        """The app's own queries, on the largest event and the newest month"""
+        event_id = (
+            Photo.objects.values("session")
+            .annotate(n=Count("id"))
+            .order_by("-n")
+            .values_list("session", flat=True)[0]
+        )
+        newest = Photo.objects.order_by("-taken_at").first()
+        month = month_of(newest.taken_at)
+        in_month = Photo.objects.filter(
+            taken_at__gte=month_start(month),
+            taken_at__lt=month_start(add_months(month, 1)),
+        )
+        return {
+            "event_gallery": Photo.objects.filter(session=event_id)[:24],
+            "event_count": Photo.objects.filter(session=event_id)
+            .values("session")
+            .annotate(n=Count("id")),
+            "month_activity": in_month.values("session").annotate(n=Count("id")),
+            "photo_by_id": Photo.objects.filter(pk=newest.pk),
+            "expired_count": Photo.objects.filter(taken_at__lt=cutoff)
+            .values("is_processed")
+            .annotate(n=Count("id")),
+        }
+
+    def measure(self, cutoff, partitioned):
+        results = {
+            name: explain_queryset(queryset)
+            for name, queryset in self.queries(cutoff).items()
+        }
+        expired = []
+        if partitioned:
+            expired = [
+                partition.month
+                for partition in list_partitions()
+                if partition.month and month_start(partition.month) < cutoff
+            ]
+        quote = connection.ops.quote_name
+
+        # Measured and rolled back, so both layouts start from the same data
+        with transaction.atomic(), connection.cursor() as cursor:
+            started = time.perf_counter()
+            for month in expired:
+                detach_partition(month)
+                cursor.execute(f"DROP TABLE {quote(partition_name(month))}")
+            # Without partitions, and for rows left in the default partition
+            cursor.execute(
+                f"DELETE FROM {quote(Photo._meta.db_table)} WHERE taken_at < %s",
+                [cutoff],
+            )
+            results["retention"] = {
+                "execution_ms": round((time.perf_counter() - started) * 1000, 2),
+                # Rows in dropped partitions are not counted
+                "rows_deleted": cursor.rowcount,
+                "partitions_dropped": len(expired),
+            }
+            transaction.set_rollback(True)
+        return results
+
+    def report(self, results):
+        before, after = results["unpartitioned"], results["partitioned"]
+        self.stderr.write(
+            f"\n{'query':<16} {'before ms':>10} {'after ms':>10} "
+            f"{'before bufs':>12} {'after bufs':>11} {'relations':>10}"
+        )
+        for name in before:
+            old, new = before[name], after[name]
+            self.stderr.write(
+                f"{name:<16} {old['execution_ms']:>10} {new['execution_ms']:>10} "
+                f"{old.get('buffers', '-'):>12} {new.get('buffers', '-'):>11} "
+                f"{new.get('relations_scanned', '-'):>10}"
+            )
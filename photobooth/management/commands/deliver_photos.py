@@ -0,0 +1,43 @@
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from photobooth.delivery import queue_event_deliveries
+from photobooth.models import Event
+
+
+class Command(BaseCommand):
+    help = "Email guests the photos they took at an event"
+
+    def add_arguments(self, parser):
+        parser.add_argument("event_id", type=str, help="Event UUID to deliver")
+        parser.add_argument(
+            "--base-url",
+            type=str,
+            help="Site URL used in email links (default: event QR base URL)",
+        )
+        parser.add_argument(
+            "--send",
+            action="store_true",
+            help="Send the queue right away instead of waiting for send_queued_mail",
+        )
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=1,
+            help="Sending processes when used with --send",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            event = Event.objects.get(id=options["event_id"])
+        except (Event.DoesNotExist, ValidationError):
+            raise CommandError(f"Event {options['event_id']} not found")
+
+        guests, photos = queue_event_deliveries(event, base_url=options["base_url"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Queued {photos} photos for {guests} guests")
+        )
+
+        if options["send"] and guests:
+            call_command("send_queued_mail", processes=options["processes"])
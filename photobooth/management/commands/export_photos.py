@@ -4,6 +4,7 @@ import shutil
 from django.core.management.base import BaseCommand
 
 from photobooth.models import Photo
+from photobooth.tiering import open_original
 
 
 class Command(BaseCommand):
@@ -43,7 +44,7 @@ class Command(BaseCommand):
         # Export photos
         exported_count = 0
         for i, photo in enumerate(photos, 1):
-            if photo.image and os.path.exists(photo.image.path):
+            if photo.image:
                 # Generate filename
                 if include_metadata:
                     guest_name = (
@@ -57,10 +58,14 @@ class Command(BaseCommand):
                         f"photo_{i:04d}_{photo.taken_at.strftime('%Y%m%d_%H%M%S')}.jpg"
                     )
 
-                # Copy file
-                src = photo.image.path
+                # Copy file, reading archived originals from the cold tier
+                try:
+                    src, _ = open_original(photo, recall=False)
+                except FileNotFoundError:
+                    continue
                 dst = os.path.join(output_dir, filename)
-                shutil.copy2(src, dst)
+                with src, open(dst, "wb") as out:
+                    shutil.copyfileobj(src, out)
                 exported_count += 1
 
                 self.stdout.write(f"Exported: {filename}")
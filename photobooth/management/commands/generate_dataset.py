@@ -0,0 +1,239 @@
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import factory.random
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from faker import Faker
+
+from photobooth.benchmarking import synthetic_jpeg
+from photobooth.factories import EventFactory, UserFactory
+from photobooth.models import Event, Photo, normalize_guest_email, photo_upload_path
+from photobooth.similarity import split_hash, to_signed
+
+DEFAULT_SIZES = "160x120:80,640x480:18,1920x1080:2"
+
+
+def parse_sizes(value):
+    """Parse "WxH:weight,..." into [((width, height), weight), ...]"""
+    sizes = []
+    try:
+        for item in value.split(","):
+            dimensions, _, weight = item.partition(":")
+            width, height = dimensions.lower().split("x")
+            sizes.append(((int(width), int(height)), float(weight or 1)))
+    except ValueError:
+        raise CommandError(f"Invalid --sizes value {value!r}, expected WxH:weight,...")
+    return sizes
+
+
+def split_total(total, weights):
+    """Split `total` into integer shares proportional to `weights`"""
+    scale = total / sum(weights)
+    shares = [int(weight * scale) for weight in weights]
+    remainders = sorted(
+        range(len(weights)),
+        key=lambda index: weights[index] * scale - shares[index],
+        reverse=True,
+    )
+    for index in remainders[: total - sum(shares)]:
+        shares[index] += 1
+    return shares
+
+
+def write_files(files):
+    for path, data in files:
+        with open(path, "wb") as f:
+            f.write(data)
+
+
+def copy_photos(photos):
+    """Insert photos with PostgreSQL COPY, much faster than multi-row INSERTs"""
+    fields = Photo._meta.concrete_fields
+    columns = ", ".join(connection.ops.quote_name(field.column) for field in fields)
+    table = connection.ops.quote_name(Photo._meta.db_table)
+    with (
+        connection.cursor() as cursor,
+        cursor.copy(f"COPY {table} ({columns}) FROM STDIN") as copy,
+    ):
+        for photo in photos:
+            copy.write_row(
+                [
+                    field.get_db_prep_save(getattr(photo, field.attname), connection)
+                    for field in fields
+                ]
+            )
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the database and media storage with synthetic events and photos "
+        "for load and scaling tests"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--events", type=int, default=100)
+        parser.add_argument(
+            "--photos",
+            type=int,
+            default=100_000,
+            help="Total photos, spread unevenly over the events",
+        )
+        parser.add_argument(
+            "--users", type=int, default=10, help="Event owners to spread events over"
+        )
+        parser.add_argument(
+            "--guests", type=int, default=80, help="Distinct guests per event"
+        )
+        parser.add_argument(
+            "--guest-ratio",
+            type=float,
+            default=0.6,
+            help="Share of photos that carry a guest name and email",
+        )
+        parser.add_argument(
+            "--sizes",
+            type=parse_sizes,
+            default=DEFAULT_SIZES,
+            help=f"Placeholder image sizes and weights (default: {DEFAULT_SIZES})",
+        )
+        parser.add_argument(
+            "--variants",
+            type=int,
+            default=4,
+            help="Distinct placeholder images rendered per size",
+        )
+        parser.add_argument(
+            "--no-files",
+            action="store_true",
+            help="Only insert rows, don't write placeholder image files",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 4,
+            help="Threads writing placeholder files",
+        )
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--seed", type=int, default=1234)
+
+    def handle(self, *args, **options):
+        if not options["no_files"] and not isinstance(
+            default_storage, FileSystemStorage
+        ):
+            raise CommandError(
+                "Placeholder files can only be written to local storage, use --no-files"
+            )
+
+        rng = random.Random(options["seed"])
+        factory.random.reseed_random(options["seed"])
+        fake = Faker()
+        fake.seed_instance(options["seed"])
+        started = time.perf_counter()
+
+        owners = UserFactory.create_batch(options["users"], password=None)
+        events = Event.objects.bulk_create(
+            [
+                EventFactory.build(created_by=rng.choice(owners))
+                for _ in range(options["events"])
+            ],
+            batch_size=options["batch_size"],
+        )
+        # Event sizes follow a long tail: most are small, a few are huge
+        weights = [rng.paretovariate(1.2) for _ in events]
+        counts = split_total(options["photos"], weights)
+        placeholders = self.render_placeholders(options)
+
+        inserted = 0
+        pending = []
+        with ThreadPoolExecutor(options["workers"]) as pool:
+            for event, count in zip(events, counts):
+                guests = self.make_guests(fake, options["guests"])
+                for offset in range(0, count, options["batch_size"]):
+                    size = min(options["batch_size"], count - offset)
+                    photos, files = self.build_photos(
+                        event, size, guests, placeholders, rng, options
+                    )
+                    # Keep one batch of file writes in flight while inserting
+                    for future in pending:
+                        future.result()
+                    pending = [
+                        pool.submit(write_files, files[index :: options["workers"]])
+                        for index in range(options["workers"])
+                    ]
+                    self.insert(photos)
+                    inserted += size
+                self.stderr.write(f"\r{inserted}/{options['photos']} photos", ending="")
+            for future in pending:
+                future.result()
+
+        elapsed = time.perf_counter() - started
+        self.stderr.write("")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {len(events)} events and {inserted} photos in "
+                f"{elapsed:.1f}s ({inserted / elapsed:.0f} photos/s)"
+            )
+        )
+
+    def make_guests(self, fake, count):
+        guests = []
+        for index in range(count):
+            name = fake.name()
+            email = f"{fake.user_name()}{index}@{fake.free_email_domain()}"
+            guests.append((name, email))
+        return guests
+
+    def render_placeholders(self, options):
+        placeholders, weights = [], []
+        for (width, height), weight in options["sizes"]:
+            for variant in range(options["variants"]):
+                seed = f"{options['seed']}-{width}x{height}-{variant}"
+                placeholders.append(synthetic_jpeg(width, height, seed, quality=75))
+                weights.append(weight / options["variants"])
+        return placeholders, weights
+
+    def build_photos(self, event, count, guests, placeholders, rng, options):
+        images, weights = placeholders
+        photos, files = [], []
+        media_root = default_storage.location
+        if not options["no_files"]:
+            os.makedirs(
+                os.path.join(media_root, "photos", str(event.id)), exist_ok=True
+            )
+
+        for data in rng.choices(images, weights=weights, k=count):
+            name, email = ("", "")
+            if rng.random() < options["guest_ratio"]:
+                name, email = rng.choice(guests)
+            value = rng.getrandbits(64)
+            photo = Photo(
+                session=event,
+                guest_name=name,
+                guest_email=email,
+                # bulk_create and COPY skip Photo.save()
+                guest_email_normalized=normalize_guest_email(email),
+                is_processed=True,
+                # Only kept by COPY, bulk_create applies auto_now_add
+                taken_at=event.date + timedelta(seconds=rng.uniform(0, 6 * 3600)),
+                phash=to_signed(value),
+            )
+            photo.phash_0, photo.phash_1, photo.phash_2, photo.phash_3 = split_hash(
+                value
+            )
+            photo.image.name = photo_upload_path(photo, "placeholder.jpg")
+            photos.append(photo)
+            if not options["no_files"]:
+                files.append((os.path.join(media_root, photo.image.name), data))
+        return photos, files
+
+    def insert(self, photos):
+        with transaction.atomic():
+            if connection.vendor == "postgresql":
+                copy_photos(photos)
+            else:
+                Photo.objects.bulk_create(photos)
@@ -0,0 +1,93 @@
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# What a worker does before it can serve its first request: configure
+# Django, build the WSGI handler (loads every app and middleware) and
+# resolve the URLconf (imports every view module)
+STARTUP = """
+from django.core.wsgi import get_wsgi_application
+from django.urls import get_resolver
+
+get_wsgi_application()
+get_resolver().url_patterns
+"""
+
+
+def parse_importtime(text):
+    """Return (module, self_us, cumulative_us) for each -X importtime line"""
+    imports = []
+    for line in text.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:") :].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # the column header
+        imports.append((fields[2].strip(), int(fields[0]), int(fields[1])))
+    return imports
+
+
+def by_package(imports):
+    """Total self time and module count per top-level package, slowest first"""
+    totals = defaultdict(lambda: [0, 0])
+    for module, self_us, _ in imports:
+        package = totals[module.split(".")[0]]
+        package[0] += self_us
+        package[1] += 1
+    return sorted(
+        ((name, us, count) for name, (us, count) in totals.items()),
+        key=lambda row: row[1],
+        reverse=True,
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Start a fresh interpreter with -X importtime, boot the app as a "
+        "worker would and report where the import time goes"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=20,
+            help="Rows per table (default: 20)",
+        )
+
+    def handle(self, *args, **options):
+        # Set by manage.py, including from --settings
+        settings_module = os.environ["DJANGO_SETTINGS_MODULE"]
+        started = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", STARTUP],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            text=True,
+            check=False,
+        )
+        wall_ms = (time.perf_counter() - started) * 1000
+        if result.returncode:
+            raise CommandError(f"Startup failed:\n{result.stderr[-2000:]}")
+
+        imports = parse_importtime(result.stderr)
+        total_ms = sum(self_us for _, self_us, _ in imports) / 1000
+        limit = options["limit"]
+
+        self.stdout.write(
+            f"{settings_module}: {len(imports)} modules, "
+            f"{total_ms:.0f} ms importing, {wall_ms:.0f} ms to first request"
+        )
+        self.stdout.write(f"\n{'package':<32} {'self ms':>9} {'modules':>8}")
+        for name, self_us, count in by_package(imports)[:limit]:
+            self.stdout.write(f"{name:<32} {self_us / 1000:>9.1f} {count:>8}")
+
+        slowest = sorted(imports, key=lambda row: row[2], reverse=True)[:limit]
+        self.stdout.write(f"\n{'module':<48} {'cumulative ms':>14}")
+        for module, _, cumulative_us in slowest:
+            self.stdout.write(f"{module:<48} {cumulative_us / 1000:>14.1f}")
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+from photobooth.packs import events_to_pack, pack_event
+
+
+class Command(BaseCommand):
+    help = (
+        "Pack the originals of events inactive for PHOTOBOOTH_COLD_AFTER_DAYS "
+        "into one file per event"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--event", type=str, help="Pack this event UUID, finished or not"
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only list the events that would be packed",
+        )
+
+    def handle(self, *args, **options):
+        if options["event"]:
+            event_ids = [options["event"]]
+        else:
+            event_ids = list(events_to_pack().values_list("id", flat=True))
+
+        if options["dry_run"]:
+            for event_id in event_ids:
+                self.stdout.write(str(event_id))
+            self.stdout.write(f"Would pack {len(event_ids)} events")
+            return
+
+        total = 0
+        for event_id in event_ids:
+            packed = pack_event(event_id)
+            total += packed
+            self.stdout.write(f"Packed {packed} photos of event {event_id}")
+        self.stdout.write(
+            self.style.SUCCESS(f"Packed {total} photos from {len(event_ids)} events")
+        )
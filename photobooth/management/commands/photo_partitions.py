@@ -0,0 +1,128 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.template.defaultfilters import filesizeformat
+from django.utils import timezone
+
+from photobooth.partitions import (
+    convert_photo_table,
+    create_partitions,
+    detach_partition,
+    is_partitioned,
+    list_partitions,
+    month_of,
+    parse_month,
+)
+
+
+def month(value):
+    try:
+        return parse_month(value)
+    except ValueError as e:
+        raise CommandError(str(e))
+
+
+class Command(BaseCommand):
+    help = (
+        "Partition the photo table by month on PostgreSQL and create, list "
+        "and detach its monthly partitions"
+    )
+
+    def add_arguments(self, parser):
+        actions = parser.add_subparsers(dest="action", required=True)
+
+        convert = actions.add_parser(
+            "convert",
+            help="Rebuild the photo table as a partitioned table (locks it while "
+            "copying, run during a maintenance window)",
+        )
+        create = actions.add_parser(
+            "create", help="Create partitions for the coming months (run monthly)"
+        )
+        for subparser in (convert, create):
+            subparser.add_argument(
+                "--ahead",
+                type=int,
+                default=3,
+                help="Months after the current one to create (default: 3)",
+            )
+
+        actions.add_parser("list", help="List partitions with their size")
+
+        detach = actions.add_parser(
+            "detach", help="Detach monthly partitions, e.g. for retention"
+        )
+        detach.add_argument("months", nargs="*", type=month, help="YYYY-MM")
+        detach.add_argument(
+            "--before",
+            type=month,
+            help="Detach every partition older than this month (YYYY-MM)",
+        )
+        detach.add_argument(
+            "--drop",
+            action="store_true",
+            help="Delete the photos and their files instead of keeping the table",
+        )
+        detach.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only list the partitions that would be detached",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("Partitioning needs PostgreSQL")
+        action = options["action"]
+        if action != "convert" and not is_partitioned():
+            raise CommandError(
+                "The photo table is not partitioned, run `photo_partitions convert`"
+            )
+        getattr(self, f"handle_{action}")(options)
+
+    def handle_convert(self, options):
+        if is_partitioned():
+            raise CommandError("The photo table is already partitioned")
+        copied = convert_photo_table(ahead=options["ahead"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Partitioned the photo table, copied {copied} photos")
+        )
+
+    def handle_create(self, options):
+        created = create_partitions(ahead=options["ahead"])
+        for name in created:
+            self.stdout.write(f"Created {name}")
+        self.stdout.write(self.style.SUCCESS(f"Created {len(created)} partitions"))
+
+    def handle_list(self, options):
+        for partition in list_partitions():
+            self.stdout.write(
+                f"{partition.name:<40} {partition.rows:>12} rows "
+                f"{filesizeformat(partition.size):>10}"
+            )
+
+    def handle_detach(self, options):
+        months = set(options["months"])
+        if options["before"]:
+            months.update(
+                partition.month
+                for partition in list_partitions()
+                if partition.month and partition.month < options["before"]
+            )
+        if not months:
+            raise CommandError("Name the months to detach or pass --before")
+        if max(months) >= month_of(timezone.now()):
+            raise CommandError("Refusing to detach the current or a future month")
+
+        if options["dry_run"]:
+            for value in sorted(months):
+                self.stdout.write(f"{value:%Y-%m}")
+            self.stdout.write(f"Would detach {len(months)} partitions")
+            return
+
+        dropped = 0
+        for value in sorted(months):
+            dropped += detach_partition(value, drop=options["drop"])
+            self.stdout.write(f"Detached {value:%Y-%m}")
+        message = f"Detached {len(months)} partitions"
+        if options["drop"]:
+            message += f" and deleted {dropped} photos"
+        self.stdout.write(self.style.SUCCESS(message))
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from photobooth.models import Photo
+from photobooth.processing import process_photo
+
+
+class Command(BaseCommand):
+    help = (
+        "Compute derived data (thumbnails, placeholders, perceptual hashes) for "
+        "stored photos"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--event", type=str, help="Only process photos from this event UUID"
+        )
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Reprocess every photo, not just those missing derived data",
+        )
+
+    def handle(self, *args, **options):
+        # Archived photos have no thumbnail on purpose, see tier_photos
+        photos = Photo.objects.filter(is_processed=True, tier=Photo.TIER_HOT).exclude(
+            image=""
+        )
+        if options["event"]:
+            photos = photos.filter(session_id=options["event"])
+        if not options["all"]:
+            photos = photos.filter(
+                Q(phash__isnull=True)
+                | Q(thumbnail="")
+                | Q(thumbnail__isnull=True)
+                | Q(placeholder="")
+                | Q(width__isnull=True)
+            )
+
+        processed = failed = 0
+        for photo in photos.order_by("pk").iterator(chunk_size=500):
+            if process_photo(photo):
+                processed += 1
+            else:
+                failed += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} photos"))
+        if failed:
+            self.stdout.write(self.style.WARNING(f"Failed to process {failed} photos"))
@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from photobooth.profiling import HEADER, make_token
+
+
+class Command(BaseCommand):
+    help = "Print a signed header that makes the server profile a request"
+
+    def handle(self, *args, **options):
+        if not settings.PHOTOBOOTH_PROFILING_ENABLED:
+            self.stderr.write(
+                self.style.WARNING("PHOTOBOOTH_PROFILING_ENABLED is off on this host")
+            )
+        self.stdout.write(f"{HEADER}: {make_token()}")
+        self.stderr.write(
+            f"Valid for {settings.PHOTOBOOTH_PROFILING_TOKEN_MAX_AGE} seconds"
+        )
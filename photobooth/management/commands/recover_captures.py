@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from photobooth.ingest import recover_captures
+from photobooth.models import Photo
+from photobooth.processing import process_photo
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay captures left in the ingest journal by a crash: store and "
+        "create missing photos and repair missing or short files"
+    )
+
+    def handle(self, *args, **options):
+        def process(photo_id):
+            process_photo(Photo.objects.get(pk=photo_id))
+
+        outcomes = recover_captures(on_replayed=process)
+        for outcome, count in sorted(outcomes.items()):
+            self.stdout.write(f"{outcome}: {count}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Replayed {outcomes['replayed']} and repaired "
+                f"{outcomes['repaired']} captures"
+            )
+        )
+        if outcomes["live segments"]:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"Skipped {outcomes['live segments']} segments still in use "
+                    "by running workers"
+                )
+            )
@@ -0,0 +1,79 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.template.defaultfilters import filesizeformat
+
+from photobooth.backups import (
+    COLD_PREFIX,
+    PACKS_PREFIX,
+    list_snapshots,
+    restore_snapshot,
+)
+from photobooth.integrity import PHOTOS_DIR
+
+
+class Command(BaseCommand):
+    help = (
+        "Restore photos, cold originals and packs from a media snapshot, all "
+        "of them or those of one event. Files already in place are left alone"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "snapshot",
+            nargs="?",
+            default="latest",
+            help="Snapshot id, see backup_media --list (default: latest)",
+        )
+        parser.add_argument("--event", help="Only restore this event's photos and pack")
+        parser.add_argument(
+            "--dest", help="Directory to restore into (default: MEDIA_ROOT)"
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=(os.cpu_count() or 4) * 2,
+            help="Threads copying files",
+        )
+
+    def handle(self, *args, **options):
+        snapshots = list_snapshots()
+        snapshot_id = options["snapshot"]
+        if snapshot_id == "latest":
+            if not snapshots:
+                raise CommandError("There are no snapshots")
+            snapshot_id = snapshots[-1]
+        elif snapshot_id not in snapshots:
+            raise CommandError(f"Unknown snapshot {snapshot_id}")
+
+        prefixes = ("",)
+        if event := options["event"]:
+            prefixes = (
+                f"{COLD_PREFIX}{PHOTOS_DIR}/{event}/",
+                f"{PACKS_PREFIX}{event}.pack",
+                f"{PHOTOS_DIR}/{event}/",
+            )
+        stats = restore_snapshot(
+            snapshot_id,
+            dest=options["dest"],
+            prefixes=prefixes,
+            workers=options["workers"],
+        )
+        if stats["skipped"]:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"Skipped {stats['skipped']} cold files, the cold storage "
+                    "is not on the local filesystem"
+                )
+            )
+        if not stats["files"]:
+            self.stdout.write(
+                self.style.WARNING(f"Nothing to restore in snapshot {snapshot_id}")
+            )
+            return
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Restored {stats['restored']} of {stats['files']} files "
+                f"({filesizeformat(stats['restored_bytes'])}) from {snapshot_id}"
+            )
+        )
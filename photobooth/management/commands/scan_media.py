@@ -0,0 +1,99 @@
+import os
+import time
+from collections import Counter
+
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.template.defaultfilters import filesizeformat
+
+from photobooth.integrity import (
+    MISSING,
+    ORPHAN,
+    UNRECORDED,
+    scan,
+)
+from photobooth.models import Photo
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconcile MEDIA_ROOT/photos with the photo table: report, and with "
+        "--fix repair, orphaned files, missing files and size or hash "
+        "mismatches"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fix",
+            action="store_true",
+            help="Delete orphaned files, clear missing thumbnails and record "
+            "sizes (and hashes) of originals that have none",
+        )
+        parser.add_argument(
+            "--hashes",
+            action="store_true",
+            help="Hash every file and compare with the hash recorded at capture "
+            "(reads all data)",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=(os.cpu_count() or 4) * 2,
+            help="Threads listing and hashing directories",
+        )
+        parser.add_argument(
+            "--grace",
+            type=int,
+            default=60,
+            help="Minutes a file must be old before it counts as orphaned, so "
+            "captures in flight are left alone (default: 60)",
+        )
+
+    def handle(self, *args, **options):
+        if not isinstance(default_storage, FileSystemStorage):
+            raise CommandError("Only local media storage can be scanned")
+
+        started = time.perf_counter()
+        issues = scan(
+            default_storage.location,
+            workers=options["workers"],
+            hashes=options["hashes"],
+            modified_before=time.time() - options["grace"] * 60,
+        )
+        counts = Counter()
+        orphaned_bytes = 0
+        for issue in issues:
+            counts[issue.kind] += 1
+            if issue.kind == ORPHAN:
+                orphaned_bytes += issue.size
+            if issue.kind != UNRECORDED:
+                photo = f" (photo {issue.photo_id})" if issue.photo_id else ""
+                self.stdout.write(f"{issue.kind}: {issue.name}{photo}")
+            if options["fix"]:
+                self.fix(issue)
+
+        elapsed = time.perf_counter() - started
+        summary = ", ".join(f"{count} {kind}" for kind, count in sorted(counts.items()))
+        self.stdout.write(f"Scanned in {elapsed:.1f}s: {summary or 'no issues'}")
+        if counts[ORPHAN]:
+            verb = "Deleted" if options["fix"] else "Found"
+            self.stdout.write(
+                f"{verb} {filesizeformat(orphaned_bytes)} of orphaned files"
+            )
+        if counts[UNRECORDED] and not options["fix"]:
+            self.stdout.write("Run with --fix to record sizes of older originals")
+
+    def fix(self, issue):
+        if issue.kind == ORPHAN:
+            default_storage.delete(issue.name)
+        elif issue.kind == MISSING and issue.field == "thumbnail":
+            # process_photos renders it again
+            Photo.objects.filter(pk=issue.photo_id, thumbnail=issue.name).update(
+                thumbnail=None
+            )
+        elif issue.kind == UNRECORDED:
+            fields = {"file_size": issue.size}
+            if issue.sha256:
+                fields["content_hash"] = issue.sha256
+            Photo.objects.filter(pk=issue.photo_id).update(**fields)
+        # Missing originals and mismatches need a backup to repair
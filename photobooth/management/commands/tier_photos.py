@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from django.template.defaultfilters import filesizeformat
+
+from photobooth.tiering import archive_candidates, archive_photo
+
+
+class Command(BaseCommand):
+    help = (
+        "Move originals of events inactive for PHOTOBOOTH_COLD_AFTER_DAYS to "
+        "cold storage and prune their thumbnails"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report how many photos would be archived",
+        )
+
+    def handle(self, *args, **options):
+        photos = archive_candidates()
+        if options["dry_run"]:
+            self.stdout.write(f"Would archive {photos.count()} photos")
+            return
+
+        archived = failed = freed = 0
+        for photo in photos.order_by("pk").iterator(chunk_size=500):
+            try:
+                freed += archive_photo(photo)
+            except OSError as e:
+                failed += 1
+                self.stderr.write(f"Failed to archive photo {photo.pk}: {e}")
+            else:
+                archived += 1
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Archived {archived} photos, freed {filesizeformat(freed)}"
+            )
+        )
+        if failed:
+            self.stdout.write(self.style.WARNING(f"Failed to archive {failed} photos"))
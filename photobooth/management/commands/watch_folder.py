@@ -0,0 +1,89 @@
+import os
+import signal
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from photobooth.hotfolder import HotFolder
+from photobooth.models import Event
+
+
+class Command(BaseCommand):
+    help = (
+        "Watch a directory, such as a tethered camera's download folder, and "
+        "ingest the JPEGs that land there into an event"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("directory")
+        parser.add_argument("event_id", type=str, help="Event UUID to ingest into")
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 4,
+            help="Files stored and processed at once",
+        )
+        parser.add_argument(
+            "--settle",
+            type=float,
+            default=0.5,
+            help="Seconds a file must be unchanged before it is ingested "
+            "(default: 0.5)",
+        )
+        parser.add_argument(
+            "--delete",
+            action="store_true",
+            help="Delete ingested files instead of moving them to done/",
+        )
+        parser.add_argument(
+            "--poll",
+            action="store_true",
+            help="List the directory periodically instead of using inotify, "
+            "e.g. on network filesystems",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=1.0,
+            help="Seconds between listings when polling (default: 1)",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Ingest the files already there and exit",
+        )
+
+    def handle(self, *args, **options):
+        directory = options["directory"]
+        if not os.path.isdir(directory):
+            raise CommandError(f"{directory} is not a directory")
+        try:
+            event = Event.objects.get(id=options["event_id"])
+        except (Event.DoesNotExist, ValidationError):
+            raise CommandError(f"Event {options['event_id']} not found")
+
+        folder = HotFolder(
+            directory,
+            event,
+            workers=options["workers"],
+            settle=options["settle"],
+            delete=options["delete"],
+            poll=options["poll"],
+            interval=options["interval"],
+        )
+        if not options["once"]:
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                signal.signal(signum, lambda *_: folder.stop())
+            self.stdout.write(f"Watching {directory} for event {event.name}")
+
+        outcomes = folder.run(once=options["once"])
+        for outcome, count in sorted(outcomes.items()):
+            self.stdout.write(f"{outcome}: {count}")
+        self.stdout.write(self.style.SUCCESS(f"Ingested {outcomes['ingested']} photos"))
+        if outcomes["failed"]:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"{outcomes['failed']} files could not be ingested and were "
+                    "left in place"
+                )
+            )
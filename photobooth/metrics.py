@@ -0,0 +1,373 @@
+"""
+Low-overhead request and operation metrics in Prometheus text format.
+
+Every process keeps its histograms in memory. When PHOTOBOOTH_METRICS_DIR
+is set, each process also dumps a snapshot to ``<dir>/<pid>-<start>.json``
+at most once per flush interval, and the /metrics view merges the snapshots
+of all workers, so whichever gunicorn worker answers the scrape reports
+totals for the whole server. Point the directory at a path that is emptied
+when the server starts, as with prometheus_client's multiprocess mode.
+
+Snapshots are keyed by pid and process start time, so a worker that reuses
+an exited worker's pid never overwrites its counts. Snapshots of exited
+workers are folded into ``retired.json`` and removed, which keeps counters
+and histograms from going backwards while the directory stays as large as
+the number of live workers.
+"""
+
+import atexit
+import fcntl
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .querylog import QueryLog, observe_queries
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = tuple(1024 * 4**power for power in range(8))  # 1 KB to 16 MB
+COUNTER = "counter"
+RETIRED = "retired.json"
+LOCK = "retired.lock"
+
+# name -> (help, buckets); a bucket tuple of None makes a gauge and COUNTER
+# a counter
+METRICS = {
+    "photobooth_http_request_duration_seconds": (
+        "Time spent handling a request, by URL name",
+        LATENCY_BUCKETS,
+    ),
+    "photobooth_http_db_queries": ("Database queries per request", QUERY_BUCKETS),
+    "photobooth_http_db_duration_seconds": (
+        "Time spent in database queries per request",
+        LATENCY_BUCKETS,
+    ),
+    "photobooth_http_response_size_bytes": (
+        "Size of response bodies (streamed responses are not counted)",
+        SIZE_BUCKETS,
+    ),
+    "photobooth_http_requests_in_flight": ("Requests being handled right now", None),
+    "photobooth_operation_duration_seconds": (
+        "Time spent in instrumented operations such as decoding and storage",
+        LATENCY_BUCKETS,
+    ),
+    "photobooth_storage_cache_requests_total": (
+        (
+            "Reads through the local media cache, by result (hit, miss or "
+            "coalesced into a miss already being fetched)"
+        ),
+        COUNTER,
+    ),
+    "photobooth_storage_cache_fetched_bytes_total": (
+        "Bytes fetched from the media backend into the local cache",
+        COUNTER,
+    ),
+}
+
+
+class Registry:
+    """Thread-safe histograms and gauges for a single process"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # (name, labels) -> [bucket counts..., sum, count] or [value]
+        self.series = {}
+        self.last_flush = 0.0
+
+    def observe(self, name, value, labels=()):
+        buckets = METRICS[name][1]
+        with self.lock:
+            series = self.series.get((name, labels))
+            if series is None:
+                series = self.series[(name, labels)] = [0] * (len(buckets) + 2)
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def add(self, name, delta, labels=()):
+        with self.lock:
+            series = self.series.setdefault((name, labels), [0])
+            series[0] += delta
+
+    def snapshot(self):
+        with self.lock:
+            return [
+                [name, list(labels), list(values)]
+                for (name, labels), values in self.series.items()
+            ]
+
+
+registry = Registry()
+
+
+def observe(name, value, **labels):
+    registry.observe(name, value, tuple(sorted(labels.items())))
+
+
+def increment(name, value=1, **labels):
+    registry.add(name, value, tuple(sorted(labels.items())))
+
+
+@contextmanager
+def timer(operation):
+    """Record how long the block takes as an operation duration"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(
+            "photobooth_operation_duration_seconds",
+            time.perf_counter() - started,
+            operation=operation,
+        )
+
+
+def metrics_dir():
+    return getattr(settings, "PHOTOBOOTH_METRICS_DIR", "")
+
+
+def process_start(pid="self"):
+    """Start time of a process in clock ticks since boot, None off Linux"""
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            stat = f.read()
+        # Fields after the parenthesised command name, starttime is field 22
+        return int(stat.rsplit(b")", 1)[1].split()[19])
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+_identity = None
+
+
+def snapshot_key():
+    """<pid>-<start> of this process, recomputed after a fork"""
+    global _identity
+    pid = os.getpid()
+    if _identity is None or _identity[0] != pid:
+        # 0 where start times are unknown: liveness then goes by pid alone
+        _identity = (pid, f"{pid}-{process_start() or 0}")
+    return _identity[1]
+
+
+def _parse_key(stem):
+    pid, sep, start = stem.partition("-")
+    if not (sep and pid.isdigit() and start.isdigit()):
+        return None
+    return int(pid), int(start)
+
+
+def _write_json(directory, name, data):
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, os.path.join(directory, name))
+
+
+def _read_json(path, default):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def flush(force=False):
+    """Write this process's snapshot for other workers to merge"""
+    directory = metrics_dir()
+    now = time.monotonic()
+    interval = getattr(settings, "PHOTOBOOTH_METRICS_FLUSH_SECONDS", 1.0)
+    if not directory or (not force and now - registry.last_flush < interval):
+        return
+    registry.last_flush = now
+
+    os.makedirs(directory, exist_ok=True)
+    _write_json(directory, f"{snapshot_key()}.json", registry.snapshot())
+
+
+atexit.register(flush, force=True)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _process_alive(pid, start):
+    if not start:
+        return _pid_alive(pid)
+    # A different start time means the pid was reused by a new process
+    return process_start(pid) == start
+
+
+def _merge(merged, snapshot, gauges=True):
+    for name, labels, values in snapshot:
+        if not gauges and METRICS[name][1] is None:
+            continue
+        key = (name, tuple(tuple(pair) for pair in labels))
+        if key in merged:
+            merged[key] = [a + b for a, b in zip(merged[key], values)]
+        else:
+            merged[key] = list(values)
+
+
+def _unmerge(merged):
+    return [[name, list(labels), values] for (name, labels), values in merged.items()]
+
+
+def _retire(directory, paths):
+    """Fold the snapshots of exited workers into RETIRED and remove them"""
+    state = _read_json(os.path.join(directory, RETIRED), {})
+    # Snapshots folded by a collect that died before removing them
+    folded = {
+        name
+        for name in state.get("folded", [])
+        if os.path.exists(os.path.join(directory, name))
+    }
+    retired = {}
+    _merge(retired, state.get("series", []))
+    for path in paths:
+        name = os.path.basename(path)
+        if name not in folded:
+            # Gauges describe live processes and are dropped
+            _merge(retired, _read_json(path, []), gauges=False)
+            folded.add(name)
+    _write_json(
+        directory, RETIRED, {"folded": sorted(folded), "series": _unmerge(retired)}
+    )
+    for path in paths:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
+def collect():
+    """Merge the snapshots of every worker, including this one"""
+    merged = {}
+    _merge(merged, registry.snapshot())
+    directory = metrics_dir()
+    if not directory or not os.path.isdir(directory):
+        return merged
+
+    own = f"{snapshot_key()}.json"
+    # Held while reading, so a snapshot is never both read and folded
+    with open(os.path.join(directory, LOCK), "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        exited = []
+        for entry in os.scandir(directory):
+            stem, ext = os.path.splitext(entry.name)
+            key = _parse_key(stem)
+            if ext != ".json" or entry.name == own or key is None:
+                continue
+            if _process_alive(*key):
+                _merge(merged, _read_json(entry.path, []))
+            else:
+                exited.append(entry.path)
+        if exited:
+            _retire(directory, exited)
+        retired = _read_json(os.path.join(directory, RETIRED), {})
+    _merge(merged, retired.get("series", []))
+    return merged
+
+
+def _format_labels(labels, extra=()):
+    pairs = [*labels, *extra]
+    if not pairs:
+        return ""
+    escaped = (
+        (key, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for key, value in pairs
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+def render(merged):
+    """Render merged series in the Prometheus text exposition format"""
+    lines = []
+    for name, (help_text, buckets) in METRICS.items():
+        series = sorted(
+            (labels, values) for (key, labels), values in merged.items() if key == name
+        )
+        lines.append(f"# HELP {name} {help_text}")
+        kind = {None: "gauge", COUNTER: COUNTER}.get(buckets, "histogram")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, values in series:
+            if buckets in (None, COUNTER):
+                lines.append(f"{name}{_format_labels(labels)} {values[0]}")
+                continue
+            for bound, count in zip(buckets, values):
+                bucket_labels = _format_labels(labels, [("le", bound)])
+                lines.append(f"{name}_bucket{bucket_labels} {count}")
+            inf_labels = _format_labels(labels, [("le", "+Inf")])
+            lines.append(f"{name}_bucket{inf_labels} {values[-1]}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {values[-2]}")
+            lines.append(f"{name}_count{_format_labels(labels)} {values[-1]}")
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """Record latency, DB usage and response size per URL name"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        registry.add("photobooth_http_requests_in_flight", 1)
+        started = time.perf_counter()
+        try:
+            with observe_queries(QueryLog()) as queries:
+                response = self.get_response(request)
+        finally:
+            registry.add("photobooth_http_requests_in_flight", -1)
+        self.record(request, response, started, queries)
+        return response
+
+    async def __acall__(self, request):
+        registry.add("photobooth_http_requests_in_flight", 1)
+        started = time.perf_counter()
+        try:
+            with observe_queries(QueryLog()) as queries:
+                response = await self.get_response(request)
+        finally:
+            registry.add("photobooth_http_requests_in_flight", -1)
+        self.record(request, response, started, queries)
+        return response
+
+    def record(self, request, response, started, queries):
+        match = getattr(request, "resolver_match", None)
+        view = match.view_name if match else "<unresolved>"
+        observe(
+            "photobooth_http_request_duration_seconds",
+            time.perf_counter() - started,
+            view=view,
+            method=request.method,
+            status=response.status_code,
+        )
+        observe("photobooth_http_db_queries", queries.count, view=view)
+        observe("photobooth_http_db_duration_seconds", queries.duration, view=view)
+        if not response.streaming:
+            observe(
+                "photobooth_http_response_size_bytes", len(response.content), view=view
+            )
+        flush()
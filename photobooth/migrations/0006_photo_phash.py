@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("photobooth", "0005_event_alter_photo_session_delete_photoboothsession"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="photo",
+            name="phash",
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="photo",
+            name="phash_0",
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="photo",
+            name="phash_1",
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="photo",
+            name="phash_2",
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="photo",
+            name="phash_3",
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="photo",
+            index=models.Index(fields=["session", "phash_0"], name="photo_phash_0_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="photo",
+            index=models.Index(fields=["session", "phash_1"], name="photo_phash_1_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="photo",
+            index=models.Index(fields=["session", "phash_2"], name="photo_phash_2_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="photo",
+            index=models.Index(fields=["session", "phash_3"], name="photo_phash_3_idx"),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("photobooth", "0006_photo_phash"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="photo",
+            name="emailed_at",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="When the photo was queued for delivery",
+                null=True,
+            ),
+        ),
+    ]
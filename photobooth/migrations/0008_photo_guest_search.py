@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:17
+
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+from django.db.models.functions import Lower, Trim
+
+# Matches the UPPER(guest_name::text) LIKE ... that icontains compiles to
+TRIGRAM_INDEX = (
+    "CREATE INDEX IF NOT EXISTS photo_guest_name_trgm_idx ON photobooth_photo "
+    "USING gin ((UPPER(guest_name::text)) gin_trgm_ops)"
+)
+
+
+def normalize_guest_emails(apps, schema_editor):
+    Photo = apps.get_model("photobooth", "Photo")
+    Photo.objects.exclude(guest_email="").update(
+        guest_email_normalized=Lower(Trim("guest_email"))
+    )
+
+
+def create_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(TRIGRAM_INDEX)
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS photo_guest_name_trgm_idx")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("photobooth", "0007_photo_emailed_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="photo",
+            name="guest_email_normalized",
+            field=models.CharField(blank=True, editable=False, max_length=254),
+        ),
+        migrations.AddIndex(
+            model_name="photo",
+            index=models.Index(
+                fields=["session", "guest_email_normalized"],
+                name="photo_guest_email_idx",
+            ),
+        ),
+        migrations.RunPython(normalize_guest_emails, migrations.RunPython.noop),
+        TrigramExtension(),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:24
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("photobooth", "0008_photo_guest_search"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RequestProfile",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True, db_index=True)),
+                ("view_name", models.CharField(db_index=True, max_length=200)),
+                ("method", models.CharField(max_length=10)),
+                ("path", models.CharField(max_length=2000)),
+                ("status_code", models.PositiveSmallIntegerField()),
+                (
+                    "trigger",
+                    models.CharField(
+                        choices=[
+                            ("header", "Signed header"),
+                            ("staff", "Staff user"),
+                            ("sample", "Random sample"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("duration_ms", models.FloatField()),
+                ("query_count", models.PositiveIntegerField(default=0)),
+                ("query_ms", models.FloatField(default=0)),
+                (
+                    "queries",
+                    models.JSONField(
+                        default=list,
+                        help_text="SQL statements with their duration in ms",
+                    ),
+                ),
+                (
+                    "stats",
+                    models.TextField(
+                        help_text="pstats report sorted by cumulative time"
+                    ),
+                ),
+                (
+                    "profile_data",
+                    models.BinaryField(
+                        help_text="Marshalled pstats data, loadable by snakeviz or flameprof"
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-created_at"],
+            },
+        ),
+    ]
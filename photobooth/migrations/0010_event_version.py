@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("photobooth", "0009_requestprofile"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="event",
+            name="version",
+            field=models.PositiveBigIntegerField(
+                default=0,
+                editable=False,
+                help_text="Bumped when the event or its photos change, see event info",
+            ),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("photobooth", "0010_event_version"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="photo",
+            name="tier",
+            field=models.CharField(
+                choices=[("hot", "Hot (local disk)"), ("cold", "Cold (archive)")],
+                default="hot",
+                editable=False,
+                max_length=4,
+            ),
+        ),
+        migrations.AddField(
+            model_name="photo",
+            name="tiered_at",
+            field=models.DateTimeField(
+                blank=True,
+                editable=False,
+                help_text="Last move between tiers",
+                null=True,
+            ),
+        ),
+    ]
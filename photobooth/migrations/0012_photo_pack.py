@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("photobooth", "0011_photo_tier"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="photo",
+            name="pack_length",
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="photo",
+            name="pack_offset",
+            field=models.PositiveBigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AlterField(
+            model_name="photo",
+            name="tier",
+            field=models.CharField(
+                choices=[
+                    ("hot", "Hot (local disk)"),
+                    ("cold", "Cold (archive)"),
+                    ("pack", "Event pack file"),
+                ],
+                default="hot",
+                editable=False,
+                max_length=4,
+            ),
+        ),
+    ]
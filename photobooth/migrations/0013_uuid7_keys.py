@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:54
+
+from django.db import migrations, models
+
+import photobooth.ids
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("photobooth", "0012_photo_pack"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="event",
+            name="id",
+            field=models.UUIDField(
+                default=photobooth.ids.uuid7,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="photo",
+            name="id",
+            field=models.UUIDField(
+                default=photobooth.ids.uuid7,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="photo",
+            index=models.Index(
+                fields=["session", "-taken_at"], name="photo_session_taken_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("photobooth", "0013_uuid7_keys"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="photo",
+            name="placeholder",
+            field=models.TextField(blank=True, editable=False),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("photobooth", "0014_photo_placeholder"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="photo",
+            name="height",
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="photo",
+            name="width",
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+    ]
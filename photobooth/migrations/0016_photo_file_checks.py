@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("photobooth", "0015_photo_dimensions"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="photo",
+            name="content_hash",
+            field=models.CharField(
+                blank=True,
+                editable=False,
+                help_text="SHA-256 of the original",
+                max_length=64,
+            ),
+        ),
+        migrations.AddField(
+            model_name="photo",
+            name="file_size",
+            field=models.PositiveBigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="photo",
+            index=models.Index(
+                fields=["session", "content_hash"], name="photo_content_hash_idx"
+            ),
+        ),
+    ]
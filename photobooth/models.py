@@ -5,9 +5,14 @@ import uuid
 
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.urls import reverse
 from django.utils import timezone
 
+from .ids import uuid7
+from .signing import signed_url, signing_enabled
+
 
 def photo_upload_path(instance, filename):
     """Generate upload path for photos based on session and timestamp"""
@@ -16,6 +21,11 @@ def photo_upload_path(instance, filename):
     return os.path.join("photos", str(instance.session.id), filename)
 
 
+def normalize_guest_email(email):
+    """Canonical form of a guest email used for lookups and grouping"""
+    return email.strip().lower()
+
+
 def generate_event_code():
     """Generate a random 6-character code for events"""
     characters = string.ascii_uppercase + string.digits
@@ -31,7 +41,7 @@ class Event(models.Model):
     Represents an event (e.g., wedding, party) for photobooth sessions
     """
 
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     name = models.CharField(
         max_length=200, help_text="Event name (e.g., 'John & Jane Wedding')"
     )
@@ -56,6 +66,11 @@ class Event(models.Model):
     qr_base_url = models.URLField(
         blank=True, help_text="Base URL for QR codes (e.g., your domain)"
     )
+    version = models.PositiveBigIntegerField(
+        default=0,
+        editable=False,
+        help_text="Bumped when the event or its photos change, see event info",
+    )
 
     class Meta:
         ordering = ["-created_at"]
@@ -63,11 +78,33 @@ class Event(models.Model):
     def __str__(self):
         return f"{self.name} ({self.code})"
 
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            return super().save(*args, **kwargs)
+
+        # Incremented by the database, so a stale instance can never reuse a
+        # version that was already handed out for different content
+        self.version = models.F("version") + 1
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            kwargs["update_fields"] = {*update_fields, "version"}
+        super().save(*args, **kwargs)
+        # Only the database knows the new value, reload it when accessed
+        del self.version
+
+    @classmethod
+    def bump_version(cls, event_id):
+        cls.objects.filter(pk=event_id).update(version=models.F("version") + 1)
+
     def get_absolute_url(self):
         return reverse("photobooth:event_gallery", kwargs={"event_id": self.id})
 
     @property
     def photo_count(self):
+        # Views that list events annotate num_photos=Count("photos") to
+        # avoid a COUNT query per event
+        if hasattr(self, "num_photos"):
+            return self.num_photos
         return self.photos.count()
 
 
@@ -76,10 +113,40 @@ class Photo(models.Model):
     Represents a single photo taken in the photobooth, linked to an event
     """
 
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    TIER_HOT = "hot"
+    TIER_COLD = "cold"
+    TIER_PACKED = "pack"
+    TIER_CHOICES = [
+        (TIER_HOT, "Hot (local disk)"),
+        (TIER_COLD, "Cold (archive)"),
+        (TIER_PACKED, "Event pack file"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     session = models.ForeignKey(Event, on_delete=models.CASCADE, related_name="photos")
     image = models.ImageField(upload_to=photo_upload_path)
     thumbnail = models.ImageField(upload_to=photo_upload_path, blank=True, null=True)
+    # Base64 of a tiny JPEG inlined in galleries, see processing.make_placeholder
+    placeholder = models.TextField(blank=True, editable=False)
+    # Of the original as captured, checked by `manage.py scan_media`
+    file_size = models.PositiveBigIntegerField(null=True, blank=True, editable=False)
+    content_hash = models.CharField(
+        max_length=64, blank=True, editable=False, help_text="SHA-256 of the original"
+    )
+    # Of the original, set during processing so tiles reserve their space
+    width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+
+    # Storage tier of the original, see photobooth.tiering
+    tier = models.CharField(
+        max_length=4, choices=TIER_CHOICES, default=TIER_HOT, editable=False
+    )
+    tiered_at = models.DateTimeField(
+        null=True, blank=True, editable=False, help_text="Last move between tiers"
+    )
+    # Byte range of the original in its event's pack, see photobooth.packs
+    pack_offset = models.PositiveBigIntegerField(null=True, blank=True, editable=False)
+    pack_length = models.PositiveIntegerField(null=True, blank=True, editable=False)
 
     # Metadata
     taken_at = models.DateTimeField(auto_now_add=True)
@@ -89,16 +156,55 @@ class Photo(models.Model):
     guest_email = models.EmailField(
         blank=True, help_text="Optional email for photo delivery"
     )
+    guest_email_normalized = models.CharField(
+        max_length=254, blank=True, editable=False
+    )
+    emailed_at = models.DateTimeField(
+        null=True, blank=True, help_text="When the photo was queued for delivery"
+    )
 
     # Photo processing
     is_processed = models.BooleanField(default=False)
 
+    # Perceptual hash (64-bit dHash) and its 16-bit bands for
+    # near-duplicate lookups, see photobooth.similarity
+    phash = models.BigIntegerField(null=True, blank=True, editable=False)
+    phash_0 = models.IntegerField(null=True, blank=True, editable=False)
+    phash_1 = models.IntegerField(null=True, blank=True, editable=False)
+    phash_2 = models.IntegerField(null=True, blank=True, editable=False)
+    phash_3 = models.IntegerField(null=True, blank=True, editable=False)
+
     class Meta:
         ordering = ["-taken_at"]
+        indexes = [
+            models.Index(fields=["session", "phash_0"], name="photo_phash_0_idx"),
+            models.Index(fields=["session", "phash_1"], name="photo_phash_1_idx"),
+            models.Index(fields=["session", "phash_2"], name="photo_phash_2_idx"),
+            models.Index(fields=["session", "phash_3"], name="photo_phash_3_idx"),
+            models.Index(
+                fields=["session", "guest_email_normalized"],
+                name="photo_guest_email_idx",
+            ),
+            # Galleries list an event's photos newest first
+            models.Index(
+                fields=["session", "-taken_at"], name="photo_session_taken_idx"
+            ),
+            # watch_folder skips files whose hash is already in the event
+            models.Index(
+                fields=["session", "content_hash"], name="photo_content_hash_idx"
+            ),
+        ]
 
     def __str__(self):
         return f"Photo {self.id} - {self.session.name}"
 
+    def save(self, *args, **kwargs):
+        self.guest_email_normalized = normalize_guest_email(self.guest_email)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "guest_email" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "guest_email_normalized"}
+        super().save(*args, **kwargs)
+
     def get_absolute_url(self):
         return reverse("photobooth:photo_detail", kwargs={"photo_id": self.id})
 
@@ -106,6 +212,49 @@ class Photo(models.Model):
     def download_url(self):
         return reverse("photobooth:photo_download", kwargs={"photo_id": self.id})
 
+    @property
+    def placeholder_url(self):
+        if not self.placeholder:
+            return ""
+        return f"data:image/jpeg;base64,{self.placeholder}"
+
+    @property
+    def direct_download_url(self):
+        """Download link that skips Django when media URLs are signed"""
+        if self.tier != self.TIER_HOT or not signing_enabled():
+            return self.download_url
+        return signed_url(self.image.name, self.content_hash[:16], download=True)
+
+    @property
+    def thumbnail_url(self):
+        """Gallery tile rendition, the original when there is no thumbnail"""
+        if self.thumbnail:
+            if signing_enabled():
+                return signed_url(self.thumbnail.name, self.content_hash[:16])
+            return self.thumbnail.url
+        return self.image_url
+
+    @property
+    def image_url(self):
+        """URL of the original, served through a recall when it is archived"""
+        if self.tier != self.TIER_HOT:
+            return reverse("photobooth:photo_image", kwargs={"photo_id": self.id})
+        if signing_enabled():
+            return signed_url(self.image.name, self.content_hash[:16])
+        return self.image.url
+
+
+@receiver(post_save, sender=Photo, dispatch_uid="photobooth.photo_saved")
+def photo_saved(sender, instance, created, **kwargs):
+    # Processing a photo changes nothing the event info reports
+    if created:
+        Event.bump_version(instance.session_id)
+
+
+@receiver(post_delete, sender=Photo, dispatch_uid="photobooth.photo_deleted")
+def photo_deleted(sender, instance, **kwargs):
+    Event.bump_version(instance.session_id)
+
 
 class PhotoboothSettings(models.Model):
     """
@@ -147,3 +296,45 @@ class PhotoboothSettings(models.Model):
         """Get or create the settings instance"""
         settings, created = cls.objects.get_or_create(pk=1)
         return settings
+
+
+class RequestProfile(models.Model):
+    """
+    A cProfile capture of one request, recorded by ProfilingMiddleware
+    """
+
+    TRIGGER_CHOICES = [
+        ("header", "Signed header"),
+        ("staff", "Staff user"),
+        ("sample", "Random sample"),
+    ]
+
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    view_name = models.CharField(max_length=200, db_index=True)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=2000)
+    status_code = models.PositiveSmallIntegerField()
+    trigger = models.CharField(max_length=10, choices=TRIGGER_CHOICES)
+    user = models.ForeignKey(
+        get_user_model(),
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="+",
+    )
+    duration_ms = models.FloatField()
+    query_count = models.PositiveIntegerField(default=0)
+    query_ms = models.FloatField(default=0)
+    queries = models.JSONField(
+        default=list, help_text="SQL statements with their duration in ms"
+    )
+    stats = models.TextField(help_text="pstats report sorted by cumulative time")
+    profile_data = models.BinaryField(
+        help_text="Marshalled pstats data, loadable by snakeviz or flameprof"
+    )
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms:.0f} ms)"
@@ -0,0 +1,159 @@
+"""
+Pack files for finished events.
+
+Instead of one file per photo, a packed event keeps all its originals in a
+single append-only file, PHOTOBOOTH_PACK_ROOT/<event id>.pack. Each photo
+records the offset and length of its bytes (Photo.pack_offset and
+pack_length), so the pack needs no header or index of its own, and a
+photo is served as an mmap range of the pack.
+
+Packing appends and fsyncs the originals before the rows point at them and
+only then deletes the loose files, so an interrupted run leaves at most
+some unreferenced bytes at the end of the pack. Bytes of photos deleted
+later are not reclaimed.
+"""
+
+import fcntl
+import io
+import mmap
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Event, Photo
+from .tiering import cold_storage, open_original
+
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+def events_to_pack(now=None):
+    """Events inactive for the cold threshold that still have loose photos"""
+    cutoff = (now or timezone.now()) - timedelta(
+        days=settings.PHOTOBOOTH_COLD_AFTER_DAYS
+    )
+    return Event.objects.filter(
+        is_active=False,
+        updated_at__lt=cutoff,
+        photos__in=Photo.objects.exclude(tier=Photo.TIER_PACKED).exclude(image=""),
+    ).distinct()
+
+
+def pack_path(event_id):
+    return os.path.join(settings.PHOTOBOOTH_PACK_ROOT, f"{event_id}.pack")
+
+
+class PackSlice(io.RawIOBase):
+    """Read-only file over one photo's byte range of a memory-mapped pack"""
+
+    def __init__(self, path, offset, length):
+        self._fd = os.open(path, os.O_RDONLY)
+        try:
+            self._map = mmap.mmap(self._fd, 0, access=mmap.ACCESS_READ)
+        except BaseException:
+            os.close(self._fd)
+            raise
+        self._start = offset
+        self._end = offset + length
+        self._pos = offset
+        if self._end > len(self._map):
+            self.close()
+            raise OSError(f"{path} is truncated")
+
+    @property
+    def size(self):
+        return self._end - self._start
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        n = min(len(buffer), self._end - self._pos)
+        buffer[:n] = self._map[self._pos : self._pos + n]
+        self._pos += n
+        return n
+
+    def seek(self, pos, whence=io.SEEK_SET):
+        base = {
+            io.SEEK_SET: self._start,
+            io.SEEK_CUR: self._pos,
+            io.SEEK_END: self._end,
+        }[whence]
+        self._pos = min(max(base + pos, self._start), self._end)
+        return self.tell()
+
+    def tell(self):
+        return self._pos - self._start
+
+    def close(self):
+        # No fileno(): a WSGI file_wrapper must not sendfile() the whole pack
+        if not self.closed:
+            self._map.close()
+            os.close(self._fd)
+        super().close()
+
+
+def open_packed(photo):
+    return PackSlice(pack_path(photo.session_id), photo.pack_offset, photo.pack_length)
+
+
+def pack_event(event_id):
+    """
+    Append the loose originals of an event's photos to its pack and delete
+    them from the hot and cold tiers. Returns the number of photos packed.
+    """
+    os.makedirs(settings.PHOTOBOOTH_PACK_ROOT, exist_ok=True)
+    with open(pack_path(event_id), "ab") as pack:
+        # One packer per event, so concurrent runs cannot pack a photo twice
+        fcntl.flock(pack, fcntl.LOCK_EX)
+        photos = (
+            Photo.objects.filter(session_id=event_id)
+            .exclude(tier=Photo.TIER_PACKED)
+            .exclude(image="")
+            .order_by("taken_at", "pk")
+        )
+        offset = pack.seek(0, os.SEEK_END)
+        packed = []
+        for photo in photos:
+            try:
+                source, _ = open_original(photo, recall=False)
+            except FileNotFoundError:
+                continue
+            with source:
+                length = 0
+                while chunk := source.read(COPY_CHUNK_SIZE):
+                    pack.write(chunk)
+                    length += len(chunk)
+            packed.append((photo, offset, length))
+            offset += length
+        pack.flush()
+        os.fsync(pack.fileno())
+
+        now = timezone.now()
+        with transaction.atomic():
+            for photo, offset, length in packed:
+                Photo.objects.filter(pk=photo.pk).update(
+                    tier=Photo.TIER_PACKED,
+                    tiered_at=now,
+                    pack_offset=offset,
+                    pack_length=length,
+                    thumbnail=None,
+                )
+
+    if not packed and not os.path.getsize(pack_path(event_id)):
+        os.remove(pack_path(event_id))
+
+    # Recalled photos have a copy in both tiers
+    cold = cold_storage()
+    for photo, _, _ in packed:
+        default_storage.delete(photo.image.name)
+        cold.delete(photo.image.name)
+        if photo.thumbnail:
+            default_storage.delete(photo.thumbnail.name)
+    return len(packed)
@@ -0,0 +1,260 @@
+"""
+Monthly range partitions of the Photo table, PostgreSQL only.
+
+The layout is optional. convert_photo_table() rebuilds photobooth_photo as a
+table partitioned by the month of taken_at, with one partition per month
+(photobooth_photo_p2026_10, ...) and a default partition that catches
+photos outside the created months, so an insert never fails because
+create_partitions() did not run in time.
+
+Queries that filter on taken_at only scan the matching months, and
+retention detaches and drops a whole month instead of running one large
+DELETE over the table.
+
+PostgreSQL requires the partition key in every unique constraint, so the
+partitioned table's primary key is (id, taken_at). Django keeps treating id
+as the primary key; time-ordered uuid7 ids keep it unique in practice.
+"""
+
+import re
+from collections import namedtuple
+from datetime import UTC, date, datetime
+
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Event, Photo
+from .tiering import cold_storage
+
+PARTITION_KEY = "taken_at"
+
+Partition = namedtuple("Partition", "name month rows size")
+
+
+def parse_month(value):
+    """Parse "YYYY-MM" into the first day of that month"""
+    try:
+        year, month = value.split("-")
+        return date(int(year), int(month), 1)
+    except ValueError:
+        raise ValueError(f"Invalid month {value!r}, expected YYYY-MM")
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_of(value):
+    if timezone.is_aware(value):
+        value = value.astimezone(UTC)
+    return date(value.year, value.month, 1)
+
+
+def partition_name(month):
+    """Table name of a month's partition, or of the default partition"""
+    table = Photo._meta.db_table
+    if month is None:
+        return f"{table}_default"
+    return f"{table}_p{month:%Y_%m}"
+
+
+def _month_of_name(name):
+    match = re.search(r"_p(\d{4})_(\d{2})$", name)
+    return date(int(match[1]), int(match[2]), 1) if match else None
+
+
+def month_start(month):
+    return datetime(month.year, month.month, 1, tzinfo=UTC)
+
+
+def _bound(month):
+    # Built from a date, never from user input; DDL takes no parameters
+    return f"'{month_start(month).isoformat()}'"
+
+
+def _bounds(month):
+    return f"FROM ({_bound(month)}) TO ({_bound(add_months(month, 1))})"
+
+
+def is_partitioned():
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass",
+            [Photo._meta.db_table],
+        )
+        return cursor.fetchone() is not None
+
+
+def list_partitions():
+    """Attached partitions, oldest month first and the default partition last"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname, c.reltuples::bigint, pg_total_relation_size(c.oid) "
+            "FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = %s::regclass",
+            [Photo._meta.db_table],
+        )
+        partitions = [
+            Partition(name, _month_of_name(name), max(rows, 0), size)
+            for name, rows, size in cursor.fetchall()
+        ]
+    return sorted(partitions, key=lambda p: (p.month is None, p.month or date.min))
+
+
+def convert_photo_table(ahead=3, now=None):
+    """
+    Rebuild the photo table as a partitioned table, with partitions from
+    the month of the oldest photo to `ahead` months from now. The table is
+    locked while its rows are copied. Returns the number of rows copied.
+    """
+    quote = connection.ops.quote_name
+    table = Photo._meta.db_table
+    staging = f"{table}_partitioned"
+    current = month_of(now or timezone.now())
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"LOCK TABLE {quote(table)} IN ACCESS EXCLUSIVE MODE")
+        # Recreated on the new table once the old one, and its names, are gone
+        cursor.execute(
+            "SELECT pg_get_indexdef(indexrelid) FROM pg_index "
+            "WHERE indrelid = %s::regclass AND NOT indisprimary",
+            [table],
+        )
+        indexes = [row[0] for row in cursor.fetchall()]
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype = 'f'",
+            [table],
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute(f"SELECT min({quote(PARTITION_KEY)}) FROM {quote(table)}")
+        oldest = cursor.fetchone()[0]
+
+        cursor.execute(
+            f"CREATE TABLE {quote(staging)} (LIKE {quote(table)} "
+            "INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING STORAGE) "
+            f"PARTITION BY RANGE ({quote(PARTITION_KEY)})"
+        )
+        cursor.execute(
+            f"CREATE TABLE {quote(partition_name(None))} "
+            f"PARTITION OF {quote(staging)} DEFAULT"
+        )
+        month = min(month_of(oldest), current) if oldest else current
+        while month <= add_months(current, ahead):
+            cursor.execute(
+                f"CREATE TABLE {quote(partition_name(month))} "
+                f"PARTITION OF {quote(staging)} FOR VALUES {_bounds(month)}"
+            )
+            month = add_months(month, 1)
+
+        cursor.execute(f"INSERT INTO {quote(staging)} SELECT * FROM {quote(table)}")
+        copied = cursor.rowcount
+        cursor.execute(f"DROP TABLE {quote(table)}")
+        cursor.execute(f"ALTER TABLE {quote(staging)} RENAME TO {quote(table)}")
+        cursor.execute(
+            f"ALTER TABLE {quote(table)} ADD PRIMARY KEY (id, {quote(PARTITION_KEY)})"
+        )
+        for definition in indexes:
+            cursor.execute(definition)
+        for name, definition in foreign_keys:
+            cursor.execute(
+                f"ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(name)} {definition}"
+            )
+        cursor.execute(f"ANALYZE {quote(table)}")
+    return copied
+
+
+def create_partition(month):
+    """
+    Create and attach a month's partition, moving its photos out of the
+    default partition. Returns False if the partition already exists.
+    """
+    quote = connection.ops.quote_name
+    table = Photo._meta.db_table
+    name = partition_name(month)
+    key = quote(PARTITION_KEY)
+    in_month = f"{key} >= {_bound(month)} AND {key} < {_bound(add_months(month, 1))}"
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s)", [name])
+        if cursor.fetchone()[0] is not None:
+            return False
+        cursor.execute(
+            f"CREATE TABLE {quote(name)} (LIKE {quote(table)} "
+            "INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING STORAGE)"
+        )
+        # Attaching fails while the default partition holds rows of the month
+        cursor.execute(
+            f"WITH moved AS (DELETE FROM {quote(partition_name(None))} "
+            f"WHERE {in_month} RETURNING *) "
+            f"INSERT INTO {quote(name)} SELECT * FROM moved"
+        )
+        cursor.execute(
+            f"ALTER TABLE {quote(table)} ATTACH PARTITION {quote(name)} "
+            f"FOR VALUES {_bounds(month)}"
+        )
+    return True
+
+
+def create_partitions(ahead=3, now=None):
+    """Make sure partitions exist up to `ahead` months from now"""
+    current = month_of(now or timezone.now())
+    return [
+        partition_name(month)
+        for month in (add_months(current, n) for n in range(ahead + 1))
+        if create_partition(month)
+    ]
+
+
+def _delete_files(name):
+    """Delete the files of a detached partition's photos, return their count"""
+    quote = connection.ops.quote_name
+    cold = cold_storage()
+    events = set()
+    count = 0
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT session_id, image, thumbnail, tier FROM {quote(name)}")
+        while rows := cursor.fetchmany(2000):
+            for event_id, image, thumbnail, tier in rows:
+                events.add(event_id)
+                count += 1
+                # Packed bytes stay in their pack, like other deleted photos
+                if image and tier != Photo.TIER_PACKED:
+                    default_storage.delete(image)
+                    cold.delete(image)
+                if thumbnail:
+                    default_storage.delete(thumbnail)
+    Event.objects.filter(pk__in=events).update(version=F("version") + 1)
+    return count
+
+
+def detach_partition(month, drop=False):
+    """
+    Detach a month's partition, keeping it as a plain table unless `drop`
+    is set, in which case its photos' files are deleted and the table is
+    dropped. Returns the number of photos dropped.
+
+    Safe to run again after a failure: a partition that was already
+    detached is only dropped.
+    """
+    quote = connection.ops.quote_name
+    name = partition_name(month)
+    attached = {partition.name for partition in list_partitions()}
+    with connection.cursor() as cursor:
+        if name in attached:
+            cursor.execute(
+                f"ALTER TABLE {quote(Photo._meta.db_table)} "
+                f"DETACH PARTITION {quote(name)}"
+            )
+        if not drop:
+            return 0
+        cursor.execute("SELECT to_regclass(%s)", [name])
+        if cursor.fetchone()[0] is None:
+            return 0
+        # Files first: a crash then leaves a table to drop, not orphaned files
+        dropped = _delete_files(name)
+        cursor.execute(f"DROP TABLE {quote(name)}")
+    return dropped
@@ -0,0 +1,127 @@
+import base64
+import logging
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+
+from . import metrics
+from .similarity import split_hash, to_signed
+
+logger = logging.getLogger(__name__)
+
+HASH_SIZE = 8
+
+# Rendition shown in galleries and linked from guest emails
+THUMBNAIL_SIZE = (640, 640)
+THUMBNAIL_QUALITY = 85
+
+# Inline placeholder painted behind gallery tiles until the image loads,
+# around 500 bytes
+PLACEHOLDER_SIZE = (24, 24)
+PLACEHOLDER_QUALITY = 50
+
+
+def decode_data_url(data_url):
+    """Split a base64 image data URL into its file extension and raw bytes"""
+    header, encoded = data_url.split(";base64,")
+    return header.split("/")[-1], base64.b64decode(encoded)
+
+
+def dhash(image, hash_size=HASH_SIZE):
+    """Return the 64-bit difference hash of a PIL image as an unsigned int"""
+    from PIL import Image
+
+    # Let the JPEG decoder downscale while decoding instead of inflating
+    # the full-resolution frame just to throw most of it away
+    image.draft("L", (hash_size * 8, hash_size * 8))
+    image = image.convert("L").resize(
+        (hash_size + 1, hash_size), Image.Resampling.LANCZOS
+    )
+    pixels = image.tobytes()
+
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            left = pixels[offset + col]
+            right = pixels[offset + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+
+def make_thumbnail(image, size=THUMBNAIL_SIZE):
+    """
+    Scale `image` down in place to fit within `size` and return it as RGB.
+
+    With reducing_gap=1 Image.thumbnail drafts the JPEG decoder straight to
+    the final aspect-correct size, so large originals are decoded at a
+    fraction of their resolution before the LANCZOS pass.
+    """
+    from PIL import Image
+
+    image.thumbnail(size, Image.Resampling.LANCZOS, reducing_gap=1.0)
+    return image.convert("RGB")
+
+
+def encode_jpeg(image, quality=THUMBNAIL_QUALITY):
+    buffer = BytesIO()
+    image.save(buffer, format="JPEG", quality=quality, optimize=True)
+    return buffer.getvalue()
+
+
+def make_placeholder(image, size=PLACEHOLDER_SIZE):
+    """Tiny base64 JPEG of `image`, browsers blur it when scaled up"""
+    from PIL import Image
+
+    image = image.copy()
+    image.thumbnail(size, Image.Resampling.BILINEAR)
+    data = encode_jpeg(image.convert("RGB"), quality=PLACEHOLDER_QUALITY)
+    return base64.b64encode(data).decode("ascii")
+
+
+def process_photo(photo):
+    """
+    Compute derived data for a stored photo: its dimensions, the
+    gallery/email thumbnail, the inline placeholder and the perceptual hash.
+
+    Failures are logged and swallowed so that a bad image never loses the
+    original capture. Returns True when the photo was processed.
+    """
+    # PIL is imported on first use throughout this module: it is a large
+    # share of worker start-up and most requests never touch an image
+    from PIL import Image
+
+    try:
+        with metrics.timer("photo_processing"):
+            with photo.image.open("rb") as f, Image.open(f) as image:
+                width, height = image.size
+                thumbnail = make_thumbnail(image)
+            # The thumbnail is plenty for a 9x8 hash and much cheaper to scan
+            value = dhash(thumbnail)
+            data = encode_jpeg(thumbnail)
+            placeholder = make_placeholder(thumbnail)
+    except Exception:
+        logger.exception("Failed to process photo %s", photo.pk)
+        return False
+
+    if photo.thumbnail:
+        photo.thumbnail.delete(save=False)
+    photo.thumbnail.save(f"{photo.id}.jpg", ContentFile(data), save=False)
+    photo.placeholder = placeholder
+    photo.width, photo.height = width, height
+    photo.phash = to_signed(value)
+    photo.phash_0, photo.phash_1, photo.phash_2, photo.phash_3 = split_hash(value)
+    photo.save(
+        update_fields=[
+            "thumbnail",
+            "placeholder",
+            "width",
+            "height",
+            "phash",
+            "phash_0",
+            "phash_1",
+            "phash_2",
+            "phash_3",
+        ]
+    )
+    return True
@@ -0,0 +1,234 @@
+"""
+Opt-in request profiling for production.
+
+ProfilingMiddleware is listed in MIDDLEWARE but removes itself at startup
+(MiddlewareNotUsed) unless PHOTOBOOTH_PROFILING_ENABLED is set, so it costs
+nothing when off. When on, a request is profiled if it carries a valid
+signed X-Photobooth-Profile header (see the profile_token command), if a
+staff user adds ?profile=1, or by random 1-in-N sampling. The cProfile
+stats and the SQL it ran are stored as a RequestProfile, browsable in the
+admin, where the raw stats can be downloaded for snakeviz or flameprof.
+
+Streaming responses are only profiled up to the point the view returns.
+cProfile only sees the thread it is enabled on. The middleware runs in the
+handler's mode, enabling the profiler inside its coroutine under ASGI, and a
+view Django would run on another thread (an async view under WSGI, a sync
+view under ASGI) is called from process_view with a second profiler enabled
+on that thread; both end up in one set of stats. ORM calls an async view
+makes through sync_to_async run on other threads and are only visible as
+time spent awaiting them. Under ASGI, other requests the event loop runs
+while a profiled one awaits show up in its profile too.
+"""
+
+import cProfile
+import io
+import logging
+import marshal
+import pstats
+import random
+import sys
+import time
+
+from asgiref.sync import (
+    async_to_sync,
+    iscoroutinefunction,
+    markcoroutinefunction,
+    sync_to_async,
+)
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections, transaction
+
+from .models import RequestProfile
+from .querylog import QueryLog, observe_queries
+
+logger = logging.getLogger(__name__)
+
+HEADER = "X-Photobooth-Profile"
+SIGNING_SALT = "photobooth.profiling"
+MAX_SQL_LENGTH = 2000
+
+
+def make_token():
+    """Return a value for the profiling header, valid for the configured max age"""
+    return signing.TimestampSigner(salt=SIGNING_SALT).sign("profile")
+
+
+def valid_token(value):
+    try:
+        signing.TimestampSigner(salt=SIGNING_SALT).unsign(
+            value, max_age=settings.PHOTOBOOTH_PROFILING_TOKEN_MAX_AGE
+        )
+    except signing.BadSignature:
+        return False
+    return True
+
+
+def start_profiler():
+    """An enabled profiler, None when one is already active on this thread"""
+    if sys.getprofile() is not None:
+        return None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        return None
+    return profiler
+
+
+def make_view_atomic(view):
+    """What Django's handler does to a view with ATOMIC_REQUESTS"""
+    non_atomic = getattr(view, "_non_atomic_requests", set())
+    for alias, database in connections.settings.items():
+        if database["ATOMIC_REQUESTS"] and alias not in non_atomic:
+            view = transaction.atomic(using=alias)(view)
+    return view
+
+
+class ProfilingMiddleware:
+    """Store cProfile stats and SQL for selected requests"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.PHOTOBOOTH_PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = settings.PHOTOBOOTH_PROFILING_SAMPLE_RATE
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+            # Django would run a sync process_view on a thread of its own
+            self.process_view = self.aprocess_view
+
+    def trigger(self, request):
+        token = request.headers.get(HEADER)
+        if token and valid_token(token):
+            return "header"
+        user = getattr(request, "user", None)
+        if request.GET.get("profile") == "1" and user and user.is_staff:
+            return "staff"
+        if self.sample_rate and random.randrange(self.sample_rate) == 0:
+            return "sample"
+        return None
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        trigger = self.trigger(request)
+        profiler = start_profiler() if trigger else None
+        if profiler is None:
+            return self.get_response(request)
+
+        request.photobooth_profilers = [profiler]
+        started = time.perf_counter()
+        try:
+            with observe_queries(QueryLog(keep_sql=True)) as queries:
+                response = self.get_response(request)
+        finally:
+            profiler.disable()
+        self.finish(request, response, trigger, started, queries)
+        return response
+
+    async def __acall__(self, request):
+        trigger = self.trigger(request)
+        profiler = start_profiler() if trigger else None
+        if profiler is None:
+            return await self.get_response(request)
+
+        request.photobooth_profilers = [profiler]
+        started = time.perf_counter()
+        try:
+            with observe_queries(QueryLog(keep_sql=True)) as queries:
+                response = await self.get_response(request)
+        finally:
+            profiler.disable()
+        await sync_to_async(self.finish)(request, response, trigger, started, queries)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        profilers = getattr(request, "photobooth_profilers", None)
+        if profilers is None or not iscoroutinefunction(view_func):
+            return None
+
+        # Django would call the view through async_to_sync, on a thread the
+        # middleware's profiler does not see
+        async def profiled():
+            profiler = start_profiler()
+            if profiler is not None:
+                profilers.append(profiler)
+            try:
+                return await view_func(request, *view_args, **view_kwargs)
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+
+        return async_to_sync(profiled)()
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        profilers = getattr(request, "photobooth_profilers", None)
+        if profilers is None or iscoroutinefunction(view_func):
+            return None
+        view = make_view_atomic(view_func)
+
+        # Django would call the view through sync_to_async, on a thread the
+        # middleware's profiler does not see
+        def profiled():
+            profiler = start_profiler()
+            if profiler is not None:
+                profilers.append(profiler)
+            try:
+                return view(request, *view_args, **view_kwargs)
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+
+        return await sync_to_async(profiled)()
+
+    def finish(self, request, response, trigger, started, queries):
+        duration = (time.perf_counter() - started) * 1000
+        try:
+            self.save(request, response, trigger, duration, queries)
+        except Exception:
+            # Never fail the request because the profile couldn't be stored
+            logger.exception("Failed to store request profile for %s", request.path)
+
+    def save(self, request, response, trigger, duration, queries):
+        stream = io.StringIO()
+        stats = pstats.Stats(*request.photobooth_profilers, stream=stream)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(
+            settings.PHOTOBOOTH_PROFILING_REPORT_LINES
+        )
+
+        match = getattr(request, "resolver_match", None)
+        user = getattr(request, "user", None)
+        statements = [
+            {"sql": sql[:MAX_SQL_LENGTH], "ms": round(seconds * 1000, 3)}
+            for sql, seconds in queries.statements
+        ]
+        RequestProfile.objects.create(
+            view_name=match.view_name if match else "<unresolved>",
+            method=request.method,
+            path=request.get_full_path()[:2000],
+            status_code=response.status_code,
+            trigger=trigger,
+            user=user if user and user.is_authenticated else None,
+            duration_ms=round(duration, 3),
+            query_count=queries.count,
+            query_ms=round(queries.duration * 1000, 3),
+            queries=statements,
+            stats=stream.getvalue(),
+            profile_data=marshal.dumps(stats.stats),
+        )
+        if settings.PHOTOBOOTH_PROFILING_KEEP:
+            prune(settings.PHOTOBOOTH_PROFILING_KEEP)
+
+
+def prune(keep):
+    """Delete all but the `keep` most recent profiles"""
+    cutoff = RequestProfile.objects.order_by("-created_at").values_list(
+        "created_at", flat=True
+    )[keep : keep + 1]
+    if cutoff:
+        RequestProfile.objects.filter(created_at__lte=cutoff[0]).delete()
@@ -0,0 +1,22 @@
+from io import BytesIO
+
+from . import metrics
+
+
+def render_qr_png(data):
+    """Render `data` as a black-on-white QR code and return the PNG bytes"""
+    # qrcode pulls in its image factories, keep it off the worker boot path
+    import qrcode
+
+    with metrics.timer("qr_render"):
+        qr = qrcode.QRCode(version=1, box_size=10, border=5)
+        qr.add_data(data)
+        qr.make(fit=True)
+
+        # Create QR code image
+        img = qr.make_image(fill_color="black", back_color="white")
+
+        # Save to BytesIO
+        buffer = BytesIO()
+        img.save(buffer, format="PNG")
+        return buffer.getvalue()
@@ -0,0 +1,63 @@
+"""
+Per-request query observation that works for sync and async views.
+
+connection.execute_wrapper() only sees queries on the current thread's
+connection, but async views run their ORM calls on executor threads. So a
+single wrapper is installed on every connection as it is opened, and it
+reports to the QueryLogs registered in the current context, which asgiref
+carries over into sync_to_async threads.
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db.backends.signals import connection_created
+
+_observers = ContextVar("photobooth_query_observers", default=())
+
+
+class QueryLog:
+    """Count, total time and, with keep_sql, the statements observed"""
+
+    def __init__(self, keep_sql=False):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = [] if keep_sql else None
+
+    def __call__(self, sql, duration):
+        self.count += 1
+        self.duration += duration
+        if self.statements is not None:
+            self.statements.append((sql, duration))
+
+
+@contextmanager
+def observe_queries(log):
+    """Report every query run in this context, on any thread, to `log`"""
+    token = _observers.set((*_observers.get(), log))
+    try:
+        yield log
+    finally:
+        _observers.reset(token)
+
+
+def _execute(execute, sql, params, many, context):
+    observers = _observers.get()
+    if not observers:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - started
+        for log in observers:
+            log(sql, duration)
+
+
+def install(sender, connection, **kwargs):
+    if _execute not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _execute)
+
+
+connection_created.connect(install, dispatch_uid="photobooth.querylog")
@@ -0,0 +1,41 @@
+"""
+File responses that stream without blocking under both WSGI and ASGI.
+
+Under WSGI a FileResponse lets the server use sendfile. Under ASGI Django
+would buffer a sync file iterator in memory before sending it, so the file
+is streamed with an async generator whose reads run on worker threads.
+"""
+
+import asyncio
+
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils.http import content_disposition_header
+
+CHUNK_SIZE = 64 * 1024
+
+
+async def _read_chunks(f, chunk_size=CHUNK_SIZE):
+    try:
+        while chunk := await asyncio.to_thread(f.read, chunk_size):
+            yield chunk
+    finally:
+        await asyncio.to_thread(f.close)
+
+
+def file_response(request, f, size, content_type, filename, as_attachment=False):
+    """Stream an open binary file to the client and close it afterwards"""
+    if not isinstance(request, ASGIRequest):
+        return FileResponse(
+            f,
+            as_attachment=as_attachment,
+            filename=filename,
+            content_type=content_type,
+        )
+
+    response = StreamingHttpResponse(_read_chunks(f), content_type=content_type)
+    response["Content-Length"] = str(size)
+    response["Content-Disposition"] = content_disposition_header(
+        as_attachment, filename
+    )
+    return response
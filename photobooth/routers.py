@@ -0,0 +1,110 @@
+"""
+Read-replica routing for read-heavy photobooth views.
+
+Views wrapped in @use_replica read photobooth models from the "replica"
+database alias, when one is configured with DATABASE_REPLICA_URL. Everything
+else, and every write, goes to "default". Once a wrapped view writes, or
+opens a transaction, its remaining reads are pinned to "default" too so the
+request always sees its own changes despite replication lag. A view that
+finds nothing on the replica for something that should exist, like a photo
+captured a moment ago, can call read_from_primary() and look again.
+
+The routing state lives in a context variable, so it follows async views
+into the threads their ORM calls run on.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA = "replica"
+
+# Only these apps are read from the replica. Sessions and users are always
+# read from the primary so a login is never lost to replication lag.
+REPLICA_APPS = {"photobooth"}
+
+_routing = ContextVar("photobooth_db_routing", default=None)
+
+
+class _Routing:
+    pinned = False
+
+
+@contextmanager
+def replica_reads():
+    """Send photobooth reads in this context to the replica until a write"""
+    token = _routing.set(_Routing())
+    try:
+        yield
+    finally:
+        _routing.reset(token)
+
+
+def read_from_primary():
+    """Pin the remaining reads of the current replica_reads() to the primary"""
+    state = _routing.get()
+    if state is not None:
+        state.pinned = True
+
+
+def use_replica(view):
+    """
+    Run a view with replica_reads(). Template responses are rendered inside
+    the context, since their querysets are only evaluated then.
+    """
+    if iscoroutinefunction(view):
+
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            with replica_reads():
+                return await view(request, *args, **kwargs)
+
+    else:
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            with replica_reads():
+                response = view(request, *args, **kwargs)
+                if callable(getattr(response, "render", None)):
+                    response = response.render()
+                return response
+
+    return wrapper
+
+
+class ReplicaRouter:
+    def __init__(self):
+        self.replica = REPLICA if REPLICA in settings.DATABASES else None
+
+    def db_for_read(self, model, **hints):
+        state = _routing.get()
+        if (
+            self.replica is None
+            or state is None
+            or state.pinned
+            or model._meta.app_label not in REPLICA_APPS
+        ):
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            state.pinned = True
+            return None
+        return self.replica
+
+    def db_for_write(self, model, **hints):
+        state = _routing.get()
+        if state is not None:
+            state.pinned = True
+        # Explicit, or Django would write objects read from the replica back
+        # to the database they came from
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != REPLICA
@@ -0,0 +1,31 @@
+"""
+Guest lookups for "find my photos".
+
+Email searches hit the (session, guest_email_normalized) index with an exact
+match. Name searches use icontains, which Postgres answers from the trigram
+index on UPPER(guest_name) created in migration 0008. A two-letter query has
+no trigram for the index to look up, so it only matches the start of the
+name, a LIKE 'JO%' the same index can answer.
+"""
+
+from .models import normalize_guest_email
+
+MIN_NAME_QUERY_LENGTH = 2
+# Shorter name queries are matched as a prefix
+MIN_CONTAINS_QUERY_LENGTH = 3
+
+
+def is_email_query(query):
+    return "@" in query
+
+
+def search_guest_photos(queryset, query):
+    """Filter `queryset` to photos matching a guest name or email"""
+    query = query.strip()
+    if is_email_query(query):
+        return queryset.filter(guest_email_normalized=normalize_guest_email(query))
+    if len(query) < MIN_NAME_QUERY_LENGTH:
+        return queryset.none()
+    if len(query) < MIN_CONTAINS_QUERY_LENGTH:
+        return queryset.filter(guest_name__istartswith=query)
+    return queryset.filter(guest_name__icontains=query)
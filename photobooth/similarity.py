@@ -0,0 +1,124 @@
+"""
+Near-duplicate lookup over perceptual hashes.
+
+Each photo stores its 64-bit dHash split into four 16-bit bands, and every
+band is indexed together with the event. Two hashes within Hamming distance
+r must have at least one band that differs in at most r // 4 bits
+(pigeonhole), so a radius query only has to look up a handful of exact band
+values per band instead of scanning the whole event.
+"""
+
+from itertools import combinations
+
+from django.conf import settings
+from django.db.models import Q
+
+BANDS = 4
+BAND_BITS = 16
+BAND_MASK = (1 << BAND_BITS) - 1
+HASH_BITS = BANDS * BAND_BITS
+
+# Two flipped bits per band already means 137 values per band lookup; past
+# that the candidate set stops being small
+MAX_RADIUS = BANDS * 3 - 1
+
+
+def to_signed(value):
+    """Map an unsigned 64-bit hash onto the range of a BigIntegerField"""
+    return value - (1 << HASH_BITS) if value >= 1 << (HASH_BITS - 1) else value
+
+
+def to_unsigned(value):
+    return value + (1 << HASH_BITS) if value < 0 else value
+
+
+def split_hash(value):
+    """Split an unsigned 64-bit hash into its four 16-bit bands"""
+    return [(value >> (BAND_BITS * i)) & BAND_MASK for i in range(BANDS)]
+
+
+def hamming(a, b):
+    return (to_unsigned(a) ^ to_unsigned(b)).bit_count()
+
+
+def band_neighbours(band, flips):
+    """All band values within `flips` bit flips of `band`, including itself"""
+    values = [band]
+    for count in range(1, flips + 1):
+        for bits in combinations(range(BAND_BITS), count):
+            value = band
+            for bit in bits:
+                value ^= 1 << bit
+            values.append(value)
+    return values
+
+
+def default_radius():
+    return getattr(settings, "PHOTOBOOTH_DUPLICATE_RADIUS", 6)
+
+
+def similar_photos(photo, radius=None, queryset=None):
+    """
+    Return (distance, photo) pairs from the same event within `radius` bits
+    of `photo`, closest first.
+    """
+    from .models import Photo
+
+    if radius is None:
+        radius = default_radius()
+    if not 0 <= radius <= MAX_RADIUS:
+        raise ValueError(f"radius must be between 0 and {MAX_RADIUS}")
+    if photo.phash is None:
+        return []
+
+    if queryset is None:
+        queryset = Photo.objects.filter(is_processed=True)
+
+    flips = radius // BANDS
+    bands = split_hash(to_unsigned(photo.phash))
+    lookup = Q()
+    for index, band in enumerate(bands):
+        lookup |= Q(**{f"phash_{index}__in": band_neighbours(band, flips)})
+
+    candidates = (
+        queryset.filter(session_id=photo.session_id).filter(lookup).exclude(pk=photo.pk)
+    )
+
+    matches = []
+    for candidate in candidates:
+        distance = hamming(photo.phash, candidate.phash)
+        if distance <= radius:
+            matches.append((distance, candidate))
+    matches.sort(key=lambda match: (match[0], -match[1].taken_at.timestamp()))
+    return matches
+
+
+def collapse_near_duplicates(photos, radius=None):
+    """
+    Fold near-duplicates in an already-fetched list of photos into the first
+    (newest) photo they resemble.
+
+    Returns the photos to display; each carries a `near_duplicates` list.
+    """
+    if radius is None:
+        radius = default_radius()
+
+    kept = []
+    for photo in photos:
+        photo.near_duplicates = []
+        original = None
+        if photo.phash is not None:
+            original = next(
+                (
+                    shown
+                    for shown in kept
+                    if shown.phash is not None
+                    and hamming(shown.phash, photo.phash) <= radius
+                ),
+                None,
+            )
+        if original is not None:
+            original.near_duplicates.append(photo)
+        else:
+            kept.append(photo)
+    return kept
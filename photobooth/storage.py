@@ -0,0 +1,254 @@
+"""
+A read-through local disk cache in front of a shared or remote storage.
+
+CachedStorage wraps another storage, configured like an entry of STORAGES,
+and keeps the files it reads in a directory on local disk, so originals
+and renditions that are downloaded, served or processed again are read
+from this node instead of over the network. Writes, deletes, URLs and
+metadata go straight to the wrapped storage.
+
+Recently read files are kept under a byte budget; when a fill pushes the
+cache over it, the least recently read files (by mtime, refreshed on a hit)
+are evicted until it is back under 90% of the budget. Concurrent misses
+for the same file in one process are collapsed into a single fetch.
+Worker processes on a node share the directory, each fill lands with an
+atomic rename so they never see a partial file.
+
+Stored names are assumed not to be rewritten in place, which holds for
+photos (their names contain the photo id). Deleting a file through this
+storage drops it from the local cache; other nodes keep their copy until
+it is evicted.
+"""
+
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from django.core.files import File
+from django.core.files.storage import Storage
+from django.utils.module_loading import import_string
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+COPY_CHUNK_SIZE = 1024 * 1024
+PARTIAL_SUFFIX = ".part"
+# A hit refreshes the file's mtime at most this often, in seconds
+TOUCH_INTERVAL = 60
+# Eviction stops once the cache is back under this share of the budget
+LOW_WATER = 0.9
+
+HIT = "hit"
+MISS = "miss"
+COALESCED = "coalesced"
+
+
+def create_backend(backend):
+    return import_string(backend["BACKEND"])(**backend.get("OPTIONS", {}))
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.error = None
+
+
+class CachedStorage(Storage):
+    def __init__(self, backend, location, max_bytes=10 * 1024**3):
+        self.backend = create_backend(backend)
+        self.cache_location = os.fspath(location)
+        self.max_bytes = max_bytes
+        self.stats = Counter()
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._size_lock = threading.Lock()
+        self._size = None
+
+    def __getattr__(self, name):
+        # Backend specifics such as FileSystemStorage.location
+        if name == "backend":
+            raise AttributeError(name)
+        return getattr(self.backend, name)
+
+    def cache_path(self, name):
+        key = hashlib.sha256(name.encode()).hexdigest()
+        return os.path.join(self.cache_location, key[:2], key)
+
+    def _count(self, result):
+        with self._lock:
+            self.stats[result] += 1
+        metrics.increment("photobooth_storage_cache_requests_total", result=result)
+
+    def hit_rate(self):
+        total = sum(self.stats.values())
+        return self.stats[HIT] / total if total else 0.0
+
+    def _open(self, name, mode="rb"):
+        if "r" not in mode or "+" in mode:
+            return self.backend.open(name, mode)
+        path = self.cache_path(name)
+        try:
+            f = open(path, mode)  # noqa: SIM115 - returned to the caller
+        except FileNotFoundError:
+            self._fetch(name, path)
+            try:
+                f = open(path, mode)  # noqa: SIM115 - returned to the caller
+            except FileNotFoundError:
+                # Evicted already, by another worker or as larger than the cache
+                return self.backend.open(name, mode)
+        else:
+            self._count(HIT)
+            self._touch(path)
+        return File(f, name=name)
+
+    def _touch(self, path):
+        try:
+            if time.time() - os.stat(path).st_mtime > TOUCH_INTERVAL:
+                os.utime(path)
+        except FileNotFoundError:
+            pass  # Evicted meanwhile, the open file stays readable
+
+    def _fetch(self, name, path):
+        """Copy `name` into the cache, or wait for the thread already doing it"""
+        with self._lock:
+            flight = self._inflight.get(path)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[path] = _Flight()
+        if not leader:
+            self._count(COALESCED)
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return
+
+        self._count(MISS)
+        try:
+            with metrics.timer("storage_cache_fetch"):
+                size = self._download(name, path)
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[path]
+            flight.done.set()
+        metrics.increment("photobooth_storage_cache_fetched_bytes_total", size)
+        self._added(size)
+
+    def _download(self, name, path):
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, partial = tempfile.mkstemp(dir=directory, suffix=PARTIAL_SUFFIX)
+        try:
+            size = 0
+            with os.fdopen(fd, "wb") as target, self.backend.open(name, "rb") as source:
+                while chunk := source.read(COPY_CHUNK_SIZE):
+                    target.write(chunk)
+                    size += len(chunk)
+            os.replace(partial, path)
+        except BaseException:
+            os.unlink(partial)
+            raise
+        return size
+
+    def _scan(self):
+        """(mtime, size, path) of every cached file"""
+        files = []
+        try:
+            directories = os.scandir(self.cache_location)
+        except FileNotFoundError:
+            return files
+        with directories:
+            for directory in directories:
+                if not directory.is_dir(follow_symlinks=False):
+                    continue
+                with os.scandir(directory.path) as entries:
+                    for entry in entries:
+                        try:
+                            stat = entry.stat(follow_symlinks=False)
+                        except FileNotFoundError:
+                            continue
+                        files.append((stat.st_mtime, stat.st_size, entry.path))
+        return files
+
+    def _added(self, size):
+        with self._size_lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._scan())
+            else:
+                self._size += size
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # Other workers fill the same directory, so start from what is there
+        files = sorted(self._scan())
+        total = sum(size for _, size, _ in files)
+        target = self.max_bytes * LOW_WATER
+        evicted = 0
+        now = time.time()
+        for mtime, size, path in files:
+            if total <= target:
+                break
+            if path.endswith(PARTIAL_SUFFIX) and now - mtime < 3600:
+                continue  # Probably still being written by another worker
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            evicted += 1
+        self._size = total
+        logger.info("Evicted %d files from the media cache", evicted)
+
+    def evict(self, name):
+        """Drop `name` from the local cache"""
+        try:
+            os.unlink(self.cache_path(name))
+        except FileNotFoundError:
+            pass
+
+    def save(self, name, content, max_length=None):
+        name = self.backend.save(name, content, max_length)
+        self.evict(name)
+        return name
+
+    def delete(self, name):
+        self.evict(name)
+        self.backend.delete(name)
+
+    def exists(self, name):
+        return self.backend.exists(name)
+
+    def listdir(self, path):
+        return self.backend.listdir(path)
+
+    def size(self, name):
+        return self.backend.size(name)
+
+    def url(self, name):
+        return self.backend.url(name)
+
+    def path(self, name):
+        return self.backend.path(name)
+
+    def get_available_name(self, name, max_length=None):
+        return self.backend.get_available_name(name, max_length)
+
+    def generate_filename(self, filename):
+        return self.backend.generate_filename(filename)
+
+    def get_accessed_time(self, name):
+        return self.backend.get_accessed_time(name)
+
+    def get_created_time(self, name):
+        return self.backend.get_created_time(name)
+
+    def get_modified_time(self, name):
+        return self.backend.get_modified_time(name)
@@ -0,0 +1,107 @@
+from io import BytesIO
+
+import pytest
+from django.core.files.base import ContentFile
+from PIL import Image, ImageDraw
+
+from accounts.models import CustomUser
+from photobooth.ingest import close_journal
+from photobooth.models import Event, Photo
+
+
+def render_jpeg(size=(320, 240), color=(200, 80, 40), shapes=()):
+    """Render a small JPEG; `shapes` is a list of (box, fill) rectangles"""
+    image = Image.new("RGB", size, color)
+    draw = ImageDraw.Draw(image)
+    for box, fill in shapes:
+        draw.rectangle(box, fill=fill)
+    buffer = BytesIO()
+    image.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def make_jpeg():
+    return render_jpeg
+
+
+@pytest.fixture(autouse=True)
+def media_root(settings, tmp_path):
+    settings.MEDIA_ROOT = tmp_path / "media"
+    return settings.MEDIA_ROOT
+
+
+@pytest.fixture(autouse=True)
+def cold_root(settings, tmp_path):
+    settings.STORAGES = {
+        **settings.STORAGES,
+        "cold": {
+            "BACKEND": "django.core.files.storage.FileSystemStorage",
+            "OPTIONS": {"location": tmp_path / "cold"},
+        },
+    }
+    return tmp_path / "cold"
+
+
+@pytest.fixture(autouse=True)
+def backup_root(settings, tmp_path, cold_root):
+    settings.STORAGES = {
+        **settings.STORAGES,
+        "backup": {
+            "BACKEND": "django.core.files.storage.FileSystemStorage",
+            "OPTIONS": {"location": tmp_path / "backup"},
+        },
+    }
+    return tmp_path / "backup"
+
+
+@pytest.fixture(autouse=True)
+def pack_root(settings, tmp_path):
+    settings.PHOTOBOOTH_PACK_ROOT = str(tmp_path / "packs")
+    return tmp_path / "packs"
+
+
+@pytest.fixture(autouse=True)
+def ingest_root(settings, tmp_path):
+    settings.PHOTOBOOTH_INGEST_ROOT = str(tmp_path / "ingest")
+    yield tmp_path / "ingest"
+    close_journal()
+
+
+@pytest.fixture(autouse=True)
+def static_storage(settings):
+    # The manifest storage needs collectstatic, which tests never run
+    settings.STORAGES = {
+        **settings.STORAGES,
+        "staticfiles": {
+            "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"
+        },
+    }
+
+
+@pytest.fixture(autouse=True)
+def enforce_query_budgets(settings):
+    settings.PHOTOBOOTH_QUERY_BUDGET_MODE = "raise"
+
+
+@pytest.fixture
+def user():
+    return CustomUser.objects.create_user(
+        email="host@example.com", password="password123"
+    )
+
+
+@pytest.fixture
+def event(user):
+    return Event.objects.create(name="Test Wedding", created_by=user)
+
+
+@pytest.fixture
+def make_photo(event):
+    def _make_photo(content=None, session=None, **fields):
+        fields.setdefault("is_processed", True)
+        photo = Photo.objects.create(session=session or event, **fields)
+        photo.image.save(f"{photo.id}.jpg", ContentFile(content or render_jpeg()))
+        return photo
+
+    return _make_photo
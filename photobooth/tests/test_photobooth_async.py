@@ -0,0 +1,216 @@
+import asyncio
+import base64
+import time
+
+import pytest
+from asgiref.sync import async_to_sync, sync_to_async
+from django.test import AsyncClient
+from django.urls import reverse
+
+from photobooth import views
+from photobooth.models import Event, Photo, PhotoboothSettings
+from photobooth.querylog import QueryLog, observe_queries
+
+
+async def read_streaming(response):
+    return b"".join([chunk async for chunk in response.streaming_content])
+
+
+@pytest.mark.django_db
+class TestAsyncViews:
+    def test_download_streams_under_asgi(self, make_photo, make_jpeg):
+        content = make_jpeg(size=(800, 600))
+        photo = make_photo(content=content)
+
+        @async_to_sync
+        async def download():
+            response = await AsyncClient().get(
+                reverse("photobooth:photo_download", args=[photo.id])
+            )
+            return response, await read_streaming(response)
+
+        response, body = download()
+
+        assert response.streaming
+        assert response["Content-Length"] == str(len(content))
+        assert response["Content-Disposition"] == (
+            f'attachment; filename="photobooth_{photo.id}.jpg"'
+        )
+        assert body == content
+
+    def test_capture_and_info_under_asgi(self, event, make_jpeg):
+        image = "data:image/jpeg;base64," + base64.b64encode(make_jpeg()).decode()
+
+        @async_to_sync
+        async def capture_then_info():
+            client = AsyncClient()
+            captured = await client.post(
+                reverse("photobooth:capture_photo"),
+                {"image": image, "event_id": str(event.id)},
+                content_type="application/json",
+            )
+            info = await client.get(reverse("photobooth:event_info", args=[event.id]))
+            return captured.json(), info.json()
+
+        captured, info = capture_then_info()
+
+        photo = Photo.objects.get(id=captured["photo_id"])
+        assert photo.thumbnail
+        assert photo.phash is not None
+        assert info["photo_count"] == 1
+
+    def test_qr_views_under_asgi(self, event, make_photo):
+        photo = make_photo()
+
+        @async_to_sync
+        async def fetch(url):
+            return await AsyncClient().get(url)
+
+        for url in [
+            reverse("photobooth:photo_qr", args=[photo.id]),
+            reverse("photobooth:event_gallery_qr", args=[event.id]),
+        ]:
+            response = fetch(url)
+            assert response["Content-Type"] == "image/png"
+            assert response.content.startswith(b"\x89PNG")
+
+    def test_query_log_sees_queries_on_other_threads(self):
+        @async_to_sync
+        async def count_rows():
+            with observe_queries(QueryLog(keep_sql=True)) as queries:
+                await Event.objects.acount()
+                # A fresh thread opens its own connection
+                await sync_to_async(
+                    PhotoboothSettings.objects.count, thread_sensitive=False
+                )()
+            return queries
+
+        queries = count_rows()
+
+        assert queries.count == 2
+        assert "photobooth_event" in queries.statements[0][0]
+        assert "photobooth_photoboothsettings" in queries.statements[1][0]
+
+
+@pytest.mark.django_db
+class TestEventInfoPolling:
+    @pytest.fixture(autouse=True)
+    def fast_polling(self, settings):
+        settings.PHOTOBOOTH_EVENT_INFO_POLL_INTERVAL = 0.01
+        settings.PHOTOBOOTH_EVENT_INFO_MAX_WAIT = 0.2
+
+    def test_etag_and_not_modified(self, client, event, make_photo):
+        url = reverse("photobooth:event_info", args=[event.id])
+        first = client.get(url)
+
+        assert (
+            client.get(url, headers={"if-none-match": first["ETag"]}).status_code == 304
+        )
+
+        make_photo()
+        changed = client.get(url, headers={"if-none-match": first["ETag"]})
+
+        assert changed.status_code == 200
+        assert changed["ETag"] != first["ETag"]
+        assert changed.json()["photo_count"] == 1
+
+    def test_wsgi_requests_are_not_held(self, client, event, settings):
+        settings.PHOTOBOOTH_EVENT_INFO_MAX_WAIT = 30
+        url = reverse("photobooth:event_info", args=[event.id])
+
+        started = time.monotonic()
+        response = client.get(url, {"wait": "30"}, headers={"if-none-match": '"0"'})
+
+        assert response.status_code == 304
+        assert time.monotonic() - started < 5
+        # Booths stop watching rather than polling a server that cannot wait
+        assert response["X-Event-Info-Wait"] == "0"
+
+    def test_long_poll_times_out_unchanged(self, event, monkeypatch):
+        releases = []
+        monkeypatch.setattr(
+            views, "release_pooled_connections", lambda: releases.append(1)
+        )
+        url = reverse("photobooth:event_info", args=[event.id])
+        etag = f'"{event.version}"'
+
+        response = async_to_sync(AsyncClient().get)(
+            url, {"wait": "60"}, headers={"if-none-match": etag}
+        )
+
+        assert response.status_code == 304
+        assert response["ETag"] == etag
+        assert response["X-Event-Info-Wait"] == "0.2"
+        # The connection goes back to the pool between checks
+        assert releases
+
+    def test_release_only_closes_idle_pooled_connections(self, monkeypatch):
+        class Connection:
+            def __init__(self, pool, in_atomic_block=False):
+                self.pool = pool
+                self.in_atomic_block = in_atomic_block
+                self.closed = False
+
+            def close(self):
+                self.closed = True
+
+        pooled, unpooled, busy = (
+            Connection(object()),
+            Connection(None),
+            Connection(object(), in_atomic_block=True),
+        )
+
+        class Handler:
+            def all(self, initialized_only=False):
+                return [pooled, unpooled, busy]
+
+        monkeypatch.setattr(views, "connections", Handler())
+        views.release_pooled_connections()
+
+        assert [pooled.closed, unpooled.closed, busy.closed] == [True, False, False]
+
+    def test_long_poll_returns_on_change(self, event, make_photo, settings):
+        settings.PHOTOBOOTH_EVENT_INFO_MAX_WAIT = 30
+        # As under PHOTOBOOTH_ASGI: sync-only middleware would hold the one
+        # thread the ORM calls below also need for the whole poll
+        settings.MIDDLEWARE = [
+            name for name in settings.MIDDLEWARE if "WhiteNoise" not in name
+        ]
+        url = reverse("photobooth:event_info", args=[event.id])
+
+        @async_to_sync
+        async def poll_while_capturing():
+            async def capture():
+                await asyncio.sleep(0.05)
+                await sync_to_async(make_photo)()
+
+            response, _ = await asyncio.gather(
+                AsyncClient().get(
+                    url, {"wait": "30"}, headers={"if-none-match": '"0"'}
+                ),
+                capture(),
+            )
+            return response
+
+        started = time.monotonic()
+        response = poll_while_capturing()
+
+        assert time.monotonic() - started < 5
+        assert response.status_code == 200
+        assert response.json() == {
+            "id": str(event.id),
+            "name": event.name,
+            "code": event.code,
+            "photo_count": 1,
+            "version": 1,
+        }
+
+    def test_stale_event_save_never_reuses_a_version(self, event, make_photo):
+        stale = Event.objects.get(id=event.id)
+        make_photo()
+
+        stale.name = "Renamed"
+        stale.save()
+
+        assert stale.version == 2
+        assert Event.objects.get(id=event.id).version == 2
@@ -0,0 +1,210 @@
+import gzip
+import os
+from datetime import UTC, datetime, timedelta
+from io import StringIO
+from pathlib import Path
+
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.urls import reverse
+
+from photobooth import backups
+from photobooth.backups import (
+    create_snapshot,
+    list_snapshots,
+    read_manifest,
+    restore_snapshot,
+)
+from photobooth.packs import pack_event, pack_path
+from photobooth.tiering import archive_photo
+
+NOW = datetime(2026, 10, 19, 3, 0, tzinfo=UTC)
+
+
+def write(root, name, data):
+    path = root / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return path
+
+
+def objects(backup_root):
+    return sorted(
+        path.name for path in (backup_root / "objects").rglob("*") if path.is_file()
+    )
+
+
+class TestSnapshot:
+    def test_stores_each_content_once(self, media_root, backup_root):
+        write(media_root, "photos/a/1.jpg", b"one")
+        write(media_root, "photos/a/2.jpg", b"two")
+        write(media_root, "photos/b/1.jpg", b"one")
+
+        snapshot_id, stats = create_snapshot(workers=2, now=NOW)
+
+        assert list_snapshots() == [snapshot_id]
+        entries = list(read_manifest(snapshot_id))
+        assert [entry["name"] for entry in entries] == [
+            "photos/a/1.jpg",
+            "photos/a/2.jpg",
+            "photos/b/1.jpg",
+        ]
+        assert entries[0]["sha256"] == entries[2]["sha256"]
+        assert len(objects(backup_root)) == 2
+        assert stats["files"] == 3
+        assert stats["copied"] == 2
+
+    def test_next_snapshot_only_reads_new_and_changed_files(
+        self, media_root, backup_root
+    ):
+        write(media_root, "photos/a/1.jpg", b"one")
+        changed = write(media_root, "photos/a/2.jpg", b"two")
+        create_snapshot(workers=2, now=NOW)
+
+        changed.write_bytes(b"two, edited")
+        write(media_root, "photos/b/1.jpg", b"new")
+        write(media_root, "photos/b/2.jpg", b"one")
+        _, stats = create_snapshot(workers=2, now=NOW + timedelta(days=1))
+
+        assert stats["files"] == 4
+        assert stats["hashed"] == 3
+        # Content already backed up under another name is not copied again
+        assert stats["copied"] == 2
+        assert len(objects(backup_root)) == 4
+        assert len(list_snapshots()) == 2
+
+    def test_truncated_objects_are_copied_again(self, media_root, backup_root):
+        write(media_root, "photos/a/1.jpg", b"complete")
+        snapshot_id, _ = create_snapshot(workers=2, now=NOW)
+        [entry] = read_manifest(snapshot_id)
+        stored = backup_root / "objects" / entry["sha256"][:2] / entry["sha256"]
+        stored.write_bytes(b"comp")
+        write(media_root, "photos/b/1.jpg", b"complete")
+
+        _, stats = create_snapshot(workers=2, now=NOW + timedelta(days=1))
+
+        assert stats["copied"] == 1
+        assert stored.read_bytes() == b"complete"
+        assert not list(stored.parent.glob("*.partial"))
+
+    def test_manifest_is_compressed(self, media_root, backup_root):
+        write(media_root, "photos/a/1.jpg", b"one")
+        snapshot_id, _ = create_snapshot(workers=2, now=NOW)
+
+        path = backup_root / "snapshots" / f"{snapshot_id}.jsonl.gz"
+        assert b"photos/a/1.jpg" in gzip.decompress(path.read_bytes())
+
+    def test_covers_cold_originals_and_packs(self, media_root, cold_root, pack_root):
+        write(media_root, "photos/a/1.jpg", b"hot")
+        write(cold_root, "photos/b/1.jpg", b"cold")
+        write(pack_root, "c.pack", b"packed")
+
+        snapshot_id, _ = create_snapshot(workers=2, now=NOW)
+
+        assert [entry["name"] for entry in read_manifest(snapshot_id)] == [
+            "cold/photos/b/1.jpg",
+            "packs/c.pack",
+            "photos/a/1.jpg",
+        ]
+
+    def test_growing_pack_is_captured_as_listed(self, pack_root, monkeypatch):
+        pack = write(pack_root, "c.pack", b"first")
+        list_directory = backups.list_directory
+
+        def append_after_listing(*args, **kwargs):
+            files = list_directory(*args, **kwargs)
+            with open(pack, "ab") as f:
+                f.write(b"second")
+            return files
+
+        monkeypatch.setattr(backups, "list_directory", append_after_listing)
+
+        snapshot_id, _ = create_snapshot(workers=2, now=NOW)
+
+        [entry] = read_manifest(snapshot_id)
+        assert entry["size"] == 5
+        dest = pack_root.parent / "restored"
+        restore_snapshot(snapshot_id, dest=dest)
+        assert (dest / "packs/c.pack").read_bytes() == b"first"
+        # Restoring in place keeps what was appended since
+        assert restore_snapshot(snapshot_id)["restored"] == 0
+        assert pack.read_bytes() == b"firstsecond"
+
+
+class TestRestore:
+    def test_restores_one_event(self, media_root, tmp_path):
+        write(media_root, "photos/a/1.jpg", b"one")
+        write(media_root, "photos/ab/1.jpg", b"other event")
+        write(media_root, "photos/b/1.jpg", b"two")
+        snapshot_id, _ = create_snapshot(workers=2, now=NOW)
+        dest = tmp_path / "restored"
+
+        stats = restore_snapshot(snapshot_id, dest=dest, prefixes=("photos/a/",))
+
+        assert stats["files"] == stats["restored"] == 1
+        assert [path.name for path in dest.rglob("*.jpg")] == ["1.jpg"]
+        assert (dest / "photos/a/1.jpg").read_bytes() == b"one"
+
+    def test_keeps_intact_files_and_mtimes(self, media_root):
+        original = write(media_root, "photos/a/1.jpg", b"one")
+        lost = write(media_root, "photos/a/2.jpg", b"two")
+        snapshot_id, _ = create_snapshot(workers=2, now=NOW)
+        mtime = lost.stat().st_mtime
+        os.remove(lost)
+
+        stats = restore_snapshot(snapshot_id, workers=2)
+
+        assert stats["files"] == 2
+        assert stats["restored"] == 1
+        assert lost.read_bytes() == b"two"
+        assert lost.stat().st_mtime == mtime
+        assert original.read_bytes() == b"one"
+        # So the restored file does not look changed to the next snapshot
+        _, stats = create_snapshot(workers=2, now=NOW + timedelta(days=1))
+        assert stats["hashed"] == 0
+
+
+class TestCommands:
+    def test_backup_and_restore_event(self, media_root):
+        lost = write(media_root, "photos/a/1.jpg", b"one")
+        write(media_root, "photos/b/1.jpg", b"two")
+        out = StringIO()
+
+        call_command("backup_media", "--workers=2", stdout=out)
+        assert "2 files, 2 new or changed, 2 copied" in out.getvalue()
+
+        os.remove(lost)
+        out = StringIO()
+        call_command("restore_media", "--event=a", stdout=out)
+        assert "Restored 1 of 1 files" in out.getvalue()
+        assert lost.read_bytes() == b"one"
+
+    @pytest.mark.django_db
+    def test_restore_packed_and_archived_event(
+        self, client, event, make_photo, make_jpeg, cold_root
+    ):
+        packed = make_photo(content=make_jpeg(size=(120, 90)))
+        pack_event(event.id)
+        archived = make_photo(content=make_jpeg(size=(90, 120)))
+        archive_photo(archived)
+        pack = Path(pack_path(event.id))
+        pack_bytes = pack.read_bytes()
+        cold = cold_root / archived.image.name
+        call_command("backup_media", "--workers=2", stdout=StringIO())
+
+        os.remove(pack)
+        os.remove(cold)
+        out = StringIO()
+        call_command("restore_media", f"--event={event.id}", stdout=out)
+
+        assert "Restored 2 of 2 files" in out.getvalue()
+        assert pack.read_bytes() == pack_bytes
+        assert cold.exists()
+        packed.refresh_from_db()
+        response = client.get(reverse("photobooth:photo_download", args=[packed.id]))
+        assert b"".join(response.streaming_content) == pack_bytes
+
+    def test_restore_needs_a_snapshot(self):
+        with pytest.raises(CommandError, match="no snapshots"):
+            call_command("restore_media")
@@ -0,0 +1,82 @@
+import json
+import sys
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from PIL import Image
+
+from photobooth.benchmarking import (
+    compare_to_baseline,
+    high_water_rss_kb,
+    percentile,
+    reset_peak_rss,
+    summarize_latencies,
+)
+
+
+class TestBenchmarkHelpers:
+    def test_percentile_nearest_rank(self):
+        values = list(range(1, 101))
+
+        assert percentile(values, 50) == 50
+        assert percentile(values, 95) == 95
+        assert percentile(values, 99) == 99
+        assert percentile([], 50) == 0.0
+
+    def test_summarize_latencies(self):
+        summary = summarize_latencies([30.0, 10.0, 20.0], elapsed_s=1.5)
+
+        assert summary["count"] == 3
+        assert summary["p50_ms"] == 20.0
+        assert summary["throughput_rps"] == 2.0
+
+    def test_compare_to_baseline(self):
+        baseline = {"gallery": {"event_gallery": {"p95_ms": 100.0, "queries_max": 3}}}
+        slower = {"gallery": {"event_gallery": {"p95_ms": 130.0, "queries_max": 3}}}
+        noisy = {"gallery": {"event_gallery": {"p95_ms": 104.0, "queries_max": 3}}}
+        more_queries = {
+            "gallery": {"event_gallery": {"p95_ms": 90.0, "queries_max": 4}}
+        }
+
+        assert compare_to_baseline(slower, baseline) == [
+            "gallery/event_gallery p95_ms: 100.0 -> 130.0"
+        ]
+        assert compare_to_baseline(noisy, baseline) == []
+        assert compare_to_baseline(more_queries, baseline) == [
+            "gallery/event_gallery queries_max: 3 -> 4"
+        ]
+
+
+class TestBenchImages:
+    def test_reports_time_and_memory_per_case(self, tmp_path):
+        output = tmp_path / "images.json"
+
+        call_command(
+            "bench_images",
+            "--resolution=vga",
+            "--images=2",
+            "--repeat=1",
+            f"--output={output}",
+            stderr=StringIO(),
+        )
+
+        results = json.loads(output.read_text())["results"]
+        assert set(results["perceptual_hash"]) == {"vga"}
+        thumbnail = results["thumbnail"]["vga"]
+        assert thumbnail["images"] == 2
+        assert thumbnail["ms_per_image"] > 0
+        if reset_peak_rss():
+            assert thumbnail["peak_rss_growth_kb"] >= 0
+            assert "rss_kb_per_image" in thumbnail
+
+    @pytest.mark.skipif(not sys.platform.startswith("linux"), reason="Linux only")
+    def test_peak_rss_sees_native_buffers(self):
+        if not reset_peak_rss():
+            pytest.skip("clear_refs is not writable")
+        before = high_water_rss_kb()
+        image = Image.new("RGB", (4000, 3000), (255, 0, 0))
+        del image
+
+        # 36 MB of pixels live outside the Python heap
+        assert high_water_rss_kb() - before > 30 * 1024
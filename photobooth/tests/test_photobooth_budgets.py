@@ -0,0 +1,219 @@
+import base64
+import json
+import logging
+
+import pytest
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, reverse
+
+from photobooth import budgets, views
+from photobooth import urls as photobooth_urls
+from photobooth.budgets import QueryBudgetExceeded, get_query_budget
+from photobooth.models import Event, Photo
+from photobooth.processing import process_photo
+
+SIZES = [1, 60]
+
+
+@pytest.fixture
+def seed_event(make_photo):
+    """Fill an event with `count` photos sharing one stored, processed image"""
+
+    def _seed_event(event, count):
+        original = make_photo(
+            session=event, guest_name="Ann Smith", guest_email="ann@example.com"
+        )
+        process_photo(original)
+        Photo.objects.bulk_create(
+            Photo(
+                session=event,
+                image=original.image.name,
+                thumbnail=original.thumbnail.name,
+                guest_name="Ann Smith",
+                guest_email="ann@example.com",
+                guest_email_normalized="ann@example.com",
+                is_processed=True,
+                phash=original.phash,
+                phash_0=original.phash_0,
+                phash_1=original.phash_1,
+                phash_2=original.phash_2,
+                phash_3=original.phash_3,
+            )
+            for _ in range(count - 1)
+        )
+        return original
+
+    return _seed_event
+
+
+def view_requests(event, photo, make_jpeg):
+    """(url name, method, url, data) for a request to every photobooth view"""
+    capture = {
+        "image": "data:image/jpeg;base64," + base64.b64encode(make_jpeg()).decode(),
+        "event_id": str(event.id),
+    }
+    return [
+        ("home", "get", reverse("photobooth:home"), None),
+        ("signup", "get", reverse("photobooth:signup"), None),
+        ("event_list", "get", reverse("photobooth:event_list"), None),
+        ("event_create", "get", reverse("photobooth:event_create"), None),
+        (
+            "event_detail",
+            "get",
+            reverse("photobooth:event_detail", args=[event.id]),
+            None,
+        ),
+        ("join_event", "get", reverse("photobooth:join_event"), None),
+        ("join_event", "post", reverse("photobooth:join_event"), {"code": event.code}),
+        (
+            "event_booth",
+            "get",
+            reverse("photobooth:event_booth", args=[event.id]),
+            None,
+        ),
+        (
+            "event_gallery",
+            "get",
+            reverse("photobooth:event_gallery", args=[event.id]),
+            None,
+        ),
+        (
+            "event_gallery",
+            "get",
+            reverse("photobooth:event_gallery", args=[event.id])
+            + "?q=ann&all=1&page=last",
+            None,
+        ),
+        (
+            "event_gallery_page",
+            "get",
+            reverse("photobooth:event_gallery_page", args=[event.id]) + "?page=1",
+            None,
+        ),
+        ("capture_photo", "post", reverse("photobooth:capture_photo"), capture),
+        ("camera_settings", "get", reverse("photobooth:camera_settings"), None),
+        ("event_info", "get", reverse("photobooth:event_info", args=[event.id]), None),
+        (
+            "guest_search",
+            "get",
+            reverse("photobooth:guest_search", args=[event.id]) + "?q=ann@example.com",
+            None,
+        ),
+        (
+            "similar_photos",
+            "get",
+            reverse("photobooth:similar_photos", args=[photo.id]),
+            None,
+        ),
+        (
+            "photo_download",
+            "get",
+            reverse("photobooth:photo_download", args=[photo.id]),
+            None,
+        ),
+        (
+            "photo_image",
+            "get",
+            reverse("photobooth:photo_image", args=[photo.id]),
+            None,
+        ),
+        ("photo_qr", "get", reverse("photobooth:photo_qr", args=[photo.id]), None),
+        (
+            "event_gallery_qr",
+            "get",
+            reverse("photobooth:event_gallery_qr", args=[event.id]),
+            None,
+        ),
+    ]
+
+
+def send(client, method, url, data):
+    if method == "post" and url == reverse("photobooth:capture_photo"):
+        return client.post(url, json.dumps(data), content_type="application/json")
+    return getattr(client, method)(url, data)
+
+
+def test_every_view_has_a_budget():
+    missing = [
+        pattern.name
+        for pattern in photobooth_urls.urlpatterns
+        if isinstance(pattern, URLPattern)
+        and get_query_budget(pattern.callback) is None
+    ]
+    assert missing == []
+
+
+@pytest.mark.django_db
+class TestQueryBudgets:
+    def test_views_stay_within_budget_as_events_grow(
+        self, client, user, event, seed_event, make_jpeg
+    ):
+        # A second event with photos catches per-event queries in listings
+        other = Event.objects.create(name="Other Wedding", created_by=user)
+        client.force_login(user)
+
+        counts = {}
+        for size in SIZES:
+            photo = seed_event(event, size)
+            seed_event(other, size)
+            for name, method, url, data in view_requests(event, photo, make_jpeg):
+                # The middleware raises QueryBudgetExceeded in tests
+                with CaptureQueriesContext(connection) as queries:
+                    response = send(client, method, url, data)
+                assert response.status_code < 400, (name, url)
+                counts.setdefault((name, method, url), []).append(len(queries))
+
+        # Query counts must not depend on how many photos there are
+        grown = {
+            key: values for key, values in counts.items() if values[0] < values[-1]
+        }
+        assert grown == {}
+
+    def test_event_list_counts_photos_in_one_query(self, client, user, seed_event):
+        for index in range(5):
+            seed_event(Event.objects.create(name=f"Event {index}", created_by=user), 3)
+        client.force_login(user)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(reverse("photobooth:event_list"))
+
+        assert len(queries) == 3  # session, user, events with counts
+        assert b"<strong>Photos:</strong> 3" in response.content
+
+    def test_over_budget_raises_or_logs(self, event, settings, monkeypatch, caplog):
+        monkeypatch.setattr(views.get_event_info, "query_budget", 0)
+        url = reverse("photobooth:event_info", args=[event.id])
+
+        with pytest.raises(QueryBudgetExceeded):
+            Client().get(url)
+
+        # Middleware reads the mode when a client's handler is set up
+        settings.PHOTOBOOTH_QUERY_BUDGET_MODE = "log"
+        with caplog.at_level(logging.WARNING, logger="photobooth.budgets"):
+            assert Client().get(url).status_code == 200
+        assert (
+            "photobooth:event_info ran 1 queries, over its budget of 0" in caplog.text
+        )
+
+    def test_unbudgeted_views_are_not_observed(self, client, settings, monkeypatch):
+        logs = []
+        observe_queries = budgets.observe_queries
+
+        def record(log):
+            logs.append(log)
+            return observe_queries(log)
+
+        monkeypatch.setattr(budgets, "observe_queries", record)
+
+        client.get(reverse("admin:login"))
+        assert logs == []
+
+        client.get(reverse("photobooth:event_list"))
+        assert len(logs) == 1
+        # Statements are kept for the exception message in raise mode only
+        assert logs[0].statements is not None
+        settings.PHOTOBOOTH_QUERY_BUDGET_MODE = "log"
+        Client().get(reverse("photobooth:event_list"))
+        assert logs[1].statements is None
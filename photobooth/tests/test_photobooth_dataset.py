@@ -0,0 +1,64 @@
+import os
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.db.models import Count
+from PIL import Image
+
+from photobooth.factories import PhotoFactory
+from photobooth.management.commands.generate_dataset import parse_sizes, split_total
+from photobooth.models import Event, Photo
+
+
+def test_split_total_is_exact():
+    shares = split_total(1000, [5.0, 1.0, 1.0, 0.5])
+
+    assert sum(shares) == 1000
+    assert shares[0] > shares[1] > shares[3]
+
+
+def test_parse_sizes():
+    assert parse_sizes("160x120:80,640X480:20") == [((160, 120), 80), ((640, 480), 20)]
+
+
+@pytest.mark.django_db
+class TestGenerateDataset:
+    def test_generates_rows_and_files(self, media_root):
+        call_command(
+            "generate_dataset",
+            events=4,
+            photos=300,
+            users=2,
+            sizes=parse_sizes("32x24:3,64x48:1"),
+            batch_size=50,
+            workers=3,
+            stdout=StringIO(),
+            stderr=StringIO(),
+        )
+
+        assert Event.objects.count() == 4
+        assert Photo.objects.count() == 300
+        counts = Event.objects.annotate(n=Count("photos")).values_list("n", flat=True)
+        assert sum(counts) == 300
+
+        with_email = Photo.objects.exclude(guest_email="")
+        assert with_email.exists()
+        assert not with_email.filter(guest_email_normalized="").exists()
+        assert not Photo.objects.filter(phash_0__isnull=True).exists()
+        # Time-ordered keys like real captures, not random uuid4s
+        ids = Photo.objects.values_list("id", flat=True)
+        assert {photo_id.version for photo_id in ids} == {7}
+
+        sizes = set()
+        for photo in Photo.objects.all():
+            with Image.open(os.path.join(media_root, photo.image.name)) as image:
+                sizes.add(image.size)
+        assert sizes == {(32, 24), (64, 48)}
+
+    def test_photo_factory(self):
+        photo = PhotoFactory(guest_email="Ann@Example.com")
+
+        assert photo.session.created_by.email.endswith("@example.com")
+        assert photo.guest_email_normalized == "ann@example.com"
+        assert photo.image.size > 0
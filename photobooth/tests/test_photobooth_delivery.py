@@ -0,0 +1,73 @@
+import pytest
+from django.core import mail
+from django.core.management import CommandError, call_command
+from post_office.models import Email
+
+from photobooth.delivery import queue_event_deliveries
+from photobooth.processing import process_photo
+
+
+@pytest.fixture(autouse=True)
+def locmem_post_office(settings):
+    settings.POST_OFFICE = {
+        **settings.POST_OFFICE,
+        "BACKENDS": {"default": "django.core.mail.backends.locmem.EmailBackend"},
+    }
+
+
+@pytest.mark.django_db
+class TestGuestDelivery:
+    def test_one_digest_per_guest(self, event, make_photo):
+        first = make_photo(guest_email="Ann@Example.com", guest_name="Ann")
+        second = make_photo(guest_email="ann@example.com ")
+        make_photo(guest_email="bob@example.com")
+        make_photo()
+        process_photo(first)
+
+        guests, photos = queue_event_deliveries(event, base_url="https://booth.test")
+
+        assert (guests, photos) == (2, 3)
+        digest = Email.objects.get(to=["ann@example.com"])
+        assert digest.message.count("https://booth.test/photobooth/download/") == 2
+        assert "Ann" in digest.message
+        first.refresh_from_db()
+        assert first.thumbnail.url in digest.html_message
+        assert first.image.url not in digest.html_message
+        second.refresh_from_db()
+        assert second.emailed_at is not None
+
+    def test_plain_text_parts_are_not_html_escaped(self, event, make_photo):
+        event.name = "Kim & Lee's wedding"
+        event.save()
+        make_photo(guest_email="ann@example.com", guest_name="Ann & Bob")
+
+        queue_event_deliveries(event, base_url="https://booth.test")
+
+        digest = Email.objects.get(to=["ann@example.com"])
+        assert digest.subject == "Your photos from Kim & Lee's wedding"
+        assert "Hi Ann & Bob," in digest.message
+        assert "Kim &amp; Lee&#x27;s wedding" in digest.html_message
+
+    def test_queueing_twice_sends_once(self, event, make_photo):
+        make_photo(guest_email="ann@example.com")
+
+        assert queue_event_deliveries(event) == (1, 1)
+        assert queue_event_deliveries(event) == (0, 0)
+
+    def test_command_sends_queue(self, event, make_photo):
+        make_photo(guest_email="ann@example.com")
+        make_photo(guest_email="bob@example.com")
+
+        call_command("deliver_photos", str(event.id), "--send")
+
+        assert sorted(message.to[0] for message in mail.outbox) == [
+            "ann@example.com",
+            "bob@example.com",
+        ]
+
+    @pytest.mark.parametrize(
+        "event_id", ["not-a-uuid", "00000000-0000-0000-0000-000000000000"]
+    )
+    def test_command_rejects_unknown_event(self, event_id):
+        with pytest.raises(CommandError, match="not found"):
+            call_command("deliver_photos", event_id)
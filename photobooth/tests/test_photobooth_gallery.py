@@ -0,0 +1,36 @@
+import pytest
+from django.urls import reverse
+
+from photobooth.processing import process_photo
+
+
+@pytest.mark.django_db
+class TestGalleryMarkup:
+    def test_tiles_are_lazy_and_share_one_modal(self, client, event, make_photo):
+        photo = make_photo()
+        process_photo(photo)
+        photo.refresh_from_db()
+
+        response = client.get(reverse("photobooth:event_gallery", args=[event.id]))
+        html = response.content.decode()
+
+        assert html.count('class="modal fade"') == 2  # the photo and QR modals
+        assert 'loading="lazy"' in html
+        assert 'decoding="async"' in html
+        assert f'width="{photo.width}" height="{photo.height}"' in html
+        assert f'src="{photo.thumbnail.url}"' in html
+        assert f'data-image-url="{photo.image_url}"' in html
+
+    def test_pages_are_appended_from_fragments(self, client, event, make_photo):
+        for _ in range(25):
+            make_photo()
+
+        gallery = client.get(reverse("photobooth:event_gallery", args=[event.id]))
+        next_url = reverse("photobooth:event_gallery_page", args=[event.id]) + "?page=2"
+        assert f'data-next="{next_url}"' in gallery.content.decode()
+
+        page = client.get(next_url)
+        html = page.content.decode()
+        assert html.count("photo-tile") == 5
+        assert "<html" not in html
+        assert "data-next" not in html
@@ -0,0 +1,110 @@
+import threading
+import time
+
+import pytest
+
+from photobooth import hotfolder
+from photobooth.hotfolder import (
+    HotFolder,
+    InotifyWatcher,
+    PollingWatcher,
+    is_candidate,
+    jpeg_complete,
+)
+from photobooth.models import Photo
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.05)
+
+
+def test_candidates():
+    assert is_candidate("IMG_0001.JPG")
+    assert is_candidate("shot.jpeg")
+    assert not is_candidate(".IMG_0001.JPG")
+    assert not is_candidate("IMG_0001.CR3")
+
+
+def test_jpeg_complete(tmp_path, make_jpeg):
+    path = tmp_path / "a.jpg"
+    path.write_bytes(make_jpeg()[:-100])
+    assert not jpeg_complete(path)
+    path.write_bytes(make_jpeg())
+    assert jpeg_complete(path)
+
+
+@pytest.mark.parametrize("watcher_class", [InotifyWatcher, PollingWatcher])
+def test_watchers_report_new_files(tmp_path, watcher_class):
+    watcher = watcher_class(tmp_path)
+    try:
+        watcher.wait(0)
+        (tmp_path / "a.jpg").write_bytes(b"data")
+        (tmp_path / "notes.txt").write_bytes(b"data")
+        names = set()
+        wait_for(lambda: names.update(watcher.wait(0.1)) or names)
+        assert names == {"a.jpg"}
+    finally:
+        watcher.close()
+
+
+@pytest.mark.django_db(transaction=True)
+class TestHotFolder:
+    def test_ingests_files_already_there(self, tmp_path, event, make_jpeg):
+        folder = tmp_path / "camera"
+        folder.mkdir()
+        (folder / "IMG_0001.JPG").write_bytes(make_jpeg())
+        (folder / "IMG_0002.JPG").write_bytes(make_jpeg(color=(0, 90, 200)))
+        (folder / "IMG_0003.JPG").write_bytes(make_jpeg())
+        (folder / "IMG_0004.JPG").write_bytes(make_jpeg()[:-100])
+
+        outcomes = HotFolder(folder, event, workers=1, settle=0.05).run(once=True)
+
+        assert outcomes == {"ingested": 2, "duplicate": 1, "incomplete": 1}
+        photos = Photo.objects.filter(session=event)
+        assert photos.count() == 2
+        assert all(photo.thumbnail and photo.width == 320 for photo in photos)
+        assert sorted(path.name for path in (folder / "done").iterdir()) == [
+            "IMG_0001.JPG",
+            "IMG_0002.JPG",
+            "IMG_0003.JPG",
+        ]
+        assert (folder / "IMG_0004.JPG").exists()
+
+    def test_failed_files_stay_in_place(self, tmp_path, event, make_jpeg, monkeypatch):
+        def fail(*args):
+            raise OSError("disk full")
+
+        monkeypatch.setattr(hotfolder, "store_capture", fail)
+        (tmp_path / "a.jpg").write_bytes(make_jpeg())
+
+        outcomes = HotFolder(tmp_path, event, settle=0.05).run(once=True)
+
+        assert outcomes == {"failed": 1}
+        assert (tmp_path / "a.jpg").exists()
+        assert not Photo.objects.exists()
+
+    @pytest.mark.parametrize("poll", [False, True])
+    def test_daemon_waits_for_files_to_be_written(
+        self, tmp_path, event, make_jpeg, poll
+    ):
+        folder = HotFolder(tmp_path, event, settle=0.2, poll=poll, interval=0.05)
+        thread = threading.Thread(target=folder.run)
+        thread.start()
+        try:
+            data = make_jpeg()
+            with open(tmp_path / "a.jpg", "wb") as f:
+                f.write(data[:1000])
+                f.flush()
+                time.sleep(0.5)
+                assert not Photo.objects.exists()
+                f.write(data[1000:])
+            wait_for(lambda: (tmp_path / "done" / "a.jpg").exists())
+        finally:
+            folder.stop()
+            thread.join()
+
+        assert folder.outcomes == {"ingested": 1}
+        assert Photo.objects.get().file_size == len(data)
@@ -0,0 +1,94 @@
+import time
+import uuid
+
+import pytest
+from django.apps import apps
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.urls import reverse
+
+from photobooth.ids import uuid7, uuid7_timestamp
+from photobooth.models import Photo
+
+
+def test_uuid7_layout():
+    value = uuid7()
+
+    assert value.version == 7
+    assert value.variant == uuid.RFC_4122
+    assert abs(uuid7_timestamp(value) - time.time()) < 5
+
+
+def test_uuid7_is_strictly_increasing():
+    values = [uuid7() for _ in range(20000)]
+
+    assert values == sorted(values)
+    assert len(set(values)) == len(values)
+    assert [v.bytes for v in values] == sorted(v.bytes for v in values)
+
+
+@pytest.mark.django_db
+def test_new_rows_get_uuid7_and_old_keys_still_resolve(client, event, make_photo):
+    new = make_photo()
+    old = make_photo(id=uuid.uuid4())
+
+    assert event.id.version == 7
+    assert new.id.version == 7
+    for photo in (new, old):
+        response = client.get(reverse("photobooth:photo_download", args=[photo.id]))
+        assert response.status_code == 200
+    assert Photo.objects.filter(session=event).count() == 2
+
+
+@pytest.mark.django_db(transaction=True)
+def test_migrations_keep_uuid4_rows_and_default_to_uuid7(settings):
+    # The chain from 0001 cannot run on a fresh database (0004 renames the
+    # table that 0005 creates again), so start from the 0005 schema and fake
+    # everything before it as applied.
+    settings.MIGRATION_MODULES = {}
+    start = ("photobooth", "0005_event_alter_photo_session_delete_photoboothsession")
+    executor = MigrationExecutor(connection)
+    graph = executor.loader.graph
+    (leaf,) = graph.leaf_nodes("photobooth")
+    old_apps = executor.loader.project_state(start).apps
+    with connection.schema_editor() as editor:
+        for model in apps.get_app_config("photobooth").get_models():
+            editor.delete_model(model)
+        for model in old_apps.get_app_config("photobooth").get_models():
+            editor.create_model(model)
+    for node in graph.leaf_nodes():
+        for app_label, name in graph.forwards_plan(node):
+            if app_label != "photobooth" or (app_label, name) in graph.forwards_plan(
+                start
+            ):
+                executor.recorder.record_applied(app_label, name)
+
+    user = old_apps.get_model("accounts", "CustomUser").objects.create(
+        email="host@example.com"
+    )
+    old_event = old_apps.get_model("photobooth", "Event").objects.create(
+        name="Old", created_by_id=user.pk
+    )
+    old_photo = old_apps.get_model("photobooth", "Photo").objects.create(
+        session=old_event, image="photos/old.jpg", guest_email=" Ann@Example.com"
+    )
+    assert old_event.id.version == old_photo.id.version == 4
+
+    executor = MigrationExecutor(connection)
+    executor.migrate([leaf])
+
+    new_apps = executor.loader.project_state(leaf).apps
+    Event = new_apps.get_model("photobooth", "Event")
+    Photo = new_apps.get_model("photobooth", "Photo")
+    event = Event.objects.get(pk=old_event.id)
+    photo = Photo.objects.get(pk=old_photo.id)
+    assert photo.session_id == event.id
+    assert photo.guest_email_normalized == "ann@example.com"
+    new = Photo.objects.create(session=event, image="photos/new.jpg")
+    assert new.id.version == 7
+    assert Event.objects.create(name="New", created_by_id=user.pk).id.version == 7
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(
+            cursor, Photo._meta.db_table
+        )
+    assert {"photo_session_taken_idx", "photo_content_hash_idx"} <= set(constraints)
@@ -0,0 +1,199 @@
+import base64
+import hashlib
+import io
+import os
+import threading
+import time
+from datetime import timedelta
+
+import pytest
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+
+from photobooth import ingest
+from photobooth.ingest import (
+    ABORT,
+    CAPTURE,
+    DONE,
+    Journal,
+    encode_record,
+    get_journal,
+    read_records,
+    recover_captures,
+)
+from photobooth.models import Photo, photo_upload_path
+
+
+def test_read_records_stops_at_a_torn_record():
+    data = encode_record(CAPTURE, {"id": "a"}, b"jpeg") + encode_record(
+        ABORT, {"id": "a"}
+    )
+
+    assert [kind for kind, _, _ in read_records(io.BytesIO(data))] == [CAPTURE, ABORT]
+    assert len(list(read_records(io.BytesIO(data[:-3])))) == 1
+    corrupt = data[:30] + b"X" + data[31:]
+    assert list(read_records(io.BytesIO(corrupt))) == []
+
+
+def test_concurrent_captures_share_fsyncs(tmp_path, monkeypatch):
+    journal = Journal(str(tmp_path))
+    fsync = os.fsync
+    calls = []
+
+    def slow_fsync(fd):
+        calls.append(fd)
+        time.sleep(0.02)
+        fsync(fd)
+
+    monkeypatch.setattr(ingest.os, "fsync", slow_fsync)
+    threads = [
+        threading.Thread(target=journal.write, args=({"id": str(n)}, b"x" * 1000))
+        for n in range(16)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    journal.close()
+
+    assert len(calls) < 16
+    with open(next(tmp_path.glob("*.journal")), "rb") as f:
+        assert len(list(read_records(f))) == 16
+
+
+def crash_journal():
+    """Drop this process's journal as a dying worker would, segment and all"""
+    ingest.get_journal()._current.close()
+    ingest._journal = None
+
+
+def capture_header(photo, name, taken_at=None):
+    return {
+        "id": str(photo.id),
+        "event": str(photo.session_id),
+        "name": name,
+        "guest_name": photo.guest_name,
+        "guest_email": photo.guest_email,
+        "taken_at": (taken_at or timezone.now()).isoformat(),
+    }
+
+
+@pytest.mark.django_db
+class TestIngest:
+    def capture(self, client, event, content):
+        image = "data:image/jpeg;base64," + base64.b64encode(content).decode()
+        return client.post(
+            reverse("photobooth:capture_photo"),
+            {"image": image, "event_id": str(event.id)},
+            content_type="application/json",
+        )
+
+    def test_capture_is_journaled_and_stored(
+        self, client, event, make_jpeg, ingest_root
+    ):
+        content = make_jpeg()
+
+        response = self.capture(client, event, content)
+
+        photo = Photo.objects.get(id=response.json()["photo_id"])
+        with photo.image.open("rb") as f:
+            assert f.read() == content
+        assert photo.file_size == len(content)
+        assert photo.content_hash == hashlib.sha256(content).hexdigest()
+        with open(next(ingest_root.glob("*.journal")), "rb") as f:
+            [(kind, header, data), (done, footer, _)] = read_records(f)
+        assert (kind, header["id"], data) == (CAPTURE, str(photo.id), content)
+        assert (done, footer["id"]) == (DONE, str(photo.id))
+
+    def test_deleted_photos_are_not_replayed(
+        self, client, event, make_jpeg, ingest_root
+    ):
+        response = self.capture(client, event, make_jpeg())
+        Photo.objects.filter(id=response.json()["photo_id"]).delete()
+        crash_journal()
+
+        assert recover_captures() == {"complete": 1}
+        assert not Photo.objects.exists()
+
+    def test_done_captures_whose_file_was_lost_are_repaired(
+        self, client, event, make_jpeg, ingest_root
+    ):
+        content = make_jpeg()
+        response = self.capture(client, event, content)
+        photo = Photo.objects.get(id=response.json()["photo_id"])
+        # Power loss: the done mark reached the disk, the image's data did not
+        with open(photo.image.path, "wb") as f:
+            f.write(bytes(len(content)))
+        crash_journal()
+
+        assert recover_captures() == {"repaired": 1}
+        with photo.image.open("rb") as f:
+            assert f.read() == content
+
+    def test_clean_shutdown_removes_the_segment(
+        self, client, event, make_jpeg, ingest_root
+    ):
+        self.capture(client, event, make_jpeg())
+
+        ingest.close_journal()
+
+        assert not list(ingest_root.glob("*.journal"))
+
+    def test_storage_error_is_a_503_without_a_row(
+        self, client, event, make_jpeg, monkeypatch
+    ):
+        def disk_full(*args, **kwargs):
+            raise OSError("No space left on device")
+
+        monkeypatch.setattr(FileSystemStorage, "_save", disk_full)
+
+        response = self.capture(client, event, make_jpeg())
+
+        assert response.status_code == 503
+        assert response["Retry-After"] == "1"
+        assert not Photo.objects.exists()
+        monkeypatch.undo()
+        crash_journal()
+        assert recover_captures() == {"failed": 1}
+        assert not Photo.objects.exists()
+
+    def test_recovery_replays_interrupted_captures(self, event, make_jpeg, ingest_root):
+        content = make_jpeg()
+        photo = Photo(session=event, guest_name="Ann")
+        name = photo_upload_path(photo, "capture.jpg")
+        taken_at = timezone.now() - timedelta(hours=1)
+        # The process died after journaling, before storing anything
+        get_journal().write(capture_header(photo, name, taken_at), content)
+        ingest.close_journal()
+
+        out = io.StringIO()
+        call_command("recover_captures", stdout=out)
+
+        assert "Replayed 1 and repaired 0 captures" in out.getvalue()
+        photo = Photo.objects.get(id=photo.id)
+        assert photo.image.name == name
+        assert photo.guest_name == "Ann"
+        assert photo.taken_at == taken_at
+        assert photo.thumbnail
+        with photo.image.open("rb") as f:
+            assert f.read() == content
+        assert not list(ingest_root.glob("*.journal"))
+
+    def test_recovery_repairs_short_files_and_skips_live_segments(
+        self, event, make_photo, make_jpeg
+    ):
+        content = make_jpeg()
+        photo = make_photo(content=content)
+        journal = get_journal()
+        journal.write(capture_header(photo, photo.image.name), content)
+        default_storage.delete(photo.image.name)
+        default_storage.save(photo.image.name, io.BytesIO(content[:100]))
+
+        assert recover_captures() == {"live segments": 1}
+
+        ingest.close_journal()
+        assert recover_captures() == {"repaired": 1}
+        with photo.image.open("rb") as f:
+            assert f.read() == content
@@ -0,0 +1,101 @@
+import hashlib
+import os
+from io import StringIO
+
+import pytest
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+
+from photobooth.integrity import (
+    HASH_MISMATCH,
+    MISSING,
+    ORPHAN,
+    SIZE_MISMATCH,
+    UNRECORDED,
+    scan,
+    walk_files,
+)
+from photobooth.models import Photo
+
+
+def write(root, name, data=b"data", age=0):
+    path = root / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    if age:
+        stat = path.stat()
+        os.utime(path, (stat.st_atime - age, stat.st_mtime - age))
+    return path
+
+
+def test_walk_is_in_full_name_order(media_root):
+    for name in ["photos/abc/x", "photos/abc-d/y", "photos/ab", "photos/abc/d/z"]:
+        write(media_root, name)
+
+    names = [entry.name for entry in walk_files(media_root, workers=2)]
+
+    assert names == sorted(names)
+    assert len(names) == 4
+
+
+@pytest.mark.django_db
+class TestScan:
+    def issues(self, media_root, **kwargs):
+        return {
+            (issue.kind, issue.name) for issue in scan(media_root, workers=2, **kwargs)
+        }
+
+    def recorded(self, make_photo, data):
+        photo = make_photo(content=data)
+        photo.file_size = len(data)
+        photo.content_hash = hashlib.sha256(data).hexdigest()
+        photo.save(update_fields=["file_size", "content_hash"])
+        return photo
+
+    def test_finds_every_kind_of_issue(self, media_root, event, make_photo):
+        intact = self.recorded(make_photo, b"intact")
+        resized = self.recorded(make_photo, b"resized")
+        changed = self.recorded(make_photo, b"changed")
+        unrecorded = make_photo(content=b"older")
+        gone = self.recorded(make_photo, b"gone")
+        archived = self.recorded(make_photo, b"archived")
+        intact.thumbnail.save("thumb.jpg", ContentFile(b"thumb"))
+        write(media_root, resized.image.name, b"resized!")
+        write(media_root, changed.image.name, b"CHANGED")
+        default_storage.delete(gone.image.name)
+        default_storage.delete(archived.image.name)
+        Photo.objects.filter(pk=archived.pk).update(tier=Photo.TIER_COLD)
+        default_storage.delete(intact.thumbnail.name)
+        orphan = write(media_root, f"photos/{event.id}/orphan.jpg", age=7200)
+        write(media_root, f"photos/{event.id}/in-flight.jpg")
+
+        issues = self.issues(media_root, modified_before=orphan.stat().st_mtime + 1)
+
+        assert issues == {
+            (ORPHAN, f"photos/{event.id}/orphan.jpg"),
+            (MISSING, intact.thumbnail.name),
+            (MISSING, gone.image.name),
+            (SIZE_MISMATCH, resized.image.name),
+            (UNRECORDED, unrecorded.image.name),
+        }
+        assert (HASH_MISMATCH, changed.image.name) in self.issues(
+            media_root, hashes=True
+        )
+
+    def test_fix(self, media_root, event, make_photo):
+        photo = make_photo(content=b"older")
+        photo.thumbnail.save("thumb.jpg", ContentFile(b"thumb"))
+        default_storage.delete(photo.thumbnail.name)
+        orphan = write(media_root, f"photos/{event.id}/orphan.jpg", age=7200)
+
+        out = StringIO()
+        call_command("scan_media", "--fix", "--hashes", stdout=out)
+
+        assert "1 missing, 1 orphan, 1 unrecorded" in out.getvalue()
+        assert not orphan.exists()
+        photo.refresh_from_db()
+        assert not photo.thumbnail
+        assert photo.file_size == 5
+        assert photo.content_hash == hashlib.sha256(b"older").hexdigest()
+        assert self.issues(media_root) == set()
@@ -0,0 +1,111 @@
+import json
+import os
+
+import pytest
+from django.urls import reverse
+
+from photobooth import metrics
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    fresh = metrics.Registry()
+    monkeypatch.setattr(metrics, "registry", fresh)
+    return fresh
+
+
+@pytest.mark.django_db
+class TestMetrics:
+    def test_middleware_labels_requests_by_view(self, client, event, registry):
+        client.get(reverse("photobooth:event_info", args=[event.id]))
+
+        merged = metrics.collect()
+        labels = (("method", "GET"), ("status", 200), ("view", "photobooth:event_info"))
+        duration = merged[("photobooth_http_request_duration_seconds", labels)]
+        queries = merged[
+            ("photobooth_http_db_queries", (("view", "photobooth:event_info"),))
+        ]
+        assert duration[-1] == 1
+        assert queries[-2] >= 1
+        assert merged[("photobooth_http_requests_in_flight", ())] == [0]
+
+    def test_render_histogram(self, registry):
+        metrics.observe(
+            "photobooth_operation_duration_seconds", 0.02, operation="qr_render"
+        )
+
+        text = metrics.render(metrics.collect())
+
+        assert "# TYPE photobooth_operation_duration_seconds histogram" in text
+        assert (
+            'photobooth_operation_duration_seconds_bucket{operation="qr_render",le="0.01"} 0'
+            in text
+        )
+        assert (
+            'photobooth_operation_duration_seconds_bucket{operation="qr_render",le="0.025"} 1'
+            in text
+        )
+        assert (
+            'photobooth_operation_duration_seconds_count{operation="qr_render"} 1'
+            in text
+        )
+
+    def test_collect_merges_worker_snapshots(self, tmp_path, settings, registry):
+        settings.PHOTOBOOTH_METRICS_DIR = str(tmp_path)
+        metrics.observe("photobooth_operation_duration_seconds", 0.02, operation="x")
+        registry.add("photobooth_http_requests_in_flight", 1)
+
+        # A worker that has since exited, with a pid that can't be live
+        dead = [
+            [
+                "photobooth_operation_duration_seconds",
+                [["operation", "x"]],
+                [0] * 11 + [0.5, 1],
+            ],
+            ["photobooth_http_requests_in_flight", [], [3]],
+        ]
+        (tmp_path / "999999999-1.json").write_text(json.dumps(dead))
+
+        for _ in range(2):
+            merged = metrics.collect()
+
+            histogram = merged[
+                ("photobooth_operation_duration_seconds", (("operation", "x"),))
+            ]
+            assert histogram[-1] == 2
+            assert histogram[-2] == pytest.approx(0.52)
+            assert merged[("photobooth_http_requests_in_flight", ())] == [1]
+        # Folded into the retired totals, once
+        assert not (tmp_path / "999999999-1.json").exists()
+        assert (tmp_path / metrics.RETIRED).exists()
+
+    def test_reused_pid_does_not_replace_exited_worker(
+        self, tmp_path, settings, registry
+    ):
+        settings.PHOTOBOOTH_METRICS_DIR = str(tmp_path)
+        pid = os.getpid()
+        # An earlier process that had this pid, started at another time
+        earlier = [
+            ["photobooth_storage_cache_requests_total", [["result", "hit"]], [5]]
+        ]
+        (tmp_path / f"{pid}-1.json").write_text(json.dumps(earlier))
+        metrics.increment("photobooth_storage_cache_requests_total", result="hit")
+        metrics.flush(force=True)
+
+        merged = metrics.collect()
+
+        assert merged[
+            ("photobooth_storage_cache_requests_total", (("result", "hit"),))
+        ] == [6]
+        assert sorted(path.name for path in tmp_path.glob("*.json")) == [
+            f"{metrics.snapshot_key()}.json",
+            metrics.RETIRED,
+        ]
+
+    def test_metrics_endpoint_token(self, client, settings, registry):
+        settings.PHOTOBOOTH_METRICS_TOKEN = "secret"
+
+        assert client.get("/metrics").status_code == 401
+        response = client.get("/metrics", headers={"Authorization": "Bearer secret"})
+        assert response.status_code == 200
+        assert response["Content-Type"].startswith("text/plain; version=0.0.4")
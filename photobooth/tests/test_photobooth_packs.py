@@ -0,0 +1,87 @@
+import io
+from datetime import timedelta
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+
+from photobooth.models import Event, Photo
+from photobooth.packs import PackSlice, pack_event, pack_path
+from photobooth.tiering import archive_photo
+
+
+def test_pack_slice_reads_only_its_range(tmp_path):
+    path = tmp_path / "test.pack"
+    path.write_bytes(b"aaaaBBBBBBcc")
+
+    with PackSlice(path, 4, 6) as f:
+        assert f.size == 6
+        assert f.read(4) == b"BBBB"
+        assert f.read() == b"BB"
+        assert f.read() == b""
+        assert f.seek(0, io.SEEK_END) == 6
+        f.seek(-3, io.SEEK_CUR)
+        assert f.read() == b"BBB"
+
+    with pytest.raises(OSError, match="truncated"):
+        PackSlice(path, 8, 6)
+
+
+@pytest.mark.django_db
+class TestPacks:
+    def test_pack_serves_hot_and_cold_originals(
+        self, client, event, make_photo, make_jpeg, media_root, cold_root
+    ):
+        contents = [make_jpeg(size=(200 + i * 40, 150)) for i in range(3)]
+        photos = [make_photo(content=content) for content in contents]
+        photos[0].thumbnail.save("thumb.jpg", photos[0].image.file, save=True)
+        archive_photo(photos[1])
+
+        assert pack_event(event.id) == 3
+
+        assert not list(media_root.glob("photos/*/*"))
+        assert not list(cold_root.glob("photos/*/*"))
+        for photo, content in zip(photos, contents, strict=True):
+            photo.refresh_from_db()
+            assert photo.tier == Photo.TIER_PACKED
+            assert not photo.thumbnail
+            response = client.get(reverse("photobooth:photo_download", args=[photo.id]))
+            assert response["Content-Length"] == str(len(content))
+            assert b"".join(response.streaming_content) == content
+        assert photos[2].image_url == reverse(
+            "photobooth:photo_image", args=[photos[2].id]
+        )
+
+    def test_packs_are_append_only(self, event, make_photo, make_jpeg):
+        first = make_photo(content=make_jpeg(size=(100, 100)))
+        pack_event(event.id)
+        first.refresh_from_db()
+        size = first.pack_length
+
+        second = make_photo(content=make_jpeg(size=(120, 100)))
+        assert pack_event(event.id) == 1
+        assert pack_event(event.id) == 0
+
+        second.refresh_from_db()
+        assert Photo.objects.get(id=first.id).pack_offset == 0
+        assert second.pack_offset == size
+        with open(pack_path(event.id), "rb") as f:
+            assert len(f.read()) == size + second.pack_length
+
+    def test_pack_events_command(self, event, make_photo, user):
+        make_photo()
+        Event.objects.filter(id=event.id).update(
+            is_active=False, updated_at=timezone.now() - timedelta(days=31)
+        )
+        live = Event.objects.create(name="Live", created_by=user)
+        make_photo(session=live)
+        stdout = StringIO()
+
+        call_command("pack_events", "--dry-run", stdout=stdout)
+        assert f"{event.id}\nWould pack 1 events" in stdout.getvalue()
+
+        call_command("pack_events", stdout=stdout)
+        assert "Packed 1 photos from 1 events" in stdout.getvalue()
+        assert Photo.objects.get(session=live).tier == Photo.TIER_HOT
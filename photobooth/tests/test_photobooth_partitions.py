@@ -0,0 +1,68 @@
+from datetime import UTC, date, datetime, timedelta, timezone
+
+import pytest
+from django.core.management import CommandError, call_command
+
+from photobooth.management.commands.bench_partitions import summarize_plan
+from photobooth.partitions import (
+    add_months,
+    month_of,
+    month_start,
+    parse_month,
+    partition_name,
+)
+
+
+def test_month_helpers():
+    assert parse_month("2026-02") == date(2026, 2, 1)
+    with pytest.raises(ValueError, match="YYYY-MM"):
+        parse_month("2026-13")
+    assert add_months(date(2026, 11, 1), 2) == date(2027, 1, 1)
+    assert add_months(date(2026, 1, 1), -1) == date(2025, 12, 1)
+    assert month_start(date(2026, 3, 1)) == datetime(2026, 3, 1, tzinfo=UTC)
+
+    # Partitions are bounded in UTC, whatever the local time zone says
+    late = datetime(2026, 4, 1, 1, 0, tzinfo=timezone(timedelta(hours=2)))
+    assert month_of(late) == date(2026, 3, 1)
+
+
+def test_partition_names():
+    assert partition_name(date(2026, 3, 1)) == "photobooth_photo_p2026_03"
+    assert partition_name(None) == "photobooth_photo_default"
+
+
+def test_summarize_plan():
+    plan = {
+        "Plan": {
+            "Node Type": "Append",
+            "Total Cost": 42.5,
+            "Shared Hit Blocks": 7,
+            "Shared Read Blocks": 3,
+            "Plans": [
+                {
+                    "Node Type": "Index Scan",
+                    "Relation Name": "photobooth_photo_p2026_03",
+                },
+                {"Node Type": "Seq Scan", "Relation Name": "photobooth_photo_default"},
+            ],
+        },
+        "Planning Time": 0.123,
+        "Execution Time": 1.456,
+    }
+
+    assert summarize_plan(plan) == {
+        "planning_ms": 0.12,
+        "execution_ms": 1.46,
+        "total_cost": 42.5,
+        "buffers": 10,
+        "relations_scanned": 2,
+        "nodes": ["Append", "Index Scan", "Seq Scan"],
+    }
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("command", ["photo_partitions", "bench_partitions"])
+def test_partitioning_needs_postgres(command):
+    args = ["list"] if command == "photo_partitions" else []
+    with pytest.raises(CommandError, match="PostgreSQL"):
+        call_command(command, *args)
@@ -0,0 +1,40 @@
+import base64
+from io import BytesIO
+
+import pytest
+from django.urls import reverse
+from PIL import Image
+
+from photobooth.processing import process_photo
+
+
+@pytest.mark.django_db
+class TestPlaceholders:
+    def test_processing_stores_a_tiny_placeholder(self, make_photo, make_jpeg):
+        photo = make_photo(make_jpeg(size=(1600, 1200)))
+
+        assert process_photo(photo)
+
+        photo.refresh_from_db()
+        data = base64.b64decode(photo.placeholder)
+        assert len(data) < 1024
+        with Image.open(BytesIO(data)) as image:
+            assert image.format == "JPEG"
+            assert image.size == (24, 18)
+        assert photo.placeholder_url.startswith("data:image/jpeg;base64,")
+
+    def test_gallery_and_api_inline_the_placeholder(self, client, event, make_photo):
+        photo = make_photo(guest_name="Ann Smith")
+        process_photo(photo)
+        photo.refresh_from_db()
+
+        gallery = client.get(reverse("photobooth:event_gallery", args=[event.id]))
+        assert f"url({photo.placeholder_url})" in gallery.content.decode()
+
+        search = client.get(
+            reverse("photobooth:guest_search", args=[event.id]), {"q": "ann"}
+        )
+        assert search.json()["photos"][0]["placeholder"] == photo.placeholder_url
+
+    def test_unprocessed_photos_have_no_placeholder(self, make_photo):
+        assert make_photo().placeholder_url == ""
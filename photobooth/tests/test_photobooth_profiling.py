@@ -0,0 +1,98 @@
+import marshal
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.exceptions import MiddlewareNotUsed
+from django.test import AsyncClient
+from django.urls import reverse
+
+from photobooth.models import RequestProfile
+from photobooth.profiling import HEADER, ProfilingMiddleware, make_token
+
+
+@pytest.fixture
+def profiling(settings):
+    settings.PHOTOBOOTH_PROFILING_ENABLED = True
+    settings.PHOTOBOOTH_PROFILING_SAMPLE_RATE = 0
+    return settings
+
+
+def profiled_functions(profile):
+    return {name for _, _, name in marshal.loads(bytes(profile.profile_data))}
+
+
+@pytest.mark.django_db
+class TestProfiling:
+    def test_middleware_unloads_when_disabled(self, settings):
+        settings.PHOTOBOOTH_PROFILING_ENABLED = False
+
+        with pytest.raises(MiddlewareNotUsed):
+            ProfilingMiddleware(lambda request: None)
+
+    def test_signed_header_profiles_request(self, client, event, profiling):
+        url = reverse("photobooth:event_info", args=[event.id])
+
+        client.get(url)
+        client.get(url, headers={HEADER: "forged"})
+        assert not RequestProfile.objects.exists()
+
+        client.get(url, headers={HEADER: make_token()})
+
+        profile = RequestProfile.objects.get()
+        assert profile.view_name == "photobooth:event_info"
+        assert profile.trigger == "header"
+        assert profile.status_code == 200
+        assert profile.query_count == len(profile.queries) >= 1
+        assert "photobooth_event" in profile.queries[0]["sql"]
+        # The async view runs on another thread than the middleware
+        assert "get_event_info" in profiled_functions(profile)
+
+    @pytest.mark.django_db(transaction=True)
+    def test_views_are_profiled_under_asgi(self, event, user, profiling):
+        client = AsyncClient()
+        headers = {HEADER: make_token()}
+        info_url = reverse("photobooth:event_info", args=[event.id])
+        search_url = reverse("photobooth:guest_search", args=[event.id])
+
+        @async_to_sync
+        async def fetch():
+            response = await client.get(info_url, headers=headers)
+            assert response.status_code == 200
+            # A sync view, run on a thread of its own under ASGI
+            response = await client.get(search_url, {"q": "ann"}, headers=headers)
+            assert response.status_code == 200
+
+        fetch()
+
+        info, search = RequestProfile.objects.order_by("created_at")
+        assert "get_event_info" in profiled_functions(info)
+        assert "search_guest_photos_view" in profiled_functions(search)
+
+    def test_staff_opt_in_and_admin(self, client, event, profiling):
+        admin = get_user_model().objects.create_superuser(
+            email="admin@example.com", password="pass"
+        )
+        client.force_login(admin)
+        client.get(reverse("photobooth:event_info", args=[event.id]), {"profile": "1"})
+
+        profile = RequestProfile.objects.get()
+        assert profile.trigger == "staff"
+        assert profile.user == admin
+
+        change_url = reverse(
+            "admin:photobooth_requestprofile_change", args=[profile.pk]
+        )
+        assert client.get(change_url).status_code == 200
+        download_url = reverse(
+            "admin:photobooth_requestprofile_download", args=[profile.pk]
+        )
+        assert client.get(download_url).content == bytes(profile.profile_data)
+
+    def test_keeps_most_recent(self, client, event, profiling):
+        profiling.PHOTOBOOTH_PROFILING_KEEP = 2
+        url = reverse("photobooth:event_info", args=[event.id])
+        for _ in range(4):
+            client.get(url, headers={HEADER: make_token()})
+
+        assert RequestProfile.objects.count() == 2
@@ -0,0 +1,99 @@
+import pytest
+from asgiref.sync import async_to_sync, sync_to_async
+from django.db import router as db_router
+from django.urls import reverse
+
+from accounts.models import CustomUser
+from photobooth.models import Event, Photo
+from photobooth.routers import (
+    REPLICA,
+    ReplicaRouter,
+    read_from_primary,
+    replica_reads,
+    use_replica,
+)
+
+
+@pytest.fixture
+def router():
+    router = ReplicaRouter()
+    router.replica = REPLICA
+    return router
+
+
+def test_reads_outside_replica_views_use_default(router):
+    assert router.db_for_read(Photo) is None
+    assert router.db_for_write(Photo) == "default"
+
+
+def test_replica_reads_until_first_write(router):
+    with replica_reads():
+        assert router.db_for_read(Photo) == REPLICA
+        assert router.db_for_read(Event) == REPLICA
+        # Sessions and users never lag behind a login
+        assert router.db_for_read(CustomUser) is None
+
+        assert router.db_for_write(Photo) == "default"
+        assert router.db_for_read(Photo) is None
+
+    with replica_reads():
+        assert router.db_for_read(Photo) == REPLICA
+
+
+def test_read_from_primary_pins_the_rest_of_the_context(router):
+    read_from_primary()  # Outside replica_reads() there is nothing to pin
+
+    with replica_reads():
+        read_from_primary()
+        assert router.db_for_read(Photo) is None
+
+
+def test_async_view_routing_reaches_orm_threads(router):
+    @use_replica
+    async def view(request):
+        return await sync_to_async(router.db_for_read)(Photo)
+
+    assert async_to_sync(view)(None) == REPLICA
+
+
+def test_replica_is_never_migrated(router):
+    assert router.allow_migrate("default", "photobooth")
+    assert not router.allow_migrate(REPLICA, "photobooth")
+
+
+@pytest.fixture
+def routed(monkeypatch):
+    """Stand "default" in for the replica and record where reads are sent"""
+    router = next(r for r in db_router.routers if isinstance(r, ReplicaRouter))
+    monkeypatch.setattr(router, "replica", "default")
+    routed = []
+    db_for_read = router.db_for_read
+
+    def record(model, **hints):
+        routed.append((model, db_for_read(model, **hints)))
+        return routed[-1][1]
+
+    monkeypatch.setattr(router, "db_for_read", record)
+    return routed
+
+
+@pytest.mark.django_db(transaction=True)
+def test_gallery_reads_from_replica(client, event, make_photo, routed):
+    make_photo()
+
+    response = client.get(reverse("photobooth:event_gallery", args=[event.id]))
+
+    assert response.status_code == 200
+    assert (Photo, "default") in routed
+    assert (Event, "default") in routed
+
+
+@pytest.mark.django_db(transaction=True)
+def test_download_missing_on_replica_retries_on_primary(client, routed):
+    photo_id = "0190a7e0-0000-7000-8000-000000000000"
+
+    response = client.get(reverse("photobooth:photo_download", args=[photo_id]))
+
+    assert response.status_code == 404
+    # Not on the replica ("default" here), then not on the primary (None)
+    assert routed == [(Photo, "default"), (Photo, None)]
@@ -0,0 +1,53 @@
+import pytest
+from django.urls import reverse
+
+from photobooth.models import Event, Photo
+from photobooth.search import search_guest_photos
+
+
+@pytest.mark.django_db
+class TestGuestSearch:
+    def test_email_is_normalised_on_save(self, make_photo):
+        photo = make_photo(guest_email="  Ann@Example.COM ")
+
+        assert photo.guest_email_normalized == "ann@example.com"
+
+        photo.guest_email = "bob@example.com"
+        photo.save(update_fields=["guest_email"])
+        photo.refresh_from_db()
+        assert photo.guest_email_normalized == "bob@example.com"
+
+    def test_search_by_email_and_name(self, make_photo):
+        ann = make_photo(guest_name="Ann Smith", guest_email="ann@example.com")
+        bob = make_photo(guest_name="Bob Jones", guest_email="bob@example.com")
+        photos = Photo.objects.all()
+
+        assert list(search_guest_photos(photos, "ANN@example.com ")) == [ann]
+        assert list(search_guest_photos(photos, "jones")) == [bob]
+        assert list(search_guest_photos(photos, "example.com")) == []
+        assert list(search_guest_photos(photos, "a")) == []
+        # Two letters only match the start of a name
+        assert list(search_guest_photos(photos, "bo")) == [bob]
+        assert list(search_guest_photos(photos, "jo")) == []
+
+    def test_search_endpoint_is_scoped_to_event(self, client, event, user, make_photo):
+        other = Event.objects.create(name="Other", created_by=user)
+        mine = make_photo(guest_email="ann@example.com")
+        make_photo(guest_email="ann@example.com", session=other)
+
+        url = reverse("photobooth:guest_search", kwargs={"event_id": event.id})
+        response = client.get(url, {"q": "ann@example.com"})
+
+        assert [item["id"] for item in response.json()["photos"]] == [str(mine.id)]
+        assert client.get(url).status_code == 400
+
+    def test_gallery_search(self, client, event, make_photo):
+        make_photo(guest_name="Ann Smith")
+        make_photo(guest_name="Bob Jones")
+        url = reverse("photobooth:event_gallery", kwargs={"event_id": event.id})
+
+        response = client.get(url, {"q": "smith"})
+
+        assert [photo.guest_name for photo in response.context["photos"]] == [
+            "Ann Smith"
+        ]
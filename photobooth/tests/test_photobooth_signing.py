@@ -0,0 +1,114 @@
+import base64
+import hashlib
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+from django.urls import reverse
+
+from photobooth.models import Photo
+from photobooth.signing import expiry, signed_url, verify
+
+SECRET = "nginx-shared-secret"
+NOW = 1_760_000_000
+
+
+@pytest.fixture
+def signed(settings):
+    settings.PHOTOBOOTH_MEDIA_URL_SECRET = SECRET
+    settings.PHOTOBOOTH_SIGNED_URL_TTL = 3600
+    settings.PHOTOBOOTH_SIGNED_URL_BUCKET = 600
+
+
+def split(url):
+    parts = urlsplit(url)
+    return parts.path, {key: values[0] for key, values in parse_qs(parts.query).items()}
+
+
+class TestSignedUrl:
+    def test_matches_nginx_secure_link_md5(self, signed):
+        path, params = split(signed_url("photos/a/1.jpg", "abc", now=NOW))
+
+        # secure_link_md5 "$secure_link_expires$uri$arg_v <secret>"
+        digest = hashlib.md5(
+            f"{params['e']}{path}{params['v']} {SECRET}".encode()
+        ).digest()
+        assert path == "/signed-media/photos/a/1.jpg"
+        assert params["s"] == base64.urlsafe_b64encode(digest).decode().rstrip("=")
+
+    def test_is_stable_within_a_bucket(self, signed):
+        assert signed_url("photos/a/1.jpg", now=NOW) == signed_url(
+            "photos/a/1.jpg", now=NOW + 300
+        )
+        assert expiry(NOW) >= NOW + 3600
+        assert expiry(NOW) % 600 == 0
+
+    def test_changes_with_content(self, signed):
+        assert signed_url("photos/a/1.jpg", "abc", now=NOW) != signed_url(
+            "photos/a/1.jpg", "abd", now=NOW
+        )
+
+    def test_verify(self, signed):
+        path, params = split(signed_url("photos/a/1.jpg", "abc", now=NOW))
+
+        assert verify(path, params["e"], "abc", params["s"], now=NOW)
+        assert verify(path, params["e"], "abd", params["s"], now=NOW) is False
+        assert verify(path, "not a number", "abc", params["s"], now=NOW) is False
+        assert verify(path, params["e"], "abc", params["s"], now=NOW + 7200) is None
+
+
+@pytest.mark.django_db
+class TestPhotoUrls:
+    def test_plain_without_a_secret(self, make_photo):
+        photo = make_photo()
+
+        assert photo.image_url == photo.image.url
+        assert photo.direct_download_url == photo.download_url
+
+    def test_signed_with_a_secret(self, signed, make_photo):
+        photo = make_photo(content_hash="f" * 64)
+
+        path, params = split(photo.image_url)
+        assert path == f"/signed-media/{photo.image.name}"
+        assert params["v"] == "f" * 16
+        assert "download" in split(photo.direct_download_url)[1]
+
+    def test_archived_photos_go_through_django(self, signed, make_photo):
+        photo = make_photo(tier=Photo.TIER_COLD)
+
+        assert photo.image_url == reverse(
+            "photobooth:photo_image", kwargs={"photo_id": photo.id}
+        )
+        assert photo.direct_download_url == photo.download_url
+
+
+@pytest.mark.django_db
+class TestServeSignedMedia:
+    def test_serves_without_queries(self, client, signed, make_photo):
+        photo = make_photo(content=b"original")
+
+        response = client.get(photo.image_url)
+
+        assert response.status_code == 200
+        assert b"".join(response.streaming_content) == b"original"
+        assert response["Content-Type"] == "image/jpeg"
+        assert "immutable" in response["Cache-Control"]
+        assert "attachment" not in response["Content-Disposition"]
+
+    def test_download(self, client, signed, make_photo):
+        photo = make_photo()
+
+        response = client.get(photo.direct_download_url)
+
+        assert response.status_code == 200
+        assert "attachment" in response["Content-Disposition"]
+
+    def test_rejects_tampered_and_expired_links(self, client, signed, make_photo):
+        photo = make_photo()
+        path, params = split(photo.image_url)
+
+        other = client.get(path.replace(".jpg", ".png"), params)
+        assert other.status_code == 403
+        expired = client.get(
+            path, {**params, **split(signed_url(photo.image.name, now=NOW))[1]}
+        )
+        assert expired.status_code == 410
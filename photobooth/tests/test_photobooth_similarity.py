@@ -0,0 +1,98 @@
+import pytest
+from django.urls import reverse
+
+from photobooth.processing import process_photo
+from photobooth.similarity import (
+    band_neighbours,
+    collapse_near_duplicates,
+    hamming,
+    similar_photos,
+    split_hash,
+    to_signed,
+    to_unsigned,
+)
+
+LEFT_BAR = [((0, 0, 100, 240), (20, 20, 20))]
+RIGHT_BAR = [((220, 0, 320, 240), (20, 20, 20))]
+
+
+class TestHashHelpers:
+    def test_signed_round_trip(self):
+        for value in (0, 1, 2**63 - 1, 2**63, 2**64 - 1):
+            assert to_unsigned(to_signed(value)) == value
+            assert -(2**63) <= to_signed(value) < 2**63
+
+    def test_split_hash(self):
+        assert split_hash(0x0001_0002_0003_0004) == [4, 3, 2, 1]
+
+    def test_hamming_handles_signed_values(self):
+        assert hamming(to_signed(2**64 - 1), 0) == 64
+
+    def test_band_neighbours(self):
+        assert band_neighbours(0, 0) == [0]
+        assert len(band_neighbours(0, 1)) == 17
+        assert len(set(band_neighbours(0, 2))) == 137
+
+
+@pytest.mark.django_db
+class TestSimilarPhotos:
+    def test_finds_near_duplicates_only(self, make_photo, make_jpeg):
+        original = make_photo(make_jpeg(shapes=LEFT_BAR))
+        retake = make_photo(make_jpeg(shapes=LEFT_BAR, color=(205, 85, 45)))
+        different = make_photo(make_jpeg(shapes=RIGHT_BAR))
+        for photo in (original, retake, different):
+            assert process_photo(photo)
+
+        matches = similar_photos(original)
+
+        assert [photo for _, photo in matches] == [retake]
+
+    def test_other_events_are_ignored(self, make_photo, make_jpeg, user):
+        from photobooth.models import Event
+
+        other_event = Event.objects.create(name="Other", created_by=user)
+        original = make_photo(make_jpeg(shapes=LEFT_BAR))
+        copy = make_photo(make_jpeg(shapes=LEFT_BAR), session=other_event)
+        process_photo(original)
+        process_photo(copy)
+
+        assert similar_photos(original) == []
+
+    def test_collapse_keeps_newest_first(self, make_photo, make_jpeg):
+        first = make_photo(make_jpeg(shapes=LEFT_BAR))
+        second = make_photo(make_jpeg(shapes=LEFT_BAR))
+        third = make_photo(make_jpeg(shapes=RIGHT_BAR))
+        for photo in (first, second, third):
+            process_photo(photo)
+            photo.refresh_from_db()
+
+        shown = collapse_near_duplicates([second, first, third])
+
+        assert shown == [second, third]
+        assert second.near_duplicates == [first]
+
+    def test_similar_endpoint(self, client, make_photo, make_jpeg):
+        original = make_photo(make_jpeg(shapes=LEFT_BAR))
+        retake = make_photo(make_jpeg(shapes=LEFT_BAR))
+        process_photo(original)
+        process_photo(retake)
+
+        url = reverse("photobooth:similar_photos", kwargs={"photo_id": original.id})
+        response = client.get(url)
+
+        assert response.status_code == 200
+        assert [item["id"] for item in response.json()["similar"]] == [str(retake.id)]
+        assert client.get(url, {"radius": 99}).status_code == 400
+
+    def test_gallery_collapses_near_duplicates(self, client, make_photo, make_jpeg):
+        for _ in range(3):
+            process_photo(make_photo(make_jpeg(shapes=LEFT_BAR)))
+        event_id = make_photo(make_jpeg(shapes=RIGHT_BAR)).session_id
+        url = reverse("photobooth:event_gallery", kwargs={"event_id": event_id})
+
+        collapsed = client.get(url)
+        expanded = client.get(url, {"all": "1"})
+
+        assert len(collapsed.context["photos"]) == 2
+        assert b"+2 similar" in collapsed.content
+        assert len(expanded.context["photos"]) == 4
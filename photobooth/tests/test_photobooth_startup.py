@@ -0,0 +1,54 @@
+import os
+import subprocess
+import sys
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+
+from photobooth.management.commands.import_report import (
+    STARTUP,
+    by_package,
+    parse_importtime,
+)
+
+SAMPLE = """\
+import time: self [us] | cumulative | imported package
+import time:       120 |        120 |     django.utils
+import time:       300 |        420 |   django.core
+import time:        80 |         80 |   PIL.Image
+import time:        50 |        550 | django
+"""
+
+
+def test_parse_importtime():
+    imports = parse_importtime(SAMPLE)
+
+    assert imports[0] == ("django.utils", 120, 120)
+    assert imports[-1] == ("django", 50, 550)
+    assert by_package(imports) == [("django", 470, 3), ("PIL", 80, 1)]
+
+
+def test_production_boot_skips_unused_modules():
+    env = {**os.environ, "DJANGO_SETTINGS_MODULE": "config.settings_production"}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", STARTUP],
+        cwd=settings.BASE_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    packages = {name for name, _, _ in by_package(parse_importtime(result.stderr))}
+    assert "photobooth" in packages
+    assert not packages & {"debug_toolbar", "oauth2_provider", "PIL", "qrcode"}
+
+
+def test_import_report():
+    stdout = StringIO()
+    call_command("import_report", limit=3, stdout=stdout)
+
+    lines = stdout.getvalue().splitlines()
+    assert lines[0].startswith(f"{os.environ['DJANGO_SETTINGS_MODULE']}: ")
+    assert lines[2].split() == ["package", "self", "ms", "modules"]
@@ -0,0 +1,160 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from django.core.files.base import ContentFile
+from django.core.files.storage import storages
+from django.urls import reverse
+
+from photobooth import metrics
+from photobooth.metrics import render
+from photobooth.storage import COALESCED, HIT, MISS, CachedStorage
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return CachedStorage(
+        backend={
+            "BACKEND": "django.core.files.storage.FileSystemStorage",
+            "OPTIONS": {"location": tmp_path / "remote"},
+        },
+        location=tmp_path / "cache",
+        max_bytes=1024,
+    )
+
+
+@pytest.fixture
+def fetches(storage, monkeypatch):
+    """Names opened on the backend, each open taking a moment"""
+    opened = []
+    open_backend = storage.backend.open
+
+    def slow_open(name, mode="rb"):
+        opened.append(name)
+        time.sleep(0.05)
+        return open_backend(name, mode)
+
+    monkeypatch.setattr(storage.backend, "open", slow_open)
+    return opened
+
+
+def read(storage, name):
+    with storage.open(name) as f:
+        return f.read()
+
+
+class TestCachedStorage:
+    def test_reads_through_the_cache(self, storage, fetches):
+        name = storage.save("photos/a/1.jpg", ContentFile(b"one"))
+
+        assert read(storage, name) == b"one"
+        assert read(storage, name) == b"one"
+
+        assert fetches == [name]
+        assert storage.stats == {MISS: 1, HIT: 1}
+        assert storage.hit_rate() == 0.5
+        assert os.path.exists(storage.cache_path(name))
+
+    def test_collapses_concurrent_misses(self, storage, fetches):
+        name = storage.save("photos/a/1.jpg", ContentFile(b"one"))
+
+        with ThreadPoolExecutor(8) as pool:
+            contents = list(pool.map(lambda _: read(storage, name), range(8)))
+
+        assert contents == [b"one"] * 8
+        assert fetches == [name]
+        assert storage.stats[MISS] == 1
+        assert storage.stats[COALESCED] + storage.stats[HIT] == 7
+
+    def test_failed_fetch_is_raised_to_every_waiter(self, storage, fetches):
+        errors = []
+        barrier = threading.Barrier(4)
+
+        def attempt():
+            barrier.wait()
+            try:
+                read(storage, "photos/a/missing.jpg")
+            except FileNotFoundError as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=attempt) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(errors) == 4
+        assert len(fetches) < 4
+        # No partial file is left behind
+        directory = os.path.dirname(storage.cache_path("photos/a/missing.jpg"))
+        assert not os.listdir(directory)
+
+    def test_evicts_least_recently_read(self, storage):
+        names = [
+            storage.save(f"photos/a/{index}.jpg", ContentFile(bytes(400)))
+            for index in range(3)
+        ]
+        read(storage, names[0])
+        read(storage, names[1])
+        # Read long ago, unlike names[1]
+        past = time.time() - 3600
+        os.utime(storage.cache_path(names[0]), (past, past))
+        read(storage, names[2])
+
+        assert not os.path.exists(storage.cache_path(names[0]))
+        assert os.path.exists(storage.cache_path(names[1]))
+        assert os.path.exists(storage.cache_path(names[2]))
+
+    def test_file_larger_than_the_cache_is_read_from_the_backend(self, storage):
+        name = storage.save("photos/a/big.jpg", ContentFile(bytes(2048)))
+
+        assert len(read(storage, name)) == 2048
+        assert not os.path.exists(storage.cache_path(name))
+
+    def test_delete_drops_the_cached_copy(self, storage):
+        name = storage.save("photos/a/1.jpg", ContentFile(b"one"))
+        read(storage, name)
+
+        storage.delete(name)
+
+        assert not storage.exists(name)
+        assert not os.path.exists(storage.cache_path(name))
+
+    def test_writes_and_metadata_go_to_the_backend(self, storage, tmp_path):
+        name = storage.save("photos/a/1.jpg", ContentFile(b"one"))
+
+        assert (tmp_path / "remote" / name).read_bytes() == b"one"
+        assert storage.size(name) == 3
+        assert storage.url(name) == storage.backend.url(name)
+        assert storage.location == storage.backend.location
+
+
+@pytest.mark.django_db
+def test_downloads_are_served_from_the_node_cache(
+    client, settings, tmp_path, make_photo, monkeypatch
+):
+    registry = metrics.Registry()
+    monkeypatch.setattr(metrics, "registry", registry)
+    settings.STORAGES = {
+        **settings.STORAGES,
+        "default": {
+            "BACKEND": "photobooth.storage.CachedStorage",
+            "OPTIONS": {
+                "backend": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+                "location": tmp_path / "node-cache",
+            },
+        },
+    }
+    photo = make_photo(content=b"original")
+    url = reverse("photobooth:photo_download", args=[photo.id])
+
+    for _ in range(3):
+        response = client.get(url)
+        assert b"".join(response.streaming_content) == b"original"
+
+    assert storages["default"].stats == {MISS: 1, HIT: 2}
+    text = render(metrics.collect())
+    assert 'photobooth_storage_cache_requests_total{result="hit"} 2' in text
+    assert "# TYPE photobooth_storage_cache_requests_total counter" in text
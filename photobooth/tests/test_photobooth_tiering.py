@@ -0,0 +1,97 @@
+import os
+from datetime import timedelta
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+
+from photobooth.models import Event, Photo
+from photobooth.tiering import archive_candidates, archive_photo, open_original
+
+
+@pytest.fixture
+def past_event(event):
+    Event.objects.filter(id=event.id).update(
+        is_active=False, updated_at=timezone.now() - timedelta(days=31)
+    )
+    return event
+
+
+def read_streaming(response):
+    return b"".join(response.streaming_content)
+
+
+@pytest.mark.django_db
+class TestTiering:
+    def test_candidates_are_photos_of_long_inactive_events(
+        self, past_event, make_photo, user
+    ):
+        old = make_photo()
+        live = make_photo(session=Event.objects.create(name="Live", created_by=user))
+        Event.objects.filter(id=live.session_id).update(
+            updated_at=timezone.now() - timedelta(days=60)
+        )
+
+        assert list(archive_candidates()) == [old]
+
+    def test_archive_moves_original_and_prunes_thumbnail(
+        self, past_event, make_photo, media_root, cold_root
+    ):
+        photo = make_photo()
+        photo.thumbnail.save("thumb.jpg", photo.image.file, save=True)
+        original = photo.image.name
+        thumbnail = photo.thumbnail.path
+
+        freed = archive_photo(photo)
+
+        photo.refresh_from_db()
+        assert photo.tier == Photo.TIER_COLD
+        assert not photo.thumbnail
+        assert not os.path.exists(media_root / original)
+        assert not os.path.exists(thumbnail)
+        assert freed == 2 * os.path.getsize(cold_root / original)
+        assert photo.image_url == reverse("photobooth:photo_image", args=[photo.id])
+        assert archive_candidates().count() == 0
+
+    def test_download_recalls_archived_original(
+        self, client, past_event, make_photo, make_jpeg, media_root, cold_root
+    ):
+        content = make_jpeg(size=(400, 300))
+        photo = make_photo(content=content)
+        archive_photo(photo)
+
+        response = client.get(reverse("photobooth:photo_download", args=[photo.id]))
+
+        assert read_streaming(response) == content
+        photo.refresh_from_db()
+        assert photo.tier == Photo.TIER_HOT
+        assert (media_root / photo.image.name).read_bytes() == content
+        # The cold copy stays, and the photo stays hot for another period
+        assert (cold_root / photo.image.name).exists()
+        assert archive_candidates().count() == 0
+
+    def test_read_without_recall(self, past_event, make_photo, make_jpeg):
+        content = make_jpeg(size=(200, 100))
+        photo = make_photo(content=content)
+        archive_photo(photo)
+
+        f, size = open_original(photo, recall=False)
+        with f:
+            assert f.read() == content
+        assert size == len(content)
+        assert Photo.objects.get(id=photo.id).tier == Photo.TIER_COLD
+
+    def test_tier_photos_command(self, past_event, make_photo):
+        make_photo()
+        make_photo()
+        stdout = StringIO()
+
+        call_command("tier_photos", "--dry-run", stdout=stdout)
+        call_command("tier_photos", stdout=stdout)
+
+        output = stdout.getvalue()
+        assert "Would archive 2 photos" in output
+        assert "Archived 2 photos" in output
+        assert not Photo.objects.filter(tier=Photo.TIER_HOT).exists()
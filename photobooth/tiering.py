@@ -0,0 +1,119 @@
+"""
+Hot/cold storage tiers for photo originals.
+
+Photos of live events stay in the default (hot) storage. The tier_photos
+command moves the originals of events that have been inactive for
+PHOTOBOOTH_COLD_AFTER_DAYS to the "cold" storage, a separate directory or
+bucket configured in STORAGES, keeps the same file name there and prunes
+their thumbnails. Reads go through open_original(), which recalls a cold
+original to the hot tier on demand, so downloads and galleries keep working.
+
+Events can be packed further into one file each, see photobooth.packs.
+
+A recalled photo keeps its cold copy and stays hot for another
+PHOTOBOOTH_COLD_AFTER_DAYS before it is archived again, which then only has
+to delete the hot file.
+"""
+
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage, storages
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Event, Photo
+
+logger = logging.getLogger(__name__)
+
+COLD_STORAGE = "cold"
+
+
+def cold_storage():
+    return storages[COLD_STORAGE]
+
+
+def archive_candidates(now=None):
+    """Hot photos of events inactive for longer than the cold threshold"""
+    cutoff = (now or timezone.now()) - timedelta(
+        days=settings.PHOTOBOOTH_COLD_AFTER_DAYS
+    )
+    stale_events = Event.objects.filter(is_active=False, updated_at__lt=cutoff)
+    return Photo.objects.filter(
+        Q(tiered_at__isnull=True) | Q(tiered_at__lt=cutoff),
+        session__in=stale_events,
+        tier=Photo.TIER_HOT,
+    ).exclude(image="")
+
+
+def _copy(name, source, target):
+    """Copy `name` from one storage to another, keeping the name"""
+    if target.exists(name):
+        if target.size(name) == source.size(name):
+            return
+        target.delete(name)
+    with source.open(name, "rb") as f:
+        saved = target.save(name, f)
+    if saved != name:
+        # Another process copied the file meanwhile and kept the name
+        target.delete(saved)
+
+
+def archive_photo(photo):
+    """
+    Move a photo's original to cold storage and prune its thumbnail.
+    Returns the number of bytes freed on the hot tier.
+    """
+    name = photo.image.name
+    size = default_storage.size(name)
+    cold = cold_storage()
+    _copy(name, default_storage, cold)
+    if cold.size(name) != size:
+        raise OSError(f"Cold copy of {name} is incomplete")
+
+    thumbnail = photo.thumbnail.name if photo.thumbnail else None
+    if thumbnail:
+        size += default_storage.size(thumbnail)
+    # Point the row at the cold copy before deleting anything, so a crash
+    # leaves a stray hot file rather than a photo without an original
+    photo.tier = Photo.TIER_COLD
+    photo.tiered_at = timezone.now()
+    photo.thumbnail = None
+    photo.save(update_fields=["tier", "tiered_at", "thumbnail"])
+    default_storage.delete(name)
+    if thumbnail:
+        default_storage.delete(thumbnail)
+    return size
+
+
+def recall_photo(photo):
+    """Copy a cold original back to the hot tier"""
+    _copy(photo.image.name, cold_storage(), default_storage)
+    photo.tier = Photo.TIER_HOT
+    photo.tiered_at = timezone.now()
+    photo.save(update_fields=["tier", "tiered_at"])
+    logger.info("Recalled photo %s from cold storage", photo.pk)
+
+
+def open_original(photo, recall=True):
+    """
+    Open a photo's original for reading from whichever tier holds it and
+    return the file with its size. Cold originals are recalled first unless
+    `recall` is False, in which case they are read from cold storage.
+    Packed originals are always read from their pack.
+    """
+    if photo.tier == Photo.TIER_PACKED:
+        from .packs import open_packed
+
+        f = open_packed(photo)
+        return f, f.size
+
+    storage = default_storage
+    if photo.tier == Photo.TIER_COLD:
+        if recall:
+            recall_photo(photo)
+        else:
+            storage = cold_storage()
+    f = storage.open(photo.image.name, "rb")
+    return f, f.size
@@ -24,12 +24,28 @@ urlpatterns = [
         views.EventGalleryView.as_view(),
         name="event_gallery",
     ),
+    path(
+        "event/<uuid:event_id>/gallery/page/",
+        views.EventGalleryPageView.as_view(),
+        name="event_gallery_page",
+    ),
     # API endpoints
     path("api/capture/", views.capture_photo, name="capture_photo"),
     path("api/camera-settings/", views.get_camera_settings, name="camera_settings"),
     path("api/event/<uuid:event_id>/info/", views.get_event_info, name="event_info"),
+    path(
+        "api/event/<uuid:event_id>/search/",
+        views.search_guest_photos_view,
+        name="guest_search",
+    ),
+    path(
+        "api/photo/<uuid:photo_id>/similar/",
+        views.similar_photos_view,
+        name="similar_photos",
+    ),
     # Download and QR codes
     path("download/<uuid:photo_id>/", views.photo_download, name="photo_download"),
+    path("photo/<uuid:photo_id>/image/", views.photo_image, name="photo_image"),
     path("qr/photo/<uuid:photo_id>/", views.generate_qr_code, name="photo_qr"),
     path("qr/event/<uuid:event_id>/", views.event_gallery_qr, name="event_gallery_qr"),
 ]
@@ -1,24 +1,57 @@
-import base64
+import asyncio
 import json
-import uuid
-from io import BytesIO
-
-import qrcode
+import logging
+import mimetypes
+import os
+import time
+from urllib.parse import urlencode
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import login
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.core.files.base import ContentFile
-from django.http import Http404, HttpResponse, JsonResponse
-from django.shortcuts import get_object_or_404, redirect, render
+from django.core.files.storage import default_storage
+from django.core.handlers.asgi import ASGIRequest
+from django.db import DatabaseError, connections
+from django.db.models import Count
+from django.http import (
+    Http404,
+    HttpResponse,
+    HttpResponseForbidden,
+    HttpResponseGone,
+    HttpResponseNotModified,
+    JsonResponse,
+)
+from django.shortcuts import aget_object_or_404, get_object_or_404, redirect, render
 from django.urls import reverse, reverse_lazy
+from django.utils.crypto import constant_time_compare
+from django.utils.decorators import method_decorator
+from django.utils.http import parse_etags, quote_etag
 from django.views.decorators.csrf import csrf_exempt
 from django.views.generic import CreateView, DetailView, ListView
 
+from . import metrics
+from .budgets import query_budget, unbudgeted
 from .forms import CustomUserCreationForm, EventCodeForm, EventForm
+from .ingest import ingest_capture
 from .models import Event, Photo, PhotoboothSettings
+from .processing import decode_data_url, process_photo
+from .qr import render_qr_png
+from .responses import file_response
+from .routers import read_from_primary, use_replica
+from .search import search_guest_photos
+from .signing import signed_path, verify
+from .similarity import MAX_RADIUS, collapse_near_duplicates, similar_photos
+from .tiering import open_original
+
+logger = logging.getLogger(__name__)
+
+SEARCH_RESULT_LIMIT = 100
 
 
 # Authentication Views
+@query_budget(10)
 def signup_view(request):
     """User registration view"""
     if request.method == "POST":
@@ -40,9 +73,12 @@ class EventListView(LoginRequiredMixin, ListView):
     model = Event
     template_name = "photobooth/event_list.html"
     context_object_name = "events"
+    query_budget = 3
 
     def get_queryset(self):
-        return Event.objects.filter(created_by=self.request.user)
+        return Event.objects.filter(created_by=self.request.user).annotate(
+            num_photos=Count("photos")
+        )
 
 
 class EventCreateView(LoginRequiredMixin, CreateView):
@@ -52,6 +88,7 @@ class EventCreateView(LoginRequiredMixin, CreateView):
     form_class = EventForm
     template_name = "photobooth/event_create.html"
     success_url = reverse_lazy("photobooth:event_list")
+    query_budget = 4
 
     def form_valid(self, form):
         form.instance.created_by = self.request.user
@@ -68,11 +105,15 @@ class EventDetailView(LoginRequiredMixin, DetailView):
     model = Event
     template_name = "photobooth/event_detail.html"
     context_object_name = "event"
+    query_budget = 3
 
     def get_queryset(self):
-        return Event.objects.filter(created_by=self.request.user)
+        return Event.objects.filter(created_by=self.request.user).annotate(
+            num_photos=Count("photos")
+        )
 
 
+@query_budget(2)
 def join_event_view(request):
     """Join event with code"""
     if request.method == "POST":
@@ -87,6 +128,7 @@ def join_event_view(request):
 
 
 # Photobooth Interface Views
+@query_budget(8)  # 5, plus creating PhotoboothSettings on first use
 def event_booth_view(request, event_id):
     """Main photobooth interface for an event"""
     event = get_object_or_404(Event, id=event_id, is_active=True)
@@ -96,6 +138,7 @@ def event_booth_view(request, event_id):
     )
 
 
+@method_decorator(use_replica, name="dispatch")
 class EventGalleryView(ListView):
     """Gallery view for an event's photos"""
 
@@ -103,26 +146,55 @@ class EventGalleryView(ListView):
     template_name = "photobooth/gallery.html"
     context_object_name = "photos"
     paginate_by = 20
+    query_budget = 5
 
     def get_queryset(self):
         event_id = self.kwargs.get("event_id")
-        return Photo.objects.filter(session_id=event_id, is_processed=True)
+        photos = Photo.objects.filter(session_id=event_id, is_processed=True)
+        query = self.request.GET.get("q", "").strip()
+        if query:
+            photos = search_guest_photos(photos, query)
+        return photos
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         event_id = self.kwargs.get("event_id")
         context["event"] = get_object_or_404(Event, id=event_id)
+        context["query"] = self.request.GET.get("q", "").strip()
+        # Collapse burst shots on the page unless asked to show everything
+        context["show_all"] = self.request.GET.get("all") == "1"
+        if not context["show_all"]:
+            context["photos"] = collapse_near_duplicates(context["photos"])
+
+        # Carried over into pagination links
+        filters = {}
+        if context["query"]:
+            filters["q"] = context["query"]
+        if context["show_all"]:
+            filters["all"] = "1"
+        context["filter_query"] = f"&{urlencode(filters)}" if filters else ""
         return context
 
 
+class EventGalleryPageView(EventGalleryView):
+    """A page of gallery tiles, appended by the gallery as guests scroll"""
+
+    template_name = "photobooth/_gallery_page.html"
+
+
 # Photo Management Views
 @csrf_exempt
-def capture_photo(request):
+# Four queries, plus the savepoint pair of the ingest transaction when it is
+# nested in an outer one, as in tests
+@query_budget(6)
+async def capture_photo(request):
     """Handle photo capture from webcam"""
     if request.method != "POST":
         return JsonResponse({"error": "POST method required"}, status=405)
 
     try:
+        # Under ASGI the body has already been received without holding a
+        # worker, however slowly the guest's phone uploads it
         data = json.loads(request.body)
         image_data = data.get("image")
         event_id = data.get("event_id")
@@ -135,23 +207,32 @@ def capture_photo(request):
             )
 
         # Get the event
-        event = get_object_or_404(Event, id=event_id, is_active=True)
+        event = await aget_object_or_404(Event, id=event_id, is_active=True)
 
         # Decode base64 image
-        format, imgstr = image_data.split(";base64,")
-        ext = format.split("/")[-1]
-        image_file = ContentFile(base64.b64decode(imgstr), name=f"{uuid.uuid4()}.{ext}")
+        with metrics.timer("capture_decode"):
+            ext, content = await asyncio.to_thread(decode_data_url, image_data)
 
-        # Create photo record
-        photo = Photo.objects.create(
+        # Journal the capture, then store the image and create the record
+        photo = Photo(
             session=event,
             guest_name=guest_name,
             guest_email=guest_email,
             is_processed=True,
         )
+        try:
+            with metrics.timer("storage_write"):
+                await ingest_capture(photo, ext, content)
+        except (OSError, DatabaseError):
+            logger.exception("Failed to store a capture for event %s", event.id)
+            response = JsonResponse(
+                {"error": "Could not save the photo, please try again"}, status=503
+            )
+            response["Retry-After"] = "1"
+            return response
 
-        # Save image
-        photo.image.save(f"{photo.id}.{ext}", image_file)
+        # Thumbnail and hash it, off the event loop
+        await sync_to_async(process_photo)(photo)
 
         return JsonResponse(
             {
@@ -168,53 +249,101 @@ def capture_photo(request):
         return JsonResponse({"error": str(e)}, status=500)
 
 
-def photo_download(request, photo_id):
-    """Download a photo"""
-    photo = get_object_or_404(Photo, id=photo_id)
+async def serve_original(request, photo_id, as_attachment):
+    try:
+        photo = await Photo.objects.aget(id=photo_id)
+    except Photo.DoesNotExist:
+        # The QR code of a new capture is often scanned before the replica
+        # has it
+        read_from_primary()
+        photo = await aget_object_or_404(Photo, id=photo_id)
 
     if not photo.image:
         raise Http404("Photo not found")
 
-    response = HttpResponse(content_type="image/jpeg")
-    response["Content-Disposition"] = (
-        f'attachment; filename="photobooth_{photo_id}.jpg"'
+    try:
+        # Archived originals are recalled to the hot tier first
+        f, size = await sync_to_async(open_original)(photo)
+    except FileNotFoundError:
+        raise Http404("Photo not found")
+    return file_response(
+        request,
+        f,
+        size,
+        content_type="image/jpeg",
+        filename=f"photobooth_{photo_id}.jpg",
+        as_attachment=as_attachment,
     )
 
-    with open(photo.image.path, "rb") as f:
-        response.write(f.read())
 
-    return response
+@query_budget(3)  # includes a primary retry and recalling an archived original
+@use_replica
+async def photo_download(request, photo_id):
+    """Download a photo"""
+    return await serve_original(request, photo_id, as_attachment=True)
+
+
+@query_budget(3)  # includes a primary retry and recalling an archived original
+@use_replica
+async def photo_image(request, photo_id):
+    """Show a photo's original, for archived photos whose file URL is gone"""
+    return await serve_original(request, photo_id, as_attachment=False)
+
+
+@query_budget(2)
+def similar_photos_view(request, photo_id):
+    """List near-duplicates of a photo from the same event"""
+    photo = get_object_or_404(Photo, id=photo_id, is_processed=True)
+
+    try:
+        radius = int(request.GET.get("radius", ""))
+    except ValueError:
+        radius = None
+    if radius is not None and not 0 <= radius <= MAX_RADIUS:
+        return JsonResponse(
+            {"error": f"radius must be between 0 and {MAX_RADIUS}"}, status=400
+        )
+
+    matches = similar_photos(photo, radius=radius)
+    return JsonResponse(
+        {
+            "photo_id": str(photo.id),
+            "similar": [
+                {
+                    "id": str(match.id),
+                    "distance": distance,
+                    "image_url": match.image_url,
+                    "placeholder": match.placeholder_url,
+                    "download_url": match.download_url,
+                    "taken_at": match.taken_at.isoformat(),
+                }
+                for distance, match in matches
+            ],
+        }
+    )
 
 
-def generate_qr_code(request, photo_id):
+@query_budget(1)
+async def generate_qr_code(request, photo_id):
     """Generate QR code for photo download"""
-    photo = get_object_or_404(Photo, id=photo_id)
+    photo = await aget_object_or_404(Photo.objects.only("id"), id=photo_id)
 
     # Build full URL for download
     download_url = request.build_absolute_uri(photo.download_url)
 
     # Generate QR code
-    qr = qrcode.QRCode(version=1, box_size=10, border=5)
-    qr.add_data(download_url)
-    qr.make(fit=True)
-
-    # Create QR code image
-    img = qr.make_image(fill_color="black", back_color="white")
-
-    # Save to BytesIO
-    buffer = BytesIO()
-    img.save(buffer, format="PNG")
-    buffer.seek(0)
-
-    response = HttpResponse(buffer.getvalue(), content_type="image/png")
+    png = await asyncio.to_thread(render_qr_png, download_url)
+    response = HttpResponse(png, content_type="image/png")
     response["Content-Disposition"] = f'inline; filename="qr_code_{photo_id}.png"'
 
     return response
 
 
-def event_gallery_qr(request, event_id):
+@query_budget(1)
+async def event_gallery_qr(request, event_id):
     """Generate QR code for event gallery"""
-    event = get_object_or_404(Event, id=event_id)
+    if not await Event.objects.filter(id=event_id).aexists():
+        raise Http404("No Event matches the given query.")
 
     # Build full URL for gallery
     gallery_url = request.build_absolute_uri(
@@ -222,25 +351,15 @@ def event_gallery_qr(request, event_id):
     )
 
     # Generate QR code
-    qr = qrcode.QRCode(version=1, box_size=10, border=5)
-    qr.add_data(gallery_url)
-    qr.make(fit=True)
-
-    # Create QR code image
-    img = qr.make_image(fill_color="black", back_color="white")
-
-    # Save to BytesIO
-    buffer = BytesIO()
-    img.save(buffer, format="PNG")
-    buffer.seek(0)
-
-    response = HttpResponse(buffer.getvalue(), content_type="image/png")
+    png = await asyncio.to_thread(render_qr_png, gallery_url)
+    response = HttpResponse(png, content_type="image/png")
     response["Content-Disposition"] = f'inline; filename="gallery_qr_{event_id}.png"'
 
     return response
 
 
 # API Views
+@query_budget(4)  # 1, plus creating PhotoboothSettings on first use
 def get_camera_settings(request):
     """Get camera settings for frontend"""
     settings = PhotoboothSettings.get_settings()
@@ -257,20 +376,156 @@ def get_camera_settings(request):
     )
 
 
-def get_event_info(request, event_id):
-    """Get event information for frontend"""
-    event = get_object_or_404(Event, id=event_id, is_active=True)
-    return JsonResponse(
+def event_info_wait(request):
+    """Seconds a long-polling event info request may be held, from ?wait="""
+    if not isinstance(request, ASGIRequest):
+        # A held request would tie up a whole WSGI worker
+        return 0
+    try:
+        wait = float(request.GET.get("wait", 0))
+    except ValueError:
+        return 0
+    return min(max(wait, 0), settings.PHOTOBOOTH_EVENT_INFO_MAX_WAIT)
+
+
+def release_pooled_connections():
+    """
+    Return this thread's pooled connections to their pool, so a request
+    waiting between checks does not hold one. Unpooled connections are kept,
+    reopening them every check would cost more than it saves.
+    """
+    for connection in connections.all(initialized_only=True):
+        if getattr(connection, "pool", None) and not connection.in_atomic_block:
+            connection.close()
+
+
+@query_budget(2)  # version check and fetch; long-poll checks are unbudgeted
+@use_replica
+async def get_event_info(request, event_id):
+    """
+    Get event information for frontend.
+
+    The event version is the ETag. A request with a matching If-None-Match
+    gets a 304 after a single version lookup, and with ?wait=<seconds> it is
+    held until the version changes or the wait runs out. Idle booths can
+    then long-poll instead of fetching and counting photos over and over.
+    """
+    events = Event.objects.filter(id=event_id, is_active=True)
+    known = {
+        etag.removeprefix("W/")
+        for etag in parse_etags(request.headers.get("If-None-Match", ""))
+    }
+    wait = event_info_wait(request)
+    if known:
+        version = await events.values_list("version", flat=True).afirst()
+        deadline = time.monotonic() + wait
+        with unbudgeted():
+            while (
+                version is not None
+                and quote_etag(str(version)) in known
+                and time.monotonic() < deadline
+            ):
+                await sync_to_async(release_pooled_connections)()
+                await asyncio.sleep(settings.PHOTOBOOTH_EVENT_INFO_POLL_INTERVAL)
+                version = await events.values_list("version", flat=True).afirst()
+        if version is None:
+            raise Http404("Event not found")
+        if quote_etag(str(version)) in known:
+            response = HttpResponseNotModified()
+            response["ETag"] = quote_etag(str(version))
+            response["X-Event-Info-Wait"] = f"{wait:g}"
+            return response
+
+    event = await aget_object_or_404(events.annotate(num_photos=Count("photos")))
+    response = JsonResponse(
         {
             "id": str(event.id),
             "name": event.name,
             "code": event.code,
             "photo_count": event.photo_count,
+            "version": event.version,
         }
     )
+    response["ETag"] = quote_etag(str(event.version))
+    # Tells booths whether this server can hold a long-poll at all
+    response["X-Event-Info-Wait"] = f"{wait:g}"
+    return response
+
+
+@query_budget(1)
+def search_guest_photos_view(request, event_id):
+    """Find an event's photos by guest name or email"""
+    query = request.GET.get("q", "").strip()
+    if not query:
+        return JsonResponse({"error": "Search query required"}, status=400)
+
+    photos = search_guest_photos(
+        Photo.objects.filter(session_id=event_id, is_processed=True), query
+    )[:SEARCH_RESULT_LIMIT]
+    return JsonResponse(
+        {
+            "query": query,
+            "photos": [
+                {
+                    "id": str(photo.id),
+                    "guest_name": photo.guest_name,
+                    "image_url": photo.image_url,
+                    "placeholder": photo.placeholder_url,
+                    "download_url": photo.download_url,
+                    "taken_at": photo.taken_at.isoformat(),
+                }
+                for photo in photos
+            ],
+        }
+    )
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint aggregated across worker processes"""
+    token = settings.PHOTOBOOTH_METRICS_TOKEN
+    if token and not constant_time_compare(
+        request.headers.get("Authorization", ""), f"Bearer {token}"
+    ):
+        return HttpResponse("Unauthorized", status=401)
+    return HttpResponse(
+        metrics.render(metrics.collect()),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
+@query_budget(0)
+async def serve_signed_media(request, name):
+    """
+    Serve a signed media URL where nginx does not verify it itself, see
+    photobooth.signing. No database query is needed.
+    """
+    expires = request.GET.get("e")
+    valid = verify(
+        signed_path(name), expires, request.GET.get("v", ""), request.GET.get("s")
+    )
+    if valid is False:
+        return HttpResponseForbidden("Invalid signature")
+    if valid is None:
+        return HttpResponseGone("Link expired")
+    try:
+        f = await asyncio.to_thread(default_storage.open, name, "rb")
+    except FileNotFoundError:
+        raise Http404("Photo not found")
+    response = file_response(
+        request,
+        f,
+        f.size,
+        content_type=mimetypes.guess_type(name)[0] or "application/octet-stream",
+        filename=os.path.basename(name),
+        as_attachment="download" in request.GET,
+    )
+    max_age = max(int(expires) - int(time.time()), 0)
+    response["Cache-Control"] = f"public, max-age={max_age}, immutable"
+    return response
 
 
 # Home/Landing Views
+@query_budget(2)
 def home_view(request):
     """Landing page"""
     return render(request, "photobooth/home.html")
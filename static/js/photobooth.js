@@ -16,6 +16,7 @@ class PhotoboothCamera {
         this.currentEvent = null;
         this.cameraSettings = null;
         this.lastPhotoId = null;
+        this.eventInfoEtag = null;
         
         this.init();
     }
@@ -40,6 +41,9 @@ class PhotoboothCamera {
             // Load recent photos
             this.loadRecentPhotos();
             
+            // Keep the photo count current, including other booths' photos
+            this.watchEventInfo();
+            
         } catch (error) {
             console.error('Failed to initialize photobooth:', error);
             this.showError('Failed to initialize camera. Please refresh the page.');
@@ -249,22 +253,53 @@ class PhotoboothCamera {
         modal.show();
     }
     
+    async fetchEventInfo(wait = 0) {
+        // Conditional request: the server answers 304 while the event version
+        // is unchanged, and with `wait` holds the request until it changes
+        const url = `/photobooth/api/event/${this.currentEvent.id}/info/` + (wait ? `?wait=${wait}` : '');
+        const headers = this.eventInfoEtag ? { 'If-None-Match': this.eventInfoEtag } : {};
+        const response = await fetch(url, { headers, cache: 'no-store' });
+        if (response.status === 200) {
+            this.eventInfoEtag = response.headers.get('ETag');
+            const eventInfo = await response.json();
+            if (this.photoCountElement) {
+                this.photoCountElement.textContent = eventInfo.photo_count;
+            }
+        } else if (response.status !== 304) {
+            throw new Error(`Event info request failed: ${response.status}`);
+        }
+        return response;
+    }
+    
     async updatePhotoCount() {
         if (!this.currentEvent) return;
         
         try {
-            const response = await fetch(`/photobooth/api/event/${this.currentEvent.id}/info/`);
-            if (response.ok) {
-                const eventInfo = await response.json();
-                if (this.photoCountElement) {
-                    this.photoCountElement.textContent = eventInfo.photo_count;
-                }
-            }
+            await this.fetchEventInfo();
         } catch (error) {
             console.error('Failed to update photo count:', error);
         }
     }
     
+    async watchEventInfo() {
+        if (!this.currentEvent) return;
+        
+        const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+        for (;;) {
+            try {
+                const response = await this.fetchEventInfo(25);
+                // Servers that cannot hold the request (WSGI) say so; the
+                // count is then only refreshed after this booth's captures
+                if (response.headers.get('X-Event-Info-Wait') === '0') {
+                    return;
+                }
+            } catch (error) {
+                console.error('Failed to watch event info:', error);
+                await sleep(10000);
+            }
+        }
+    }
+    
     async loadRecentPhotos() {
         // This would load recent photos for the event
         // Implementation depends on if you want to show recent photos